@@ -1,26 +1,160 @@
 from django.conf import settings
-import base64, cv2, json, numpy as np, pytz, re
-from django.utils.timezone import now
-from django.db import transaction
+import logging
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from attendanceapi.models import Attendance, FaceEmbedding, TempUser
+from attendanceapi.models import ServiceSession
+from attendanceapi.renderers import recognition_formats
+from userauth.models import CustomUser
 from attendanceapi.services.face_recognition_service import (
-    extract_face_embedding,
+    extract_gated_face,
     recognize_face,
     match_or_create_temp_user,
     recognize_faces_from_frame,
 )
-from attendanceapi.services.attendance_service import has_recent_attendance
-from base.models import Department
-from attendanceapi.services.face_model import get_face_app
-from attendanceapi.services.image_utils import decode_base64_image
-
-BASE64_IMAGE_REGEX = re.compile(
-    r"^[A-Za-z0-9+/=]+$"
+from attendanceapi.services.attendance_service import mark_frame_attendance, record_attendance_once
+from attendanceapi.services.edge_sync import EDGE_SYNC_MAX_EVENTS, ingest_edge_events
+from attendanceapi.services.enrollment_service import ENROLLMENT_MAX_FRAMES, enroll_user
+from attendanceapi.services.gallery import (
+    GALLERY_KINDS,
+    collect_gallery_changes,
+    gallery_version,
+    registered_shard_stats,
+)
+from attendanceapi.services.gallery_bundle import DELTA_CONTENT_TYPE, encode_delta
+from attendanceapi.services.image_utils import decode_base64_image, decode_camera_frame
+from attendanceapi.services.motion_gate import check_motion, remember_result, motion_gate_stats
+from attendanceapi.services.metrics import render_family, render_prometheus, shard_match_summary, stage_summary
+from attendanceapi.services.admission import (
+    AdmissionRejected,
+    admission_stats,
+    admit,
+    frame_age_seconds,
+    release,
+)
+from attendanceapi.services.devices import (
+    DEVICE_KEY_HEADER,
+    DeviceAuthError,
+    admission_key,
+    camera_context,
+    device_stats,
+    record_frame,
+    record_mark,
+    resolve_device,
+)
+from attendanceapi.services.event_feed import FEED_KINDS, attendance_feed_stats, parse_cursor
+from attendanceapi.services.face_roi import (
+    attach_face_crops,
+    crop_face_roi,
+    face_roi_stats,
+    submit_face_roi,
+    submit_marked_face_rois,
+)
+from attendanceapi.services.frame_cache import cache_result, frame_cache_key, frame_cache_stats, get_cached_result
+from attendanceapi.services.hot_tier import hot_tier_stats
+from attendanceapi.services.idempotency import (
+    IDEMPOTENCY_KEY_MAX_LENGTH,
+    MARK_SCOPE,
+    IdempotencyInProgress,
+    claim_idempotency_key,
+    complete_idempotency_key,
+    idempotency_owner,
 )
+from attendanceapi.services.sessions import active_sessions, session_headcount, session_stats
+from attendanceapi.services.inference_executor import inference_executor_stats
+from attendanceapi.services.warmup import readiness
+
+logger = logging.getLogger(__name__)
+
+def device_auth_error_response(e):
+    return Response({
+        "status": "error",
+        "code": e.code,
+        "message": e.message,
+        "data": {}
+    }, status=status.HTTP_401_UNAUTHORIZED)
+
+def admission_rejection_body(e):
+    """
+    Envelope for a frame refused by admission control. Dropped (stale or
+    superseded) frames are not errors; rate limit/overload answers carry a
+    retry hint.
+    """
+    return {
+        "status": "dropped" if e.http_status == status.HTTP_200_OK else "error",
+        "code": e.code,
+        "message": e.message,
+        "data": {"reason": e.reason, "retry_after": e.retry_after},
+    }
+
+def admission_rejected_response(e):
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+    return Response(admission_rejection_body(e), status=e.http_status, headers=headers)
+
+def attach_attendance(faces, outcomes):
+    """
+    Copies of the overlay entries with each face's attendance outcome.
+    Returns (faces, marked_count).
+    """
+    marked = sum(1 for outcome in outcomes if outcome and outcome["status"] == "marked")
+    return [{**face, "attendance": outcome} for face, outcome in zip(faces, outcomes)], marked
+
+# Only final answers go into the frame cache: a frame whose faces are all
+# recognized (or that has none), and marks that were written or refused as
+# duplicates. Quality-rejected, not yet stable and unknown faces may be
+# resolved by the next attempt, so a retry must not be answered from cache.
+TERMINAL_MARK_CODES = {
+    "ATTENDANCE_MARKED",
+    "TEMP_ATTENDANCE_MARKED",
+    "ATTENDANCE_DUPLICATE",
+    "TEMP_ATTENDANCE_DUPLICATE",
+    "NO_FACE",
+}
+
+def is_terminal_faces(faces):
+    return all(face["recognized"] for face in faces)
+
+def is_terminal_mark(body):
+    return body.get("code") in TERMINAL_MARK_CODES
 
+def format_recognition_results(results, transform):
+    """
+    Overlay entries for recognize_frame, with boxes mapped back to original
+    camera-frame coordinates.
+    """
+    faces = []
+
+    for result in results:
+        bbox = transform.to_original(result["bbox"])
+
+        if result.get("recognized"):
+            user = result["user"]
+            faces.append({
+                "recognized": True,
+                "user_type": "registered",
+                "user_id": str(user.id),
+                "name": user.get_full_name() or user.username,
+                "bbox": bbox,
+            })
+        elif result.get("rejected"):
+            faces.append({
+                "recognized": False,
+                "user_type": "unknown",
+                "quality_reason": result["reason"],
+                "bbox": bbox,
+            })
+        else:
+            faces.append({
+                "recognized": False,
+                "user_type": "unknown",
+                "bbox": bbox,
+            })
+
+    return faces
+
+@recognition_formats
 @api_view(["POST"])
 def recognize_frame(request):
     """
@@ -38,16 +172,42 @@ def recognize_frame(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        # 1. Strip base64 header
-        if "," in frame_data:
-            frame_data = frame_data.split(",")[1]
+        device = resolve_device(request)
+    except DeviceAuthError as e:
+        return device_auth_error_response(e)
+
+    camera_id, profile = camera_context(device, request.data)
+    camera_key = camera_id or "default"
 
-        # 2. Decode base64
-        image_bytes = base64.b64decode(frame_data)
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    # 0. Byte-identical resend (client retry)? Answer from the frame cache
+    cache_key = frame_cache_key("recognize", frame_data, camera_key)
+    cached_faces = get_cached_result(cache_key)
 
-        if frame is None or frame.size == 0:
+    if cached_faces is not None:
+        record_frame(camera_key)
+        return Response({
+            "status": "success",
+            "code": "FACES_DETECTED" if cached_faces else "NO_FACE",
+            "message": "Identical frame, previous result reused",
+            "data": {"faces": cached_faces, "motion_skipped": False, "frame_cached": True}
+        }, status=status.HTTP_200_OK)
+
+    # Admission control: shed instead of queueing under load
+    try:
+        ticket = admit(admission_key(device, request), frame_age_seconds(
+            request.data.get("captured_at"), request.META.get("HTTP_X_REQUEST_START"),
+        ))
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+
+    try:
+        # 1. Decode base64, crop to the camera ROI and cap resolution
+        try:
+            frame, transform = decode_camera_frame(frame_data, camera_id, profile)
+        except ValueError:
+            frame = None
+
+        if frame is None:
             return Response({
                 "status": "error",
                 "code": "INVALID_IMAGE",
@@ -55,37 +215,36 @@ def recognize_frame(request):
                 "data": {}
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        # 2. Static scene? Reuse the camera's last result
+        skipped, cached_faces = check_motion(camera_key, frame)
+
+        if skipped:
+            record_frame(camera_key)
+            return Response({
+                "status": "success",
+                "code": "FACES_DETECTED" if cached_faces else "NO_FACE",
+                "message": "No motion, previous result reused",
+                "data": {"faces": cached_faces, "motion_skipped": True}
+            }, status=status.HTTP_200_OK)
+
         # 3. Detect & recognize faces (MULTI-FACE)
-        results = recognize_faces_from_frame(frame)
-
-        faces = []
-
-        for result in results:
-            if result.get("recognized"):
-                user = result["user"]
-                faces.append({
-                    "recognized": True,
-                    "user_type": "registered",
-                    "user_id": str(user.id),
-                    "name": user.get_full_name() or user.username,
-                    "bbox": result["bbox"],
-                })
-            else:
-                faces.append({
-                    "recognized": False,
-                    "user_type": "unknown",
-                    "bbox": result["bbox"],
-                })
+        results = recognize_faces_from_frame(frame, camera_key=camera_key)
+        faces = format_recognition_results(results, transform)
+
+        remember_result(camera_key, faces)
+        if is_terminal_faces(faces):
+            cache_result(cache_key, faces)
+        record_frame(camera_key, faces=len(faces), recognized=sum(f["recognized"] for f in faces))
 
         return Response({
             "status": "success",
             "code": "FACES_DETECTED" if faces else "NO_FACE",
             "message": "Faces processed",
-            "data": {"faces": faces}
+            "data": {"faces": faces, "motion_skipped": False}
         }, status=status.HTTP_200_OK)
 
-    except Exception as e:
-        print("🔥 recognize_frame error:", str(e))
+    except Exception:
+        logger.exception("recognize_frame failed")
         return Response({
             "status": "error",
             "code": "RECOGNITION_FAILED",
@@ -93,8 +252,39 @@ def recognize_frame(request):
             "data": {}
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    finally:
+        release(ticket)
+
+def idempotency_key_error(key):
+    """
+    Error message for an unusable Idempotency-Key header, else None.
+    """
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return f"Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters"
+    return None
+
+def request_idempotency_owner(request, device):
+    """
+    Whose Idempotency-Key namespace a request uses: its device, else the
+    address it came from.
+    """
+    return idempotency_owner(device, request.META.get("REMOTE_ADDR"))
+
+def idempotency_in_progress_body():
+    return {
+        "status": "error",
+        "code": "IDEMPOTENCY_KEY_IN_USE",
+        "message": "A request with this Idempotency-Key is still being processed",
+        "data": {}
+    }
+
 @api_view(["POST"])
 def mark_attendance(request):
+    """
+    Marks attendance for the single face in a frame. A byte-identical resend
+    within the frame cache TTL gets the first answer without inference; with
+    an Idempotency-Key header, retries of the key always do.
+    """
     frame_data = request.data.get("frame")
 
     if not frame_data:
@@ -105,11 +295,71 @@ def mark_attendance(request):
             "data": {}
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    try:
+        device = resolve_device(request)
+    except DeviceAuthError as e:
+        return device_auth_error_response(e)
+
+    camera_id, profile = camera_context(device, request.data)
+
+    idempotency_key = request.headers.get("Idempotency-Key")
+    claim = None
+
+    if idempotency_key:
+        error = idempotency_key_error(idempotency_key)
+        if error:
+            return Response({
+                "status": "error",
+                "code": "INVALID_IDEMPOTENCY_KEY",
+                "message": error,
+                "data": {}
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            claim, replay = claim_idempotency_key(
+                MARK_SCOPE, idempotency_key, device, request_idempotency_owner(request, device),
+            )
+        except IdempotencyInProgress:
+            return Response(idempotency_in_progress_body(), status=status.HTTP_409_CONFLICT)
+
+        if replay is not None:
+            response = Response(replay["body"], status=replay["status_code"])
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+    try:
+        cache_key = frame_cache_key("mark", frame_data, camera_id)
+        cached = get_cached_result(cache_key)
+
+        if cached is not None:
+            response = Response(cached["body"], status=cached["status_code"])
+            response["X-Frame-Cache"] = "hit"
+        else:
+            response = mark_frame_response(frame_data, camera_id, profile)
+            if is_terminal_mark(response.data):
+                cache_result(cache_key, {"status_code": response.status_code, "body": response.data})
+
+        if claim is not None:
+            complete_idempotency_key(claim, response.status_code, response.data)
+            claim = None
+        return response
+
+    finally:
+        if claim is not None:
+            claim.delete()
+
+def mark_frame_response(frame_data, camera_id, profile):
+    """
+    Decode, embed, match and mark for mark_attendance.
+    """
     try:
         # -------------------------------
         # 1️⃣ Decode image
         # -------------------------------
-        frame = decode_base64_image(frame_data)
+        try:
+            frame, _ = decode_camera_frame(frame_data, camera_id, profile)
+        except ValueError:
+            frame = None
 
         if frame is None:
             return Response({
@@ -122,9 +372,18 @@ def mark_attendance(request):
         # -------------------------------
         # 2️⃣ Extract face embedding
         # -------------------------------
-        embedding = extract_face_embedding(frame)
+        face, quality_reason = extract_gated_face(frame)
+        record_frame(camera_id, faces=int(face is not None or quality_reason is not None))
+
+        if quality_reason:
+            return Response({
+                "status": "success",
+                "code": "LOW_QUALITY_FACE",
+                "message": "Face rejected by quality checks",
+                "data": {"reason": quality_reason}
+            }, status=status.HTTP_200_OK)
 
-        if embedding is None:
+        if face is None:
             return Response({
                 "status": "success",
                 "code": "NO_FACE",
@@ -132,13 +391,18 @@ def mark_attendance(request):
                 "data": {}
             }, status=status.HTTP_200_OK)
 
+        embedding = face.embedding
+        face_crop = crop_face_roi(frame, face.bbox)
+
         # -------------------------------
         # 3️⃣ Try registered user
         # -------------------------------
-        user = recognize_face(embedding)
+        user = recognize_face(embedding, camera_key=camera_id)
 
         if user:
-            if has_recent_attendance(user=user):
+            attendance = record_attendance_once(user=user)
+
+            if attendance is None:
                 return Response({
                     "status": "duplicate",
                     "code": "ATTENDANCE_DUPLICATE",
@@ -146,10 +410,8 @@ def mark_attendance(request):
                     "data": {}
                 }, status=status.HTTP_200_OK)
 
-            attendance = Attendance.objects.create(
-                user=user,
-                timestamp=timezone.now()
-            )
+            submit_face_roi(attendance, face_crop)
+            record_mark(camera_id)
 
             return Response({
                 "status": "success",
@@ -164,9 +426,19 @@ def mark_attendance(request):
         # -------------------------------
         # 4️⃣ Temporary user fallback
         # -------------------------------
-        temp_user, created = match_or_create_temp_user(embedding)
+        temp_user, created = match_or_create_temp_user(embedding, camera_id)
+
+        if temp_user is None:
+            return Response({
+                "status": "success",
+                "code": "FACE_NOT_STABLE",
+                "message": "Face not yet confirmed, keep looking at the camera",
+                "data": {}
+            }, status=status.HTTP_200_OK)
 
-        if has_recent_attendance(temp_user=temp_user):
+        attendance = record_attendance_once(temp_user=temp_user)
+
+        if attendance is None:
             return Response({
                 "status": "duplicate",
                 "code": "TEMP_ATTENDANCE_DUPLICATE",
@@ -174,10 +446,8 @@ def mark_attendance(request):
                 "data": {}
             }, status=status.HTTP_200_OK)
 
-        attendance = Attendance.objects.create(
-            temp_user=temp_user,
-            timestamp=timezone.now()
-        )
+        submit_face_roi(attendance, face_crop)
+        record_mark(camera_id)
 
         return Response({
             "status": "success",
@@ -189,16 +459,407 @@ def mark_attendance(request):
             }
         }, status=status.HTTP_201_CREATED)
 
-    except Exception as e:
+    except Exception:
+        logger.exception("mark_attendance failed")
         return Response({
             "status": "error",
             "code": "ATTENDANCE_FAILED",
             "message": "Internal attendance error",
-            "debug": str(e)
+            "data": {}
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@recognition_formats
+@api_view(["POST"])
+def recognize_and_mark(request):
+    """
+    One pass for door cameras: detects all faces once, matches them in a
+    single vectorised step and marks attendance for every confirmed face in
+    one transaction. Returns the overlay and attendance results together.
+    """
+    frame_data = request.data.get("frame")
+
+    if not frame_data:
+        return Response({
+            "status": "error",
+            "code": "FRAME_MISSING",
+            "message": "Frame field is required",
+            "data": {}
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        device = resolve_device(request)
+    except DeviceAuthError as e:
+        return device_auth_error_response(e)
+
+    camera_id, profile = camera_context(device, request.data)
+
+    try:
+        ticket = admit(admission_key(device, request), frame_age_seconds(
+            request.data.get("captured_at"), request.META.get("HTTP_X_REQUEST_START"),
+        ))
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+
+    try:
+        try:
+            frame, transform = decode_camera_frame(frame_data, camera_id, profile)
+        except ValueError:
+            frame = None
+
+        if frame is None:
+            return Response({
+                "status": "error",
+                "code": "INVALID_IMAGE",
+                "message": "Invalid image",
+                "data": {}
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Static scene: nothing new to mark, reuse the overlay
+        camera_key = camera_id or "default"
+        skipped, cached_faces = check_motion(camera_key, frame)
+
+        if skipped:
+            record_frame(camera_key)
+            return Response({
+                "status": "success",
+                "code": "FACES_DETECTED" if cached_faces else "NO_FACE",
+                "message": "No motion, previous result reused",
+                "data": {"faces": cached_faces, "marked": 0, "motion_skipped": True}
+            }, status=status.HTTP_200_OK)
+
+        results = recognize_faces_from_frame(frame, camera_key=camera_key)
+        overlay = format_recognition_results(results, transform)
+        remember_result(camera_key, overlay)
+        attach_face_crops(frame, results)
+
+        outcomes = mark_frame_attendance(results)
+        submit_marked_face_rois(results, outcomes)
+        faces, marked = attach_attendance(overlay, outcomes)
+        record_frame(camera_key, faces=len(faces), recognized=sum(f["recognized"] for f in faces))
+        record_mark(camera_key, marked)
+
+        return Response({
+            "status": "success",
+            "code": "ATTENDANCE_MARKED" if marked else ("FACES_DETECTED" if faces else "NO_FACE"),
+            "message": f"{marked} attendance record(s) written" if marked else "Faces processed",
+            "data": {"faces": faces, "marked": marked, "motion_skipped": False}
+        }, status=status.HTTP_200_OK)
+
+    except Exception:
+        logger.exception("recognize_and_mark failed")
+        return Response({
+            "status": "error",
+            "code": "RECOGNITION_FAILED",
+            "message": "Internal recognition error",
+            "data": {}
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    finally:
+        release(ticket)
+
+@api_view(["POST"])
+def edge_sync(request):
+    """
+    Bulk ingest of attendance events queued by an edge device (see
+    attendanceapi.edge). Also returns the current gallery version so the
+    edge knows when to pull /api/gallery/changes/. Requires X-Device-Key.
+    """
+    try:
+        device = resolve_device(request)
+    except DeviceAuthError as e:
+        return device_auth_error_response(e)
+
+    if device is None:
+        return device_auth_error_response(
+            DeviceAuthError("DEVICE_KEY_REQUIRED", "X-Device-Key header is required")
+        )
+
+    events = request.data.get("events") or []
+
+    if not isinstance(events, list) or not all(isinstance(e, dict) for e in events):
+        return Response({
+            "status": "error",
+            "code": "INVALID_EVENTS",
+            "message": "events must be a list of objects",
+            "data": {}
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if len(events) > EDGE_SYNC_MAX_EVENTS:
+        return Response({
+            "status": "error",
+            "code": "TOO_MANY_EVENTS",
+            "message": f"At most {EDGE_SYNC_MAX_EVENTS} events per sync",
+            "data": {}
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        ingested = ingest_edge_events(device, events)
+        record_mark(device.camera_id, len(ingested["accepted"]))
+
+        return Response({
+            "status": "success",
+            "code": "EDGE_SYNCED",
+            "message": "Events ingested",
+            "data": {
+                **ingested,
+                "gallery": {"version": gallery_version()},
+            }
+        }, status=status.HTTP_200_OK)
+
+    except Exception:
+        logger.exception("edge_sync failed")
+        return Response({
+            "status": "error",
+            "code": "EDGE_SYNC_FAILED",
+            "message": "Internal sync error",
+            "data": {}
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(["GET"])
+def gallery_changes(request):
+    """
+    Gallery changes after ?since=<version> as a binary delta (see
+    services/gallery_bundle). since=0 returns a full snapshot. Optional
+    ?kind=registered|visitor. 204 when already current. Requires X-Device-Key.
+    """
+    try:
+        device = resolve_device(request)
+    except DeviceAuthError as e:
+        return device_auth_error_response(e)
+
+    if device is None:
+        return device_auth_error_response(
+            DeviceAuthError("DEVICE_KEY_REQUIRED", "X-Device-Key header is required")
+        )
+
+    try:
+        since = int(request.query_params.get("since", 0))
+    except (TypeError, ValueError):
+        since = -1
+
+    kind = request.query_params.get("kind")
+
+    if since < 0 or (kind and kind not in GALLERY_KINDS):
+        return Response({
+            "status": "error",
+            "code": "INVALID_PARAMS",
+            "message": f"since must be a version >= 0 and kind one of {', '.join(GALLERY_KINDS)}",
+            "data": {}
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    version = gallery_version()
+
+    if since and since == version:
+        response = HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    else:
+        delta = collect_gallery_changes(since, (kind,) if kind else GALLERY_KINDS, version)
+        response = HttpResponse(encode_delta(delta), content_type=DELTA_CONTENT_TYPE)
+        response["X-Gallery-Reset"] = "1" if delta["reset"] else "0"
+
+    response["X-Gallery-Version"] = str(version)
+    return response
+
+
+@api_view(["GET"])
+def active_service_sessions(request):
+    """
+    Service sessions running now with their live headcounts (no COUNT
+    queries: read from the worker's present-sets).
+    """
+    return Response({
+        "status": "success",
+        "code": "ACTIVE_SESSIONS",
+        "message": "Active service sessions retrieved",
+        "data": {
+            "sessions": [state.headcount() for state in active_sessions()],
+        }
+    })
+
+@api_view(["GET"])
+def service_session_headcount(request, session_id):
+    """
+    Headcount of one service session, for dashboards polling every few
+    seconds. Sends an ETag; If-None-Match with an unchanged headcount gets an
+    empty 304.
+    """
+    session = ServiceSession.objects.filter(id=session_id).prefetch_related("departments").first()
+
+    if session is None:
+        return Response({
+            "status": "error",
+            "code": "SESSION_NOT_FOUND",
+            "message": "Service session not found",
+            "data": {}
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    headcount = session_headcount(session)
+    etag = '"session-{}-{}-{}"'.format(session.id, headcount["revision"], headcount["total"])
+
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response({
+            "status": "success",
+            "code": "SESSION_HEADCOUNT",
+            "message": "Service session headcount retrieved",
+            "data": headcount,
+        })
+
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def feed_params(request):
+    """
+    Parses an attendance stream request: (cursor, kinds, department_id,
+    session_id). Raises ValueError with a message for bad parameters.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    cursor = None
+    if last_event_id:
+        cursor = parse_cursor(last_event_id)
+        if cursor is None:
+            raise ValueError("Last-Event-ID must be an event id from this stream")
+
+    kind = request.GET.get("kind")
+    if kind and kind not in FEED_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(FEED_KINDS)}")
+
+    try:
+        department_id = int(request.GET["department"]) if request.GET.get("department") else None
+        session_id = int(request.GET["session"]) if request.GET.get("session") else None
+    except ValueError:
+        raise ValueError("department and session must be ids")
+
+    return cursor, (kind,) if kind else FEED_KINDS, department_id, session_id
+
+def feed_error(code, message, http_status):
+    return JsonResponse({
+        "status": "error",
+        "code": code,
+        "message": message,
+        "data": {}
+    }, status=http_status)
+
+def event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: pass events through unbuffered
+    return response
+
+@require_GET
+def attendance_stream(request):
+    """
+    The attendance stream needs the ASGI app (async_views.attendance_stream):
+    under WSGI every open stream would hold a whole worker.
+    """
+    return feed_error(
+        "STREAM_REQUIRES_ASGI",
+        "The attendance stream is only served by the ASGI app",
+        status.HTTP_501_NOT_IMPLEMENTED,
+    )
+
+
+@api_view(["POST"])
+def enroll_face(request):
+    """
+    Enrolls a registered user from several images.
+    The best face of each image is quality-gated and the survivors are fused
+    into one template (plus sub-centroids) used by recognition.
+    """
+    user_id = request.data.get("user_id")
+    frames_data = request.data.get("frames") or []
+
+    if isinstance(frames_data, str):
+        frames_data = [frames_data]
+    if not frames_data and request.data.get("frame"):
+        frames_data = [request.data.get("frame")]
+
+    if not user_id or not frames_data:
+        return Response({
+            "status": "error",
+            "code": "ENROLLMENT_INPUT_MISSING",
+            "message": "user_id and frames are required",
+            "data": {}
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if len(frames_data) > ENROLLMENT_MAX_FRAMES:
+        return Response({
+            "status": "error",
+            "code": "TOO_MANY_FRAMES",
+            "message": f"At most {ENROLLMENT_MAX_FRAMES} frames per enrollment",
+            "data": {}
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    user = CustomUser.objects.filter(id=user_id).first()
+
+    if user is None:
+        return Response({
+            "status": "error",
+            "code": "USER_NOT_FOUND",
+            "message": "User does not exist",
+            "data": {}
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        frames = []
+        for frame_data in frames_data:
+            try:
+                frames.append(decode_base64_image(frame_data))
+            except ValueError:
+                frames.append(None)
+
+        face_embedding, summary = enroll_user(user, frames)
+
+        if face_embedding is None:
+            return Response({
+                "status": "error",
+                "code": "NO_USABLE_FACE",
+                "message": "No frame passed the enrollment quality checks",
+                "data": summary
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "status": "success",
+            "code": "FACE_ENROLLED",
+            "message": "Face template stored",
+            "data": {"user_id": str(user.id), **summary}
+        }, status=status.HTTP_201_CREATED)
+
+    except Exception:
+        logger.exception("enroll_face failed")
+        return Response({
+            "status": "error",
+            "code": "ENROLLMENT_FAILED",
+            "message": "Internal enrollment error",
+            "data": {}
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(["GET"])
 def health_check(request):
+    """
+    Liveness by default; ?mode=ready reports whether this worker has warmed
+    the model and loaded the gallery (503 until it has).
+    """
+    if request.query_params.get("mode") == "ready":
+        state = readiness()
+
+        if not state["ready"]:
+            return Response({
+                "status": "error",
+                "code": "API_NOT_READY",
+                "message": "Worker is still warming up",
+                "data": state
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response({
+            "status": "success",
+            "code": "API_READY",
+            "message": "Worker is warm and ready",
+            "data": state
+        })
+
     return Response({
         "status": "success",
         "code": "API_HEALTHY",
@@ -206,6 +867,197 @@ def health_check(request):
         "data": {}
     })
 
+def gallery_shard_stats():
+    return {
+        f"department-{shard}" if shard is not None else "unassigned": data
+        for shard, data in registered_shard_stats().items()
+    }
+
+def monitoring_access_error(request):
+    """
+    None when the request may read pipeline stats and metrics (staff user,
+    valid device key or an address in METRICS_ALLOWED_IPS), otherwise
+    (code, message, http_status).
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_staff:
+        return None
+
+    if request.META.get("REMOTE_ADDR") in getattr(settings, "METRICS_ALLOWED_IPS", ()):
+        return None
+
+    if request.META.get(DEVICE_KEY_HEADER):
+        try:
+            resolve_device(request)
+        except DeviceAuthError as e:
+            return e.code, e.message, status.HTTP_401_UNAUTHORIZED
+        return None
+
+    return (
+        "MONITORING_FORBIDDEN",
+        "Stats and metrics need a staff login, a device key or an allowed address",
+        status.HTTP_403_FORBIDDEN,
+    )
+
+@api_view(["GET"])
+def pipeline_stats(request):
+    """
+    Runtime counters of the recognition pipeline (per worker process).
+    """
+    error = monitoring_access_error(request)
+    if error:
+        code, message, http_status = error
+        return Response({
+            "status": "error",
+            "code": code,
+            "message": message,
+            "data": {}
+        }, status=http_status)
+
+    return Response({
+        "status": "success",
+        "code": "PIPELINE_STATS",
+        "message": "Pipeline stats retrieved",
+        "data": {
+            "motion_gate": motion_gate_stats(),
+            "admission": admission_stats(),
+            "inference_executor": inference_executor_stats(),
+            "devices": device_stats(),
+            "hot_tier": hot_tier_stats(),
+            "frame_cache": frame_cache_stats(),
+            "face_roi": face_roi_stats(),
+            "sessions": session_stats(),
+            "attendance_feed": attendance_feed_stats(),
+            "gallery_shards": {
+                "shards": gallery_shard_stats(),
+                "match_ms": shard_match_summary(),
+            },
+            "stages_ms": stage_summary(),
+        }
+    })
+
+def metrics(request):
+    """
+    Prometheus text exposition of the pipeline histograms and counters.
+    """
+    error = monitoring_access_error(request)
+    if error:
+        code, message, http_status = error
+        return JsonResponse({
+            "status": "error",
+            "code": code,
+            "message": message,
+            "data": {}
+        }, status=http_status)
+
+    motion = motion_gate_stats()
+    lines = []
+    lines += render_family(
+        "motion_gate_frames_total", "Frames seen by the motion gate",
+        motion["frames"], kind="counter",
+    )
+    lines += render_family(
+        "motion_gate_skipped_total", "Frames short-circuited by the motion gate",
+        motion["skipped"], kind="counter",
+    )
+
+    devices = device_stats()
+    lines += render_family(
+        "camera_frames_total", "Frames processed per camera",
+        {camera: d["frames"] for camera, d in devices.items()}, label_name="camera", kind="counter",
+    )
+    lines += render_family(
+        "camera_recognized_total", "Confirmed recognitions per camera",
+        {camera: d["recognized"] for camera, d in devices.items()}, label_name="camera", kind="counter",
+    )
+    lines += render_family(
+        "camera_fps", "Smoothed frame rate per camera",
+        {camera: d["fps"] for camera, d in devices.items()}, label_name="camera",
+    )
+
+    admission = admission_stats()
+    lines += render_family(
+        "admission_in_flight", "Frames currently admitted to recognition",
+        admission["in_flight"],
+    )
+    lines += render_family(
+        "admission_admitted_total", "Frames admitted to recognition",
+        admission["admitted"], kind="counter",
+    )
+    lines += render_family(
+        "admission_rejected_total", "Frames refused by admission control",
+        admission["rejected"], label_name="reason", kind="counter",
+    )
+
+    shards = gallery_shard_stats()
+    lines += render_family(
+        "gallery_shard_vectors", "Registered gallery vectors per department shard",
+        {shard: d["vectors"] for shard, d in shards.items()}, label_name="shard",
+    )
+
+    hot = hot_tier_stats()
+    lines += render_family(
+        "hot_tier_hits_total", "Probes resolved by the recently-seen tier",
+        {site: t["hits"] for site, t in hot.items()}, label_name="site", kind="counter",
+    )
+    lines += render_family(
+        "hot_tier_misses_total", "Probes that fell through to the full gallery",
+        {site: t["misses"] for site, t in hot.items()}, label_name="site", kind="counter",
+    )
+    lines += render_family(
+        "hot_tier_evictions_total", "Identities evicted from the recently-seen tier",
+        {site: t["evictions"] for site, t in hot.items()}, label_name="site", kind="counter",
+    )
+    lines += render_family(
+        "hot_tier_identities", "Identities held in the recently-seen tier",
+        {site: t["identities"] for site, t in hot.items()}, label_name="site",
+    )
+
+    frames = frame_cache_stats()
+    lines += render_family(
+        "frame_cache_hits_total", "Resent frames answered from the frame cache",
+        frames["hits"], kind="counter",
+    )
+    lines += render_family(
+        "frame_cache_misses_total", "Frames not found in the frame cache",
+        frames["misses"], kind="counter",
+    )
+    lines += render_family(
+        "frame_cache_bytes", "Approximate size of cached frame results",
+        frames["bytes"],
+    )
+
+    rois = face_roi_stats()
+    lines += render_family(
+        "face_roi_dropped_total", "Face crops dropped because the writer queue was full",
+        rois["dropped"], kind="counter",
+    )
+    lines += render_family(
+        "face_roi_queue_depth", "Face crops waiting for the thumbnail writer",
+        rois["queue_depth"],
+    )
+
+    feed = attendance_feed_stats()
+    lines += render_family(
+        "attendance_feed_subscribers", "Open attendance event streams",
+        feed["subscribers"],
+    )
+    lines += render_family(
+        "attendance_feed_events_total", "Attendance events fanned out to streams",
+        feed["events"], kind="counter",
+    )
+
+    sessions = session_stats()
+    lines += render_family(
+        "service_session_headcount", "People present in each active service session",
+        {session_id: h["total"] for session_id, h in sessions.items()}, label_name="session",
+    )
+
+    return HttpResponse(
+        render_prometheus(lines),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
 @api_view(["GET"])
 def api_version(request):
     return Response({
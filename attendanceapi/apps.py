@@ -1,9 +1,35 @@
+import logging
+import os
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 class AttendanceapiConfig(AppConfig):
     name = "attendanceapi"
 
     def ready(self):
-        from attendanceapi.services.face_model import get_face_app
-        get_face_app()
-        print("Face model initialized and ready.")
\ No newline at end of file
+        # Registers the SQLite PRAGMA hook for every new connection
+        from attendanceapi.services import database  # noqa: F401
+
+        # In the gunicorn preload master only the libraries and weights are
+        # loaded; sessions are built per worker after fork.
+        if os.environ.get("FACE_MODEL_PRELOAD", "0") == "1":
+            from attendanceapi.services.face_model import preload_inference_stack
+            preload_inference_stack()
+            return
+
+        # gunicorn workers are warmed by post_worker_init. Other servers can
+        # set FACE_MODEL_WARMUP=1 to build the model and run one dummy
+        # inference here; the active pack and the gallery need the database
+        # and are loaded on first use.
+        if os.environ.get("FACE_MODEL_WARMUP", "0") != "1":
+            return
+
+        from attendanceapi.services.warmup import warm_up_model
+        try:
+            warm_up_model()
+        except Exception:
+            # Serve anyway; /api/health/?mode=ready reports the error
+            logger.exception("Face model warm-up failed")
+            return
+        logger.info("Face model initialized and ready")
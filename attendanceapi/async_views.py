@@ -0,0 +1,588 @@
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+from attendanceapi.api_views import (
+    admission_rejection_body,
+    attach_attendance,
+    event_stream_response,
+    feed_params,
+    format_recognition_results,
+    idempotency_in_progress_body,
+    idempotency_key_error,
+    is_terminal_faces,
+    is_terminal_mark,
+    request_idempotency_owner,
+)
+from attendanceapi.renderers import negotiate_recognition
+from attendanceapi.services.admission import (
+    AdmissionRejected,
+    admit,
+    ensure_current,
+    frame_age_seconds,
+    release,
+)
+from attendanceapi.services.attendance_service import arecord_attendance_once, mark_frame_attendance
+from attendanceapi.services.face_recognition_service import (
+    aload_registered_scope,
+    extract_gated_face,
+    match_or_create_temp_user,
+    recognize_face,
+    recognize_faces_from_frame,
+)
+from attendanceapi.services.devices import (
+    DeviceAuthError,
+    admission_key,
+    aresolve_device,
+    camera_context,
+    record_frame,
+    record_mark,
+)
+from attendanceapi.services.event_feed import FeedFull, aiter_feed
+from attendanceapi.services.face_roi import (
+    attach_face_crops,
+    crop_face_roi,
+    submit_face_roi,
+    submit_marked_face_rois,
+)
+from attendanceapi.services.frame_cache import cache_result, frame_cache_key, get_cached_result
+from attendanceapi.services.idempotency import (
+    MARK_SCOPE,
+    IdempotencyInProgress,
+    aclaim_idempotency_key,
+    acomplete_idempotency_key,
+)
+from attendanceapi.services.image_utils import decode_camera_frame
+from attendanceapi.services.inference_executor import InferenceBusy, run_inference
+from attendanceapi.services.motion_gate import check_motion, remember_result
+from attendanceapi.services.sessions import aget_session_state
+from attendanceapi.services.warmup import readiness
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Async (ASGI) variants
+# -------------------------------
+# Served when ATTENDANCE_ASYNC_VIEWS is on (asgi.py turns it on). Decoding and
+# inference run in the bounded inference executor, the ORM work uses Django's
+# async API, and health/version answer straight from the event loop so they
+# never wait behind a frame. Responses match the sync views in api_views.
+
+
+def _payload(request):
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError:
+            return {}
+    return request.POST
+
+
+def _respond(body, http_status, negotiated=None):
+    """
+    JsonResponse, or the body in the format negotiated for a recognition
+    endpoint (negotiate_recognition).
+    """
+    if negotiated is None:
+        return JsonResponse(body, status=http_status)
+
+    renderer, media_type = negotiated
+    return HttpResponse(renderer.render(body, media_type), content_type=renderer.media_type, status=http_status)
+
+
+def _error(code, message, http_status, negotiated=None):
+    return _respond({
+        "status": "error",
+        "code": code,
+        "message": message,
+        "data": {}
+    }, http_status, negotiated)
+
+
+def _busy(negotiated=None):
+    response = _error(
+        "INFERENCE_BUSY",
+        "Recognition is at capacity, retry shortly",
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+        negotiated,
+    )
+    response["Retry-After"] = "1"
+    return response
+
+
+def _unauthorized(e, negotiated=None):
+    return _error(e.code, e.message, status.HTTP_401_UNAUTHORIZED, negotiated)
+
+
+def _rejected(e, negotiated=None):
+    response = _respond(admission_rejection_body(e), e.http_status, negotiated)
+    if e.retry_after:
+        response["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def _recognize(frame_data, camera_id, profile, scope, ticket):
+    """
+    CPU part of recognize_frame, run on the inference executor.
+    Returns (faces, motion_skipped), or None for an undecodable frame.
+    """
+    # The frame may have waited for a pool thread; drop it if stale/superseded
+    ensure_current(ticket)
+
+    try:
+        frame, transform = decode_camera_frame(frame_data, camera_id, profile)
+    except ValueError:
+        return None
+
+    if frame is None:
+        return None
+
+    camera_key = camera_id or "default"
+    skipped, cached_faces = check_motion(camera_key, frame)
+
+    if skipped:
+        record_frame(camera_key)
+        return cached_faces, True
+
+    results = recognize_faces_from_frame(frame, camera_key=camera_key, scope=scope)
+    faces = format_recognition_results(results, transform)
+    remember_result(camera_key, faces)
+    record_frame(camera_key, faces=len(faces), recognized=sum(f["recognized"] for f in faces))
+
+    return faces, False
+
+
+def _recognize_for_marking(frame_data, camera_id, profile, scope, ticket):
+    """
+    CPU part of recognize_and_mark. Returns (results, overlay, motion_skipped)
+    or None for an undecodable frame; results is None when the motion gate
+    reused the previous overlay.
+    """
+    ensure_current(ticket)
+
+    try:
+        frame, transform = decode_camera_frame(frame_data, camera_id, profile)
+    except ValueError:
+        return None
+
+    if frame is None:
+        return None
+
+    camera_key = camera_id or "default"
+    skipped, cached_faces = check_motion(camera_key, frame)
+
+    if skipped:
+        record_frame(camera_key)
+        return None, cached_faces, True
+
+    results = recognize_faces_from_frame(frame, camera_key=camera_key, scope=scope)
+    overlay = format_recognition_results(results, transform)
+    remember_result(camera_key, overlay)
+    attach_face_crops(frame, results)
+
+    return results, overlay, False
+
+
+def _extract(frame_data, camera_id, profile):
+    """
+    CPU part of mark_attendance: decode and embed the best face.
+    Returns (embedding, quality_reason, face_crop), or None for an
+    undecodable frame.
+    """
+    try:
+        frame, _ = decode_camera_frame(frame_data, camera_id, profile)
+    except ValueError:
+        return None
+
+    if frame is None:
+        return None
+
+    face, quality_reason = extract_gated_face(frame)
+    record_frame(camera_id, faces=int(face is not None or quality_reason is not None))
+
+    if face is None:
+        return None, quality_reason, None
+    return face.embedding, None, crop_face_roi(frame, face.bbox)
+
+
+def _match(embedding, camera_id, scope):
+    """
+    Gallery search part of mark_attendance. Returns the user or None.
+    """
+    return recognize_face(embedding, camera_key=camera_id, scope=scope)
+
+
+@csrf_exempt
+@require_POST
+async def recognize_frame(request):
+    negotiated = negotiate_recognition(request.META.get("HTTP_ACCEPT"))
+    data = _payload(request)
+    frame_data = data.get("frame")
+
+    if not frame_data:
+        return _error("FRAME_MISSING", "Frame field is required", status.HTTP_400_BAD_REQUEST, negotiated)
+
+    try:
+        device = await aresolve_device(request)
+    except DeviceAuthError as e:
+        return _unauthorized(e, negotiated)
+
+    camera_id, profile = camera_context(device, data)
+    camera_key = camera_id or "default"
+
+    cache_key = frame_cache_key("recognize", frame_data, camera_key)
+    cached_faces = get_cached_result(cache_key)
+
+    if cached_faces is not None:
+        record_frame(camera_key)
+        return _respond({
+            "status": "success",
+            "code": "FACES_DETECTED" if cached_faces else "NO_FACE",
+            "message": "Identical frame, previous result reused",
+            "data": {"faces": cached_faces, "motion_skipped": False, "frame_cached": True}
+        }, status.HTTP_200_OK, negotiated)
+
+    try:
+        ticket = admit(admission_key(device, request), frame_age_seconds(
+            data.get("captured_at"), request.META.get("HTTP_X_REQUEST_START"),
+        ))
+    except AdmissionRejected as e:
+        return _rejected(e, negotiated)
+
+    try:
+        scope = await aload_registered_scope(camera_id)
+        outcome = await run_inference(_recognize, frame_data, camera_id, profile, scope, ticket)
+
+        if outcome is None:
+            return _error("INVALID_IMAGE", "Invalid image", status.HTTP_400_BAD_REQUEST, negotiated)
+
+        faces, skipped = outcome
+        if not skipped and is_terminal_faces(faces):
+            cache_result(cache_key, faces)
+
+        return _respond({
+            "status": "success",
+            "code": "FACES_DETECTED" if faces else "NO_FACE",
+            "message": "No motion, previous result reused" if skipped else "Faces processed",
+            "data": {"faces": faces, "motion_skipped": skipped}
+        }, status.HTTP_200_OK, negotiated)
+
+    except AdmissionRejected as e:
+        return _rejected(e, negotiated)
+
+    except InferenceBusy:
+        return _busy(negotiated)
+
+    except Exception:
+        logger.exception("recognize_frame failed")
+        return _error("RECOGNITION_FAILED", "Internal recognition error",
+                      status.HTTP_500_INTERNAL_SERVER_ERROR, negotiated)
+
+    finally:
+        release(ticket)
+
+
+@csrf_exempt
+@require_POST
+async def mark_attendance(request):
+    data = _payload(request)
+    frame_data = data.get("frame")
+
+    if not frame_data:
+        return _error("FRAME_MISSING", "Frame field is required", status.HTTP_400_BAD_REQUEST)
+
+    try:
+        device = await aresolve_device(request)
+    except DeviceAuthError as e:
+        return _unauthorized(e)
+
+    camera_id, profile = camera_context(device, data)
+
+    idempotency_key = request.headers.get("Idempotency-Key")
+    claim = None
+
+    if idempotency_key:
+        error = idempotency_key_error(idempotency_key)
+        if error:
+            return _error("INVALID_IDEMPOTENCY_KEY", error, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            claim, replay = await aclaim_idempotency_key(
+                MARK_SCOPE, idempotency_key, device, request_idempotency_owner(request, device),
+            )
+        except IdempotencyInProgress:
+            return JsonResponse(idempotency_in_progress_body(), status=status.HTTP_409_CONFLICT)
+
+        if replay is not None:
+            response = JsonResponse(replay["body"], status=replay["status_code"])
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+    try:
+        cache_key = frame_cache_key("mark", frame_data, camera_id)
+        cached = get_cached_result(cache_key)
+
+        if cached is not None:
+            body, status_code = cached["body"], cached["status_code"]
+        else:
+            response = await _mark_frame(frame_data, camera_id, profile)
+            body, status_code = json.loads(response.content), response.status_code
+            if is_terminal_mark(body):
+                cache_result(cache_key, {"status_code": status_code, "body": body})
+
+        if claim is not None:
+            await acomplete_idempotency_key(claim, status_code, body)
+            claim = None
+
+        if cached is None:
+            return response
+        response = JsonResponse(body, status=status_code)
+        response["X-Frame-Cache"] = "hit"
+        return response
+
+    finally:
+        if claim is not None:
+            await claim.adelete()
+
+
+async def _mark_frame(frame_data, camera_id, profile):
+    """
+    Decode, embed, match and mark for mark_attendance.
+    """
+    try:
+        outcome = await run_inference(_extract, frame_data, camera_id, profile)
+
+        if outcome is None:
+            return _error("INVALID_IMAGE", "Invalid or corrupted image", status.HTTP_400_BAD_REQUEST)
+
+        embedding, quality_reason, face_crop = outcome
+
+        if quality_reason:
+            return JsonResponse({
+                "status": "success",
+                "code": "LOW_QUALITY_FACE",
+                "message": "Face rejected by quality checks",
+                "data": {"reason": quality_reason}
+            }, status=status.HTTP_200_OK)
+
+        if embedding is None:
+            return JsonResponse({
+                "status": "success",
+                "code": "NO_FACE",
+                "message": "No face detected in frame",
+                "data": {}
+            }, status=status.HTTP_200_OK)
+
+        # Registered user: the scope is loaded here, the search runs on the executor
+        scope = await aload_registered_scope(camera_id)
+        user = await run_inference(_match, embedding, camera_id, scope)
+
+        if user:
+            attendance = await arecord_attendance_once(user=user)
+
+            if attendance is None:
+                return JsonResponse({
+                    "status": "duplicate",
+                    "code": "ATTENDANCE_DUPLICATE",
+                    "message": "Attendance already marked recently",
+                    "data": {}
+                }, status=status.HTTP_200_OK)
+
+            submit_face_roi(attendance, face_crop)
+            record_mark(camera_id)
+
+            return JsonResponse({
+                "status": "success",
+                "code": "ATTENDANCE_MARKED",
+                "message": "Attendance recorded successfully",
+                "data": {
+                    "attendance_id": attendance.id,
+                    "user_id": user.id
+                }
+            }, status=status.HTTP_201_CREATED)
+
+        # Temporary user fallback (visitor scan stays on the sync ORM)
+        temp_user, created = await sync_to_async(match_or_create_temp_user)(embedding, camera_id)
+
+        if temp_user is None:
+            return JsonResponse({
+                "status": "success",
+                "code": "FACE_NOT_STABLE",
+                "message": "Face not yet confirmed, keep looking at the camera",
+                "data": {}
+            }, status=status.HTTP_200_OK)
+
+        attendance = await arecord_attendance_once(temp_user=temp_user)
+
+        if attendance is None:
+            return JsonResponse({
+                "status": "duplicate",
+                "code": "TEMP_ATTENDANCE_DUPLICATE",
+                "message": "Temporary attendance already marked recently",
+                "data": {}
+            }, status=status.HTTP_200_OK)
+
+        submit_face_roi(attendance, face_crop)
+        record_mark(camera_id)
+
+        return JsonResponse({
+            "status": "success",
+            "code": "TEMP_ATTENDANCE_MARKED",
+            "message": "Temporary attendance recorded",
+            "data": {
+                "temp_user_id": temp_user.id,
+                "created": created
+            }
+        }, status=status.HTTP_201_CREATED)
+
+    except InferenceBusy:
+        return _busy()
+
+    except Exception:
+        logger.exception("mark_attendance failed")
+        return _error("ATTENDANCE_FAILED", "Internal attendance error",
+                      status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def recognize_and_mark(request):
+    negotiated = negotiate_recognition(request.META.get("HTTP_ACCEPT"))
+    data = _payload(request)
+    frame_data = data.get("frame")
+
+    if not frame_data:
+        return _error("FRAME_MISSING", "Frame field is required", status.HTTP_400_BAD_REQUEST, negotiated)
+
+    try:
+        device = await aresolve_device(request)
+    except DeviceAuthError as e:
+        return _unauthorized(e, negotiated)
+
+    camera_id, profile = camera_context(device, data)
+
+    try:
+        ticket = admit(admission_key(device, request), frame_age_seconds(
+            data.get("captured_at"), request.META.get("HTTP_X_REQUEST_START"),
+        ))
+    except AdmissionRejected as e:
+        return _rejected(e, negotiated)
+
+    try:
+        scope = await aload_registered_scope(camera_id)
+        outcome = await run_inference(_recognize_for_marking, frame_data, camera_id, profile, scope, ticket)
+
+        if outcome is None:
+            return _error("INVALID_IMAGE", "Invalid image", status.HTTP_400_BAD_REQUEST, negotiated)
+
+        results, overlay, skipped = outcome
+
+        if skipped:
+            return _respond({
+                "status": "success",
+                "code": "FACES_DETECTED" if overlay else "NO_FACE",
+                "message": "No motion, previous result reused",
+                "data": {"faces": overlay, "marked": 0, "motion_skipped": True}
+            }, status.HTTP_200_OK, negotiated)
+
+        outcomes = await sync_to_async(mark_frame_attendance)(results)
+        submit_marked_face_rois(results, outcomes)
+        faces, marked = attach_attendance(overlay, outcomes)
+        camera_key = camera_id or "default"
+        record_frame(camera_key, faces=len(faces), recognized=sum(f["recognized"] for f in faces))
+        record_mark(camera_key, marked)
+
+        return _respond({
+            "status": "success",
+            "code": "ATTENDANCE_MARKED" if marked else ("FACES_DETECTED" if faces else "NO_FACE"),
+            "message": f"{marked} attendance record(s) written" if marked else "Faces processed",
+            "data": {"faces": faces, "marked": marked, "motion_skipped": False}
+        }, status.HTTP_200_OK, negotiated)
+
+    except AdmissionRejected as e:
+        return _rejected(e, negotiated)
+
+    except InferenceBusy:
+        return _busy(negotiated)
+
+    except Exception:
+        logger.exception("recognize_and_mark failed")
+        return _error("RECOGNITION_FAILED", "Internal recognition error",
+                      status.HTTP_500_INTERNAL_SERVER_ERROR, negotiated)
+
+    finally:
+        release(ticket)
+
+
+@require_GET
+async def attendance_stream(request):
+    """
+    Server-Sent Events feed of attendance as it is written ("attendance"
+    events; "headcount" events too with ?session=<id>). Optional
+    ?kind=registered|visitor and ?department=<id>. Reconnects resume from
+    Last-Event-ID (or ?last_event_id=). Open streams wait on the event loop
+    instead of holding a worker each.
+    """
+    try:
+        cursor, kinds, department_id, session_id = feed_params(request)
+    except ValueError as e:
+        return _error("INVALID_PARAMS", str(e), status.HTTP_400_BAD_REQUEST)
+
+    headcount = None
+    if session_id is not None:
+        async def headcount():
+            state = await aget_session_state(session_id)
+            return state.headcount() if state else None
+
+    try:
+        stream = await aiter_feed(cursor, kinds, department_id, headcount)
+    except FeedFull:
+        response = _error("FEED_FULL", "Too many open streams, retry shortly", status.HTTP_503_SERVICE_UNAVAILABLE)
+        response["Retry-After"] = "5"
+        return response
+
+    return event_stream_response(stream)
+
+
+@require_GET
+async def health_check(request):
+    if request.GET.get("mode") == "ready":
+        state = readiness()
+
+        if not state["ready"]:
+            return JsonResponse({
+                "status": "error",
+                "code": "API_NOT_READY",
+                "message": "Worker is still warming up",
+                "data": state
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return JsonResponse({
+            "status": "success",
+            "code": "API_READY",
+            "message": "Worker is warm and ready",
+            "data": state
+        })
+
+    return JsonResponse({
+        "status": "success",
+        "code": "API_HEALTHY",
+        "message": "Attendance API is running",
+        "data": {}
+    })
+
+
+@require_GET
+async def api_version(request):
+    return JsonResponse({
+        "status": "success",
+        "code": "API_VERSION",
+        "message": "API version retrieved",
+        "data": {
+            "name": "Smart Attendance System API",
+            "version": "1.0.0",
+        }
+    })
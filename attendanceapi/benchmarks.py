@@ -0,0 +1,600 @@
+"""
+Benchmarks for the recognition and attendance hot paths.
+
+Cases follow the pytest-benchmark calling convention: each ``bench_*``
+function receives a ``benchmark`` callable, calls it once with the function
+under test and may fill ``benchmark.extra_info``. ``run_benchmarks`` drives
+them against synthetic data and returns a JSON-serialisable report; the
+``benchmark`` management command is the usual entry point.
+
+Everything runs offline: the face model is replaced by FakeFaceAnalysis and
+all seeded rows are rolled back when the run ends. ``run_write_benchmark``
+(``benchmark_writes`` command) measures concurrent attendance writes under
+each database profile instead.
+"""
+import base64
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+import cv2
+import numpy as np
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connections, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from attendanceapi.models import Attendance, FaceEmbedding, TempAttendance
+from attendanceapi.services import face_model
+from attendanceapi.services import face_recognition_service as recognition
+from attendanceapi.services.attendance_service import has_recent_attendance, mark_frame_attendance
+from attendanceapi.services.database import sqlite_pragmas
+from attendanceapi.services.devices import get_tracker, reset_device_state
+from attendanceapi.services.fake_face_model import FakeFaceAnalysis, synthetic_frame
+from attendanceapi.services.gallery import REGISTERED, VISITOR, invalidate_gallery, record_gallery_changes
+from attendanceapi.services.hot_tier import reset_hot_tiers
+from attendanceapi.services.image_utils import decode_base64_image
+from attendanceapi.utils import (
+    get_members_attendance,
+    get_temp_attendance,
+    get_workers_attendance,
+)
+from userauth.models import CustomUser, TempUser
+
+DEFAULT_GALLERY_SIZES = (1000, 10000, 100000)
+DEFAULT_DB_MAX_SIZE = 10000
+DEFAULT_RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080))
+EMBEDDING_SIZE = 512
+SEED_BATCH_SIZE = 2000
+BENCH_PREFIX = "bench_"
+VISITOR_SHARE = 0.2  # Visitor (TempAttendance) rows seeded per Attendance row
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Benchmark:
+    """
+    Minimal pytest-benchmark compatible fixture.
+    """
+
+    def __init__(self, rounds=20, warmup=2):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.timings = []
+        self.extra_info = {}
+
+    def __call__(self, fn, *args, **kwargs):
+        for _ in range(self.warmup):
+            fn(*args, **kwargs)
+
+        result = None
+        for _ in range(self.rounds):
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            self.timings.append(time.perf_counter() - started)
+
+        return result
+
+    def pedantic(self, fn, args=(), kwargs=None, setup=None, rounds=None, warmup_rounds=0):
+        """
+        Like __call__ but runs `setup` (untimed) before every round.
+        """
+        kwargs = kwargs or {}
+        result = None
+
+        for i in range(warmup_rounds + (rounds or self.rounds)):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            if i >= warmup_rounds:
+                self.timings.append(time.perf_counter() - started)
+
+        return result
+
+    def stats(self):
+        timings = sorted(self.timings)
+        if not timings:
+            return {}
+
+        mean = statistics.fmean(timings)
+        return {
+            "rounds": len(timings),
+            "min": timings[0],
+            "max": timings[-1],
+            "mean": mean,
+            "median": statistics.median(timings),
+            "p95": timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+            "stddev": statistics.pstdev(timings),
+            "ops": 1.0 / mean if mean else None,
+        }
+
+
+# -------------------------------
+# Synthetic data
+# -------------------------------
+def random_unit_vectors(count, rng, dim=EMBEDDING_SIZE):
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def encode_frame(frame, quality=85):
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return base64.b64encode(buffer.tobytes()).decode()
+
+
+class BenchmarkContext:
+    """
+    Seeds the database incrementally so larger sizes reuse smaller ones.
+    """
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.registered_vectors = np.zeros((0, EMBEDDING_SIZE), dtype=np.float32)
+        self.visitor_vectors = np.zeros((0, EMBEDDING_SIZE), dtype=np.float32)
+        self.users = []
+        self.visitors = []
+        self.attendance_rows = 0
+
+    def ensure_registered(self, size):
+        missing = size - len(self.registered_vectors)
+        if missing <= 0:
+            return self.registered_vectors[:size]
+
+        start = len(self.registered_vectors)
+        vectors = random_unit_vectors(missing, self.rng)
+
+        for offset in range(0, missing, SEED_BATCH_SIZE):
+            chunk = vectors[offset:offset + SEED_BATCH_SIZE]
+            users = CustomUser.objects.bulk_create([
+                CustomUser(
+                    username=f"{BENCH_PREFIX}{start + offset + i}",
+                    email=f"{BENCH_PREFIX}{start + offset + i}@bench.invalid",
+                    password="!",
+                )
+                for i in range(len(chunk))
+            ])
+            FaceEmbedding.objects.bulk_create([
+                FaceEmbedding(user=user, embedding=np.round(vector, 5).tolist())
+                for user, vector in zip(users, chunk)
+            ])
+            record_gallery_changes(REGISTERED, [user.id for user in users])
+            self.users.extend(users)
+
+        self.registered_vectors = np.vstack([self.registered_vectors, vectors])
+        return self.registered_vectors[:size]
+
+    def ensure_visitors(self, size):
+        missing = size - len(self.visitor_vectors)
+        if missing <= 0:
+            return self.visitor_vectors[:size]
+
+        start = len(self.visitor_vectors)
+        vectors = random_unit_vectors(missing, self.rng)
+
+        for offset in range(0, missing, SEED_BATCH_SIZE):
+            chunk = vectors[offset:offset + SEED_BATCH_SIZE]
+            visitors = TempUser.objects.bulk_create([
+                TempUser(
+                    temp_username=f"{BENCH_PREFIX}visitor_{start + offset + i}",
+                    temp_email=f"{BENCH_PREFIX}visitor_{start + offset + i}@bench.invalid",
+                    face_embedding=np.round(vector, 5).tolist(),
+                    model_version=face_model.face_model_version(),
+                )
+                for i, vector in enumerate(chunk)
+            ])
+            record_gallery_changes(VISITOR, [visitor.id for visitor in visitors])
+            self.visitors.extend(visitors)
+
+        self.visitor_vectors = np.vstack([self.visitor_vectors, vectors])
+        return self.visitor_vectors[:size]
+
+    def ensure_attendance(self, rows):
+        """
+        Spreads `rows` Attendance rows over the seeded users and the last
+        week, plus VISITOR_SHARE as many TempAttendance rows over visitors.
+        """
+        missing = rows - self.attendance_rows
+        if missing <= 0:
+            return
+
+        self.ensure_registered(max(1, min(rows, 1000)))
+        now = timezone.localtime()
+
+        batch = []
+        for i in range(missing):
+            user = self.users[i % len(self.users)]
+            moment = self._recent_moment(now)
+            batch.append(Attendance(
+                member=user,
+                role="member" if i % 5 else "usher_admin",
+                date=moment.date(),
+                time=moment.time(),
+                created_at=moment,
+            ))
+        Attendance.objects.bulk_create(batch, batch_size=SEED_BATCH_SIZE)
+
+        visits = int(rows * VISITOR_SHARE) - int(self.attendance_rows * VISITOR_SHARE)
+        if visits > 0:
+            self.ensure_visitors(max(1, min(int(rows * VISITOR_SHARE), 200)))
+            batch = []
+            for i in range(visits):
+                moment = self._recent_moment(now)
+                batch.append(TempAttendance(
+                    temp_user=self.visitors[i % len(self.visitors)],
+                    date=moment.date(),
+                    time=moment.time(),
+                    created_at=moment,
+                ))
+            TempAttendance.objects.bulk_create(batch, batch_size=SEED_BATCH_SIZE)
+
+        self.attendance_rows = rows
+
+    def _recent_moment(self, now):
+        return now - timedelta(minutes=int(self.rng.integers(0, 7 * 24 * 60)))
+
+
+# -------------------------------
+# Cases
+# -------------------------------
+def bench_decode_base64_image(benchmark, ctx, width, height):
+    payload = encode_frame(synthetic_frame(width, height))
+    benchmark.extra_info["payload_bytes"] = len(payload)
+    frame = benchmark(decode_base64_image, payload)
+    assert frame is not None and frame.shape[:2] == (height, width)
+
+
+def bench_match_registered(benchmark, ctx, size):
+    """
+    Vectorised match of one probe against an in-memory gallery.
+    """
+    vectors = random_unit_vectors(size, ctx.rng)
+    owners = list(range(size))
+    gallery = (vectors, owners)
+    probe = vectors[size // 2] + 0.01 * ctx.rng.standard_normal(EMBEDDING_SIZE).astype(np.float32)
+
+    owner, distance = benchmark(recognition.match_registered, probe, gallery)
+    assert owner == size // 2
+    benchmark.extra_info["distance"] = distance
+
+
+def bench_recognize_faces_from_frame(benchmark, ctx, size, faces_per_frame=3):
+    """
+    Full per-frame path with the fake model: detect, gate, embed, DB gallery
+    load and match.
+    """
+    vectors = ctx.ensure_registered(size)
+    app = face_model.get_face_app()
+    app.faces_per_frame = faces_per_frame
+    app.set_identities(vectors[:faces_per_frame])
+    frame = synthetic_frame(1280, 720)
+
+    reset_device_state()
+    reset_hot_tiers()
+    results = benchmark(recognition.recognize_faces_from_frame, frame)
+    benchmark.extra_info["faces"] = len(results)
+
+
+def bench_match_or_create_temp_user(benchmark, ctx, size):
+    vectors = ctx.ensure_visitors(size)
+    probe = vectors[size // 2]
+    tracker = get_tracker(None)
+
+    def _prime():
+        # Leave the probe one sighting short of confirmation
+        tracker.clear()
+        for _ in range(recognition.FACE_CONFIRMATION_FRAMES - 1):
+            tracker.observe(probe)
+
+    temp_user, created = benchmark.pedantic(
+        recognition.match_or_create_temp_user, args=(probe,), setup=_prime,
+        rounds=max(3, benchmark.rounds // 4),
+    )
+    assert temp_user is not None and not created
+
+
+def bench_has_recent_attendance(benchmark, ctx, rows):
+    ctx.ensure_attendance(rows)
+    user = ctx.users[0]
+    benchmark(has_recent_attendance, user=user)
+
+
+REPORTS = {
+    "members": get_members_attendance,
+    "workers": get_workers_attendance,
+    "visitors": get_temp_attendance,
+}
+
+
+def bench_report_query(benchmark, ctx, rows, report):
+    ctx.ensure_attendance(rows)
+    request = RequestFactory().get("/", {"sort": "last_7_days"})
+    query = REPORTS[report]
+
+    rows_returned = benchmark(lambda: len(list(query(request))))
+    benchmark.extra_info["rows_returned"] = rows_returned
+
+
+# -------------------------------
+# Runner
+# -------------------------------
+def build_plan(sizes, db_max_size, resolutions):
+    db_sizes = [s for s in sizes if s <= db_max_size]
+    plan = []
+
+    for width, height in resolutions:
+        plan.append(("decode_base64_image", bench_decode_base64_image, {"width": width, "height": height}))
+    for size in sizes:
+        plan.append(("match_registered", bench_match_registered, {"size": size}))
+    for size in db_sizes:
+        plan.append(("recognize_faces_from_frame", bench_recognize_faces_from_frame, {"size": size}))
+    for size in db_sizes:
+        plan.append(("match_or_create_temp_user", bench_match_or_create_temp_user, {"size": size}))
+    for rows in db_sizes:
+        plan.append(("has_recent_attendance", bench_has_recent_attendance, {"rows": rows}))
+        for report in REPORTS:
+            plan.append(("report_query", bench_report_query, {"rows": rows, "report": report}))
+
+    return plan
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_GALLERY_SIZES, db_max_size=DEFAULT_DB_MAX_SIZE,
+                   resolutions=DEFAULT_RESOLUTIONS, rounds=20, warmup=2,
+                   only=None, seed=0, log=None):
+    """
+    Runs every case and returns the JSON report. Seeded rows are rolled back.
+    """
+    plan = [
+        case for case in build_plan(sizes, db_max_size, resolutions)
+        if not only or case[0] in only
+    ]
+    ctx = BenchmarkContext(seed=seed)
+    previous_app = face_model.set_face_app(FakeFaceAnalysis(seed=seed))
+    results = []
+
+    try:
+        with transaction.atomic():
+            for name, case, params in plan:
+                bench = Benchmark(rounds=rounds, warmup=warmup)
+                case(bench, ctx, **params)
+                results.append({
+                    "name": name,
+                    "params": params,
+                    "stats": bench.stats(),
+                    "extra_info": bench.extra_info,
+                })
+                if log:
+                    log(results[-1])
+            raise _Rollback()
+    except _Rollback:
+        pass
+    finally:
+        face_model.set_face_app(previous_app)
+        reset_device_state()
+        reset_hot_tiers()
+        # The rolled-back change log ids will be reused
+        invalidate_gallery()
+
+    return {
+        "meta": {
+            "created_at": timezone.now().isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "rounds": rounds,
+            "warmup": warmup,
+            "sizes": list(sizes),
+            "db_max_size": db_max_size,
+        },
+        "results": results,
+    }
+
+
+# -------------------------------
+# Concurrent writes per database profile
+# -------------------------------
+# Forks `workers` processes (like gunicorn workers) that mark attendance
+# through mark_frame_attendance as fast as they can, each for its own users,
+# and reports marks per second, latency and failed writes per profile.
+# SQLite profiles run on scratch copies of a freshly migrated database;
+# other engines use the configured database and delete their rows after.
+
+WRITE_PROFILES = {
+    # Plain SQLite: rollback journal, full sync, deferred transactions and a
+    # new connection per request
+    "sqlite_default": {
+        "vendor": "sqlite",
+        "pragmas": {"busy_timeout": 5000, "journal_mode": "delete", "synchronous": "full"},
+        "transaction_mode": None,
+        "persistent": False,
+    },
+    # The configured profile (settings.SQLITE_PRAGMAS, BEGIN IMMEDIATE, CONN_MAX_AGE)
+    "sqlite_wal": {
+        "vendor": "sqlite",
+        "pragmas": None,
+        "transaction_mode": "IMMEDIATE",
+        "persistent": True,
+    },
+    "postgres_per_request": {"vendor": "postgresql", "persistent": False},
+    "postgres_persistent": {"vendor": "postgresql", "persistent": True},
+}
+WRITE_BENCH_ALIAS = "write_benchmark"
+
+
+def _write_worker(settings_dict, profile, user_ids, faces, barrier, results):
+    # Runs in a forked child: point the (closed) default connection at the
+    # profile before its first query
+    connection = connections["default"]
+    connection.settings_dict = settings_dict
+    if profile.get("pragmas") is not None:
+        settings.SQLITE_PRAGMAS = profile["pragmas"]
+
+    users = list(CustomUser.objects.filter(id__in=user_ids).order_by("id"))
+    if not profile["persistent"]:
+        connection.close()
+
+    timings, errors = [], 0
+    barrier.wait()
+    started = time.perf_counter()
+
+    for offset in range(0, len(users), faces):
+        frame = [{"recognized": True, "user": user, "distance": 0.3} for user in users[offset:offset + faces]]
+        round_started = time.perf_counter()
+        try:
+            mark_frame_attendance(frame)
+        except DatabaseError:
+            errors += 1
+        finally:
+            if not profile["persistent"]:
+                connection.close()
+        timings.append(time.perf_counter() - round_started)
+
+    connection.close()
+    results.put({"timings": timings, "errors": errors, "elapsed": time.perf_counter() - started})
+
+
+def _seed_write_users(alias, prefix, count):
+    CustomUser.objects.using(alias).bulk_create([
+        CustomUser(username=f"{prefix}{i}", email=f"{prefix}{i}@bench.invalid", password="!")
+        for i in range(count)
+    ], batch_size=SEED_BATCH_SIZE)
+    return list(
+        CustomUser.objects.using(alias).filter(username__startswith=prefix).order_by("id").values_list("id", flat=True)
+    )
+
+
+def _run_write_profile(name, settings_dict, user_ids, workers, faces):
+    profile = WRITE_PROFILES[name]
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    share = len(user_ids) // workers
+
+    # Never hand an open connection to the children
+    connections.close_all()
+    processes = [
+        context.Process(
+            target=_write_worker,
+            args=(settings_dict, profile, user_ids[i * share:(i + 1) * share], faces, barrier, results),
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    bench = Benchmark()
+    bench.timings = [timing for report in reports for timing in report["timings"]]
+    frames = len(bench.timings)
+    errors = sum(report["errors"] for report in reports)
+    elapsed = max(report["elapsed"] for report in reports)
+
+    return {
+        "name": "concurrent_marks",
+        "params": {"profile": name, "workers": workers, "faces": faces},
+        "stats": bench.stats(),
+        "extra_info": {
+            "frames": frames,
+            "failed_frames": errors,
+            "marks": (frames - errors) * faces,
+            "elapsed": round(elapsed, 3),
+            "marks_per_second": round((frames - errors) * faces / elapsed, 1) if elapsed else None,
+        },
+    }
+
+
+def run_write_benchmark(profiles=None, workers=4, frames=200, faces=1, log=None):
+    """
+    Runs the concurrent mark benchmark for every profile of the configured
+    database vendor (or the named ones) and returns the JSON report.
+    """
+    base = dict(connections["default"].settings_dict)
+    vendor = connections["default"].vendor
+    names = [
+        name for name in (profiles or WRITE_PROFILES)
+        if name in WRITE_PROFILES and WRITE_PROFILES[name]["vendor"] == vendor
+    ]
+    if not names:
+        raise ValueError(f"No write profiles for the {vendor} database")
+
+    count = workers * frames * faces
+    scratch = tempfile.mkdtemp(prefix="write_benchmark_") if vendor == "sqlite" else None
+    results = []
+
+    try:
+        if scratch:
+            template = os.path.join(scratch, "template.sqlite3")
+            connections.settings[WRITE_BENCH_ALIAS] = {**base, "NAME": template, "OPTIONS": {}}
+            call_command("migrate", database=WRITE_BENCH_ALIAS, verbosity=0)
+            user_ids = _seed_write_users(WRITE_BENCH_ALIAS, BENCH_PREFIX, count)
+            connections[WRITE_BENCH_ALIAS].close()
+        else:
+            user_ids = None
+
+        for name in names:
+            profile = WRITE_PROFILES[name]
+            settings_dict = dict(base)
+
+            if scratch:
+                path = os.path.join(scratch, f"{name}.sqlite3")
+                shutil.copyfile(template, path)
+                options = {**base.get("OPTIONS", {}), "transaction_mode": profile["transaction_mode"]}
+                settings_dict.update(NAME=path, OPTIONS=options)
+                # Switch the journal mode once, before the workers connect (a
+                # scratch copy, so WAL even when the dev database keeps its own)
+                pragmas = profile["pragmas"] or sqlite_pragmas()
+                db = sqlite3.connect(path)
+                db.execute(f"PRAGMA journal_mode = {pragmas['journal_mode'] or 'wal'}")
+                db.close()
+            else:
+                user_ids = _seed_write_users("default", f"{BENCH_PREFIX}writes_{name}_", count)
+
+            try:
+                results.append(_run_write_profile(name, settings_dict, user_ids, workers, faces))
+            finally:
+                if not scratch:
+                    CustomUser.objects.filter(id__in=user_ids).delete()
+            if log:
+                log(results[-1])
+    finally:
+        connections.close_all()
+        if scratch:
+            connections.settings.pop(WRITE_BENCH_ALIAS, None)
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": timezone.now().isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "vendor": vendor,
+            "workers": workers,
+            "frames_per_worker": frames,
+            "faces_per_frame": faces,
+        },
+        "results": results,
+    }
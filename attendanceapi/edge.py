@@ -0,0 +1,228 @@
+"""
+Edge runner for sites with unreliable connectivity.
+
+Runs the normal recognition service against a gallery bundle exported with
+``manage.py export_gallery`` instead of the database, so frames never leave
+the site. Confirmed registered faces become attendance events in a local
+SQLite queue (they survive restarts and outages). A background thread pushes
+queued events to ``/api/edge/sync/`` with their idempotency keys and, when
+the server reports a newer gallery version, pulls the binary delta from
+``/api/gallery/changes/`` and applies it in place.
+
+Visitors are not handled at the edge: creating TempUser records needs the
+central visitor gallery, so unknown faces are only shown in the overlay.
+"""
+import json
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import cv2
+from attendanceapi.services.attendance_service import ATTENDANCE_COOLDOWN_MINUTES
+from attendanceapi.services.edge_sync import EDGE_SYNC_MAX_EVENTS
+from attendanceapi.services.face_recognition_service import recognize_faces_from_frame
+from attendanceapi.services.gallery import REGISTERED
+from attendanceapi.services.gallery_bundle import decode_delta
+
+SYNC_PATH = "/api/edge/sync/"
+CHANGES_PATH = "/api/gallery/changes/"
+
+
+class EdgeQueue:
+    """
+    Durable FIFO of attendance events keyed by idempotency key.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " key TEXT PRIMARY KEY, payload TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def put(self, event):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO events (key, payload, created) VALUES (?, ?, ?)",
+                (event["idempotency_key"], json.dumps(event), time.time()),
+            )
+            self._db.commit()
+
+    def peek(self, limit):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT payload FROM events ORDER BY created LIMIT ?", (limit,)
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def remove(self, keys):
+        if not keys:
+            return
+        with self._lock:
+            self._db.executemany("DELETE FROM events WHERE key = ?", [(k,) for k in keys])
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+class EdgeRunner:
+    def __init__(self, edge_gallery, queue, server=None, device_key=None,
+                 camera_key="edge", sync_interval=30.0, timeout=10.0, log=None):
+        self.edge_gallery = edge_gallery
+        self.queue = queue
+        self.server = server.rstrip("/") if server else None
+        self.device_key = device_key
+        self.camera_key = camera_key
+        self.sync_interval = sync_interval
+        self.timeout = timeout
+        self.log = log or (lambda message: None)
+
+        self._last_marked = {}
+        self._stop = threading.Event()
+        self.stats = {"frames": 0, "recognized": 0, "queued": 0, "synced": 0, "sync_errors": 0}
+
+    # ---- recognition ----
+
+    def process_frame(self, frame):
+        """
+        Recognises one frame against the local gallery and queues events for
+        confirmed registered faces outside the cooldown. Returns the results.
+        """
+        results = recognize_faces_from_frame(frame, gallery=self.edge_gallery.gallery, camera_key=self.camera_key)
+        self.stats["frames"] += 1
+
+        now = time.monotonic()
+        cooldown = ATTENDANCE_COOLDOWN_MINUTES * 60
+
+        for result in results:
+            if not result.get("recognized"):
+                continue
+            self.stats["recognized"] += 1
+
+            user_id = result["user"].id
+            if now - self._last_marked.get(user_id, -cooldown) < cooldown:
+                continue
+
+            self._last_marked[user_id] = now
+            self.queue.put({
+                "idempotency_key": uuid.uuid4().hex,
+                "user_id": user_id,
+                "captured_at": time.time(),
+                "distance": result["distance"],
+            })
+            self.stats["queued"] += 1
+
+        return results
+
+    # ---- sync ----
+
+    def _post(self, payload):
+        request = urllib.request.Request(
+            self.server + SYNC_PATH,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json", "X-Device-Key": self.device_key or ""},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def _get_changes(self):
+        """
+        Binary delta after the local version, or None when already current.
+        """
+        url = f"{self.server}{CHANGES_PATH}?since={self.edge_gallery.version}&kind={REGISTERED}"
+        request = urllib.request.Request(url, headers={"X-Device-Key": self.device_key or ""})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read() or None
+
+    def pull_gallery(self):
+        """
+        Applies the server's gallery changes; returns the number of changed users.
+        """
+        data = self._get_changes()
+        if not data:
+            return 0
+
+        # GalleryIndex.apply swaps the (matrix, owners) tuple in one assignment,
+        # so the frame loop never sees a half-applied delta
+        changed = self.edge_gallery.apply(decode_delta(data))
+        if changed:
+            self.log(f"gallery updated: {changed} users changed, version {self.edge_gallery.version}")
+        return changed
+
+    def sync_once(self):
+        """
+        Pushes one batch of queued events and pulls gallery changes if the
+        server is ahead. Returns the response data, or None when offline/failed.
+        """
+        if not self.server:
+            return None
+
+        events = self.queue.peek(EDGE_SYNC_MAX_EVENTS)
+
+        try:
+            body = self._post({"events": events})
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            self.stats["sync_errors"] += 1
+            self.log(f"sync failed ({e}); {len(self.queue)} events queued")
+            return None
+
+        data = body.get("data", {})
+
+        # Ingested, already-ingested and permanently rejected events are done
+        done = data.get("accepted", []) + data.get("duplicates", [])
+        done += [r["key"] for r in data.get("rejected", []) if r.get("key")]
+        self.queue.remove(done)
+        self.stats["synced"] += len(data.get("accepted", []))
+
+        if data.get("gallery", {}).get("version", 0) != self.edge_gallery.version:
+            try:
+                self.pull_gallery()
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                self.log(f"gallery pull failed ({e})")
+
+        return data
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.sync_interval):
+            # Drain the backlog in batches after an outage
+            while self.sync_once() and len(self.queue) and not self._stop.is_set():
+                pass
+
+    # ---- main loop ----
+
+    def run(self, source, fps=5.0, max_frames=None):
+        capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video source {source!r}")
+
+        sync_thread = threading.Thread(target=self._sync_loop, daemon=True)
+        sync_thread.start()
+        interval = 1.0 / fps if fps else 0.0
+
+        try:
+            while max_frames is None or self.stats["frames"] < max_frames:
+                started = time.monotonic()
+                ok, frame = capture.read()
+                if not ok:
+                    break
+
+                self.process_frame(frame)
+
+                elapsed = time.monotonic() - started
+                if elapsed < interval:
+                    time.sleep(interval - elapsed)
+        finally:
+            capture.release()
+            self._stop.set()
+            sync_thread.join(self.timeout + 1)
+            # Final flush while we are still running
+            self.sync_once()
+
+        return self.stats
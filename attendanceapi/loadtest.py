@@ -0,0 +1,298 @@
+"""
+Load generator for the HTTP recognition endpoints.
+
+Each simulated camera is a thread holding one keep-alive connection and
+posting frames at a fixed rate. Frames that cannot be sent on time (because
+the previous request is still in flight) are counted as missed, as a real
+camera would drop them. ``find_saturation`` steps the camera count up until
+the server stops keeping up.
+
+Every send carries different bytes (a JPEG comment with a sequence number)
+so the server's duplicate-frame cache never answers, and the synthetic
+frames differ in their coarse layout so the motion gate sees movement:
+the run measures inference, not cache hits. Recorded frames keep their own
+motion.
+
+Point it at a server started with FACE_MODEL_STUB=1 (optionally
+FACE_MODEL_STUB_DELAY_MS=<ms> to emulate inference cost) to plan capacity
+without cameras or the model pack.
+"""
+import base64
+import glob
+import http.client
+import json
+import os
+import struct
+import threading
+import time
+from urllib.parse import urlsplit
+import cv2
+from attendanceapi.services.fake_face_model import synthetic_frame
+
+ENDPOINTS = {
+    "recognize": "/api/recognize-frame/",
+    "mark": "/api/attendance/mark/",
+}
+DUPLICATE_CODES = {"ATTENDANCE_DUPLICATE", "TEMP_ATTENDANCE_DUPLICATE"}
+# Admission control drops stale/overtaken frames with a 200
+DROPPED_CODES = {"FRAME_STALE", "FRAME_SUPERSEDED"}
+PAYLOAD_FORMATS = ("data-url", "base64")
+JPEG_SOI = b"\xff\xd8"
+
+
+def load_frames(frames_dir=None, count=8, width=1280, height=720, quality=85):
+    """
+    JPEG bytes of recorded frames (*.jpg/*.jpeg/*.png in frames_dir,
+    re-encoded to JPEG where needed), or `count` synthetic frames, each with
+    a bright block in a different place.
+    """
+    if frames_dir:
+        paths = sorted(
+            path for pattern in ("*.jpg", "*.jpeg", "*.png")
+            for path in glob.glob(os.path.join(frames_dir, pattern))
+        )
+        if not paths:
+            raise ValueError(f"No frames found in {frames_dir}")
+
+        frames = []
+        for path in paths:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            if not data.startswith(JPEG_SOI):
+                image = cv2.imread(path)
+                if image is None:
+                    raise ValueError(f"Unreadable frame {path}")
+                data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+            frames.append(data)
+        return frames
+
+    block = min(width, height) // 4
+    frames = []
+    for i in range(count):
+        image = synthetic_frame(width, height, seed=i)
+        # Noise averages out in the motion gate's thumbnail; the block does not
+        x = (i * block) % max(1, width - block)
+        cv2.rectangle(image, (x, 0), (x + block, block), (255, 255, 255), -1)
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames.append(buffer.tobytes())
+    return frames
+
+
+def tag_frame(jpeg_bytes, sequence):
+    """
+    The same JPEG with a comment segment holding `sequence` after the SOI
+    marker: identical pixels, different bytes.
+    """
+    comment = f"loadtest {sequence}".encode()
+    segment = b"\xff\xfe" + struct.pack(">H", len(comment) + 2) + comment
+    return jpeg_bytes[:2] + segment + jpeg_bytes[2:]
+
+
+def encode_payload(jpeg_bytes, payload_format):
+    encoded = base64.b64encode(jpeg_bytes).decode()
+    if payload_format == "data-url":
+        return "data:image/jpeg;base64," + encoded
+    return encoded
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class CameraClient(threading.Thread):
+    """
+    One simulated camera: paced POSTs over a single keep-alive connection.
+    """
+
+    def __init__(self, camera_id, base_url, endpoint, frames, payload_format, fps, stop_at, timeout,
+                 device_key=None):
+        super().__init__(daemon=True)
+        self.camera_id = camera_id
+        self.parts = urlsplit(base_url)
+        self.path = ENDPOINTS[endpoint]
+        self.frames = frames
+        self.payload_format = payload_format
+        self.headers = {"Content-Type": "application/json"}
+        if device_key:
+            self.headers["X-Device-Key"] = device_key
+        self.interval = 1.0 / fps
+        self.stop_at = stop_at
+        self.timeout = timeout
+
+        self.latencies = []
+        self.status_counts = {}
+        self.codes = {}
+        self.errors = 0
+        self.sent = 0
+        self.missed = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.parts.scheme == "https" else http.client.HTTPConnection
+        return cls(self.parts.hostname, self.parts.port, timeout=self.timeout)
+
+    def run(self):
+        connection = self._connect()
+        next_send = time.monotonic()
+        index = 0
+
+        while True:
+            now = time.monotonic()
+            if now >= self.stop_at:
+                break
+
+            if now < next_send:
+                time.sleep(min(next_send - now, self.stop_at - now))
+                continue
+
+            # Frames whose slot passed while the last request was in flight
+            behind = int((now - next_send) / self.interval)
+            self.missed += behind
+            next_send += (behind + 1) * self.interval
+
+            frame = tag_frame(self.frames[index % len(self.frames)], f"{self.camera_id}-{index}")
+            body = json.dumps({
+                "frame": encode_payload(frame, self.payload_format),
+                "camera_id": self.camera_id,
+            })
+            index += 1
+            self.sent += 1
+
+            started = time.perf_counter()
+            try:
+                connection.request("POST", self.path, body=body, headers=self.headers)
+                response = connection.getresponse()
+                content = response.read()
+                elapsed = time.perf_counter() - started
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                connection = self._connect()
+                continue
+
+            self.latencies.append(elapsed)
+            self.status_counts[response.status] = self.status_counts.get(response.status, 0) + 1
+            if response.status >= 500:
+                self.errors += 1
+
+            try:
+                code = json.loads(content).get("code")
+            except (ValueError, AttributeError):
+                code = None
+            if code:
+                self.codes[code] = self.codes.get(code, 0) + 1
+
+        connection.close()
+
+
+def run_step(base_url, endpoint, cameras, fps, duration, frames, payload_format="data-url",
+             timeout=10.0, device_key=None):
+    """
+    Runs `cameras` clients for `duration` seconds and aggregates their stats.
+    """
+    stop_at = time.monotonic() + duration
+    clients = [
+        CameraClient(
+            f"loadtest-{i}", base_url, endpoint, frames, payload_format, fps, stop_at, timeout,
+            device_key=device_key,
+        )
+        for i in range(cameras)
+    ]
+    started = time.monotonic()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join(duration + timeout + 5)
+    wall = time.monotonic() - started
+
+    latencies = sorted(l for c in clients for l in c.latencies)
+    status_counts, codes = {}, {}
+    for client in clients:
+        for k, v in client.status_counts.items():
+            status_counts[k] = status_counts.get(k, 0) + v
+        for k, v in client.codes.items():
+            codes[k] = codes.get(k, 0) + v
+
+    sent = sum(c.sent for c in clients)
+    completed = len(latencies)
+    errors = sum(c.errors for c in clients)
+    duplicates = sum(codes.get(code, 0) for code in DUPLICATE_CODES)
+    shed = status_counts.get(429, 0) + status_counts.get(503, 0)
+    shed += sum(codes.get(code, 0) for code in DROPPED_CODES)
+
+    return {
+        "endpoint": endpoint,
+        "cameras": cameras,
+        "fps_per_camera": fps,
+        "offered_fps": cameras * fps,
+        "duration_s": round(wall, 3),
+        "sent": sent,
+        "completed": completed,
+        "missed_frames": sum(c.missed for c in clients),
+        "throughput_fps": round(completed / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": _ms(_percentile(latencies, 0.50)),
+            "p90": _ms(_percentile(latencies, 0.90)),
+            "p95": _ms(_percentile(latencies, 0.95)),
+            "p99": _ms(_percentile(latencies, 0.99)),
+            "max": _ms(latencies[-1] if latencies else None),
+        },
+        "error_rate": round(errors / sent, 4) if sent else 0.0,
+        "duplicate_rate": round(duplicates / completed, 4) if completed else 0.0,
+        "shed_rate": round(shed / completed, 4) if completed else 0.0,
+        "status_counts": {str(k): v for k, v in sorted(status_counts.items())},
+        "codes": codes,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def is_saturated(step, p95_budget_ms, min_delivery=0.9, max_error_rate=0.01):
+    """
+    A step is saturated when the server no longer keeps up with the offered
+    rate, blows the latency budget, or starts failing.
+    """
+    p95 = step["latency_ms"]["p95"]
+    delivered = step["throughput_fps"] / step["offered_fps"] if step["offered_fps"] else 1.0
+
+    return (
+        delivered < min_delivery
+        or (p95 is not None and p95 > p95_budget_ms)
+        or step["error_rate"] > max_error_rate
+    )
+
+
+def find_saturation(base_url, endpoint, camera_steps, fps, duration, frames, payload_format="data-url",
+                    p95_budget_ms=500.0, timeout=10.0, device_key=None, log=None):
+    """
+    Steps through camera counts until saturation.
+    Returns {"steps": [...], "max_cameras": n, "max_throughput_fps": x}.
+    """
+    steps = []
+    max_cameras = 0
+    max_throughput = 0.0
+
+    for cameras in camera_steps:
+        step = run_step(
+            base_url, endpoint, cameras, fps, duration, frames, payload_format, timeout, device_key,
+        )
+        step["saturated"] = is_saturated(step, p95_budget_ms)
+        steps.append(step)
+        if log:
+            log(step)
+
+        if step["saturated"]:
+            break
+
+        max_cameras = cameras
+        max_throughput = max(max_throughput, step["throughput_fps"])
+
+    return {
+        "steps": steps,
+        "max_cameras": max_cameras,
+        "max_throughput_fps": max_throughput,
+        "p95_budget_ms": p95_budget_ms,
+    }
@@ -0,0 +1,71 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from attendanceapi.benchmarks import (
+    DEFAULT_DB_MAX_SIZE,
+    DEFAULT_GALLERY_SIZES,
+    run_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark decode, matching, visitor handling, cooldown checks and "
+        "report queries against synthetic galleries. Uses a fake face model; "
+        "all seeded rows are rolled back. Run with FACE_MODEL_STUB=1 so "
+        "startup does not load the real model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default=",".join(str(s) for s in DEFAULT_GALLERY_SIZES),
+            help="Comma-separated gallery sizes (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--db-max-size", type=int, default=DEFAULT_DB_MAX_SIZE,
+            help="Largest size seeded into the database; bigger sizes only run "
+                 "in-memory cases (default: %(default)s)",
+        )
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--only", default="",
+            help="Comma-separated case names to run (e.g. match_registered)",
+        )
+        parser.add_argument(
+            "--output", default="",
+            help="Write the JSON report here instead of stdout",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(s) for s in options["sizes"].split(",") if s]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers")
+
+        only = {s for s in options["only"].split(",") if s}
+
+        def _log(result):
+            stats = result["stats"]
+            self.stderr.write(
+                f"{result['name']:<28} {json.dumps(result['params']):<40} "
+                f"median={stats['median'] * 1000:9.3f}ms p95={stats['p95'] * 1000:9.3f}ms"
+            )
+
+        report = run_benchmarks(
+            sizes=sizes,
+            db_max_size=options["db_max_size"],
+            rounds=options["rounds"],
+            warmup=options["warmup"],
+            only=only,
+            seed=options["seed"],
+            log=_log,
+        )
+
+        payload = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(payload)
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
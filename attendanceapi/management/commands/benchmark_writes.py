@@ -0,0 +1,52 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from attendanceapi.benchmarks import WRITE_PROFILES, run_write_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark attendance from several processes at once and compare "
+        "throughput, latency and failed writes per database profile. SQLite "
+        "runs on scratch copies; other databases get temporary users that "
+        "are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent writer processes")
+        parser.add_argument("--frames", type=int, default=200, help="Frames marked per worker")
+        parser.add_argument("--faces", type=int, default=1, help="Faces per frame")
+        parser.add_argument(
+            "--profiles", default="",
+            help=f"Comma-separated profiles (default: all for the database; known: {', '.join(WRITE_PROFILES)})",
+        )
+        parser.add_argument("--output", default="", help="Write the JSON report here")
+
+    def handle(self, *args, **options):
+        profiles = [name for name in options["profiles"].split(",") if name] or None
+
+        def _log(result):
+            info, stats = result["extra_info"], result["stats"]
+            self.stderr.write(
+                f"{result['params']['profile']:<22} {info['marks_per_second']:>8} marks/s  "
+                f"median={stats['median'] * 1000:8.2f}ms p95={stats['p95'] * 1000:8.2f}ms  "
+                f"failed={info['failed_frames']}/{info['frames']}"
+            )
+
+        try:
+            report = run_write_benchmark(
+                profiles=profiles,
+                workers=options["workers"],
+                frames=options["frames"],
+                faces=options["faces"],
+                log=_log,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        payload = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(payload)
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
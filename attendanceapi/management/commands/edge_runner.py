@@ -0,0 +1,68 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from attendanceapi.edge import EdgeQueue, EdgeRunner
+from attendanceapi.services.face_model import FACE_MODEL_NAME, set_active_model_pack
+from attendanceapi.services.gallery_bundle import read_bundle
+
+
+class Command(BaseCommand):
+    help = (
+        "Run recognition locally against an exported gallery bundle, queue "
+        "attendance events and sync them to the central API when reachable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bundle", default="gallery.bundle")
+        parser.add_argument("--source", default="0", help="Camera index, video file or stream URL")
+        parser.add_argument("--server", default="", help="Central API base URL (omit to run fully offline)")
+        parser.add_argument(
+            "--device-key", default=os.environ.get("EDGE_DEVICE_KEY", ""),
+            help="Device API key (default: $EDGE_DEVICE_KEY)",
+        )
+        parser.add_argument("--camera-id", default="edge")
+        parser.add_argument("--queue", default="edge_queue.sqlite3", help="Local event queue file")
+        parser.add_argument("--fps", type=float, default=5.0)
+        parser.add_argument("--sync-interval", type=float, default=30.0)
+        parser.add_argument("--max-frames", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["bundle"], "rb") as fh:
+                edge_gallery, manifest = read_bundle(fh.read())
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot load bundle: {e}")
+
+        if options["server"] and not options["device_key"]:
+            raise CommandError("--device-key (or EDGE_DEVICE_KEY) is required to sync")
+
+        # Bundles before versioned embeddings carry no model name
+        model = manifest.get("model", FACE_MODEL_NAME)
+        set_active_model_pack(model)
+
+        self.stderr.write(
+            f"Loaded {manifest['users']} users ({manifest['vectors']} vectors), "
+            f"version {manifest['version']}, model {model}"
+        )
+
+        runner = EdgeRunner(
+            edge_gallery,
+            EdgeQueue(options["queue"]),
+            server=options["server"] or None,
+            device_key=options["device_key"],
+            camera_key=options["camera_id"],
+            sync_interval=options["sync_interval"],
+            log=self.stderr.write,
+        )
+
+        try:
+            stats = runner.run(options["source"], fps=options["fps"], max_frames=options["max_frames"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            stats = runner.stats
+
+        self.stdout.write(self.style.SUCCESS(
+            f"frames={stats['frames']} recognized={stats['recognized']} "
+            f"queued={stats['queued']} synced={stats['synced']} "
+            f"pending={len(runner.queue)}"
+        ))
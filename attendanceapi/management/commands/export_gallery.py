@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendanceapi.services.gallery_bundle import build_bundle
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the registered gallery as a signed bundle for edge devices "
+        "(manage.py edge_runner). Signed with GALLERY_BUNDLE_KEY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="gallery.bundle")
+
+    def handle(self, *args, **options):
+        try:
+            data, manifest = build_bundle()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        with open(options["output"], "wb") as fh:
+            fh.write(data)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']}: {manifest['users']} users, "
+            f"{manifest['vectors']} vectors, version {manifest['version']}, "
+            f"{len(data) / 1024:.1f} KiB"
+        ))
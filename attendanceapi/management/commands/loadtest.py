@@ -0,0 +1,102 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from attendanceapi.loadtest import (
+    ENDPOINTS,
+    PAYLOAD_FORMATS,
+    find_saturation,
+    load_frames,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay frames against a running API at a fixed fps per simulated "
+        "camera, stepping the camera count up to find the saturation point. "
+        "Every send has distinct bytes, so the frame cache does not answer. "
+        "Start the target server with FACE_MODEL_STUB=1 to run without the "
+        "model pack."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="recognize")
+        parser.add_argument(
+            "--cameras", default="1,2,4,8,16,32",
+            help="Comma-separated camera counts to step through (default: %(default)s)",
+        )
+        parser.add_argument("--fps", type=float, default=5.0, help="Frames per second per camera")
+        parser.add_argument("--duration", type=float, default=15.0, help="Seconds per step")
+        parser.add_argument("--p95-budget-ms", type=float, default=500.0)
+        parser.add_argument("--timeout", type=float, default=10.0)
+        parser.add_argument("--format", choices=PAYLOAD_FORMATS, default="data-url")
+        parser.add_argument("--frames-dir", default="", help="Replay recorded JPEG/PNG frames")
+        parser.add_argument("--width", type=int, default=1280)
+        parser.add_argument("--height", type=int, default=720)
+        parser.add_argument(
+            "--static", action="store_true",
+            help="Send one frame's pixels (exercises the motion gate)",
+        )
+        parser.add_argument(
+            "--device-key", default=os.environ.get("LOADTEST_DEVICE_KEY", ""),
+            help="Sent as X-Device-Key (needed with DEVICE_AUTH_REQUIRED=1; default $LOADTEST_DEVICE_KEY)",
+        )
+        parser.add_argument("--output", default="", help="Write the JSON report here")
+
+    def handle(self, *args, **options):
+        try:
+            camera_steps = [int(c) for c in options["cameras"].split(",") if c]
+        except ValueError:
+            raise CommandError("--cameras must be comma-separated integers")
+
+        try:
+            frames = load_frames(
+                options["frames_dir"] or None,
+                count=1 if options["static"] else 8,
+                width=options["width"],
+                height=options["height"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        def _log(step):
+            self.stderr.write(
+                f"cameras={step['cameras']:<4} offered={step['offered_fps']:<7} "
+                f"throughput={step['throughput_fps']:<8} p95={step['latency_ms']['p95']}ms "
+                f"errors={step['error_rate']} shed={step['shed_rate']} "
+                f"dup={step['duplicate_rate']}{' SATURATED' if step['saturated'] else ''}"
+            )
+
+        report = find_saturation(
+            options["url"],
+            options["endpoint"],
+            camera_steps,
+            options["fps"],
+            options["duration"],
+            frames,
+            options["format"],
+            p95_budget_ms=options["p95_budget_ms"],
+            timeout=options["timeout"],
+            device_key=options["device_key"] or None,
+            log=_log,
+        )
+        report["config"] = {
+            "url": options["url"],
+            "endpoint": options["endpoint"],
+            "format": options["format"],
+            "frames": len(frames),
+            "frames_dir": options["frames_dir"] or None,
+            "device_key": bool(options["device_key"]),
+        }
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Sustained {report['max_cameras']} cameras "
+            f"({report['max_throughput_fps']} fps) within p95 {options['p95_budget_ms']}ms"
+        ))
+
+        payload = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(payload)
+        else:
+            self.stdout.write(payload)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from attendanceapi.services.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete idempotency keys older than their scope's TTL "
+        "(IDEMPOTENCY_KEY_TTL_SECONDS). Run daily, e.g. from cron."
+    )
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys()
+
+        for scope, count in sorted(deleted.items()):
+            self.stdout.write(f"{scope}: {count} deleted")
+        self.stdout.write(self.style.SUCCESS(f"Purged {sum(deleted.values())} idempotency keys"))
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendanceapi.services.model_versions import active_model_version
+from attendanceapi.services.reembedding import (
+    REGISTERED,
+    VISITOR,
+    CutoverRefused,
+    cutover,
+    embedding_coverage,
+    run_reembedding,
+)
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-compute embeddings with another face model pack from stored "
+        "images, report coverage and cut the gallery over to it."
+    )
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest="action", required=True)
+
+        run = actions.add_parser("run", help="Stage embeddings for a model pack (resumable)")
+        run.add_argument("--model", required=True, help="insightface pack, e.g. buffalo_l")
+        run.add_argument("--workers", type=int, help="Inference processes (default: REEMBEDDING['workers'])")
+        run.add_argument(
+            "--kind", choices=[REGISTERED, VISITOR], action="append",
+            help="Only this gallery (repeatable; default: both)",
+        )
+        run.add_argument("--retry-failed", action="store_true", help="Try identities that failed before again")
+
+        status = actions.add_parser("status", help="Coverage of a model pack")
+        status.add_argument("--model", required=True)
+
+        switch = actions.add_parser("cutover", help="Make a model pack live (also rolls back)")
+        switch.add_argument("--model", required=True)
+        switch.add_argument(
+            "--min-coverage", type=float,
+            help="Share of registered identities that must have a vector (default: REEMBEDDING['min_coverage'])",
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def report(self, progress):
+        self.stdout.write(
+            f"{progress['done']}/{progress['total']}  failed {progress['failed']}  "
+            f"{progress['per_second']:.1f}/s  elapsed {format_seconds(progress['elapsed_seconds'])}  "
+            f"eta {format_seconds(progress['eta_seconds'])}"
+        )
+
+    def handle_run(self, options):
+        if options["model"] == active_model_version():
+            raise CommandError(f"{options['model']} is already the active model")
+
+        progress = run_reembedding(
+            options["model"],
+            kinds=options["kind"] or (REGISTERED, VISITOR),
+            workers=options["workers"],
+            retry_failed=options["retry_failed"],
+            report=self.report,
+        )
+        self.report(progress)
+        self.handle_status(options)
+
+    def handle_status(self, options):
+        self.stdout.write(f"Active model: {active_model_version()}")
+        for kind, counts in embedding_coverage(options["model"]).items():
+            self.stdout.write(
+                f"{kind:<11} {counts['covered']:>6}/{counts['total']:<6} {counts['coverage']:>7.1%}  "
+                f"failed {counts['failed']}"
+            )
+
+    def handle_cutover(self, options):
+        try:
+            summary = cutover(options["model"], options["min_coverage"])
+        except CutoverRefused as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Switched {summary['previous']} -> {summary['version']}: "
+            f"{summary['registered_switched']} registered ({summary['registered_stale']} need re-enrollment), "
+            f"{summary['visitors_switched']} visitors ({summary['visitors_cleared']} cleared)"
+        ))
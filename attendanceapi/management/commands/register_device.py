@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendanceapi.models import Device
+from attendanceapi.services.devices import issue_device_key
+from base.models import Department
+
+
+class Command(BaseCommand):
+    help = (
+        "Register a camera device (or rotate its key) and print its API key. "
+        "Cameras send the key in the X-Device-Key header."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("camera_id", help="Unique slug, e.g. main-door")
+        parser.add_argument("--name", default="", help="Display name (default: camera_id)")
+        parser.add_argument("--department", type=int, help="Department id of the entrance")
+        parser.add_argument(
+            "--search-department", type=int, action="append", default=[],
+            help="Also search this department's gallery shard (repeatable)",
+        )
+        parser.add_argument(
+            "--no-global-fallback", action="store_true",
+            help="Never search outside the device's shards",
+        )
+        parser.add_argument("--rotate", action="store_true", help="Issue a new key for an existing device")
+        parser.add_argument("--disable", action="store_true", help="Deactivate the device")
+
+    def handle(self, *args, **options):
+        camera_id = options["camera_id"]
+        device = Device.objects.filter(camera_id=camera_id).first()
+
+        if options["disable"]:
+            if device is None:
+                raise CommandError(f"No device {camera_id}")
+            device.is_active = False
+            device.save(update_fields=["is_active"])
+            self.stdout.write(self.style.SUCCESS(f"Disabled {device}"))
+            return
+
+        if device and not options["rotate"]:
+            raise CommandError(f"Device {camera_id} exists; pass --rotate for a new key")
+
+        search_departments = []
+
+        if device is None:
+            department = None
+            if options["department"]:
+                department = Department.objects.filter(id=options["department"]).first()
+                if department is None:
+                    raise CommandError(f"No department {options['department']}")
+
+            search_departments = list(Department.objects.filter(id__in=options["search_department"]))
+            if len(search_departments) != len(set(options["search_department"])):
+                raise CommandError("Unknown --search-department id")
+
+            device = Device(
+                name=options["name"] or camera_id,
+                camera_id=camera_id,
+                department=department,
+                global_fallback=not options["no_global_fallback"],
+            )
+
+        key = issue_device_key(device)
+
+        if search_departments:
+            device.search_departments.set(search_departments)
+
+        self.stdout.write(self.style.SUCCESS(f"{device} key (shown once):"))
+        self.stdout.write(key)
@@ -0,0 +1,71 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendanceapi.models import ServiceSession
+from attendanceapi.services.sessions import session_headcount
+from base.models import Department
+
+
+class Command(BaseCommand):
+    help = (
+        "Start, end or list service sessions. While a session is active each "
+        "person is marked at most once in it."
+    )
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest="action", required=True)
+
+        start = actions.add_parser("start", help="Start a session now")
+        start.add_argument("--name", required=True, help="e.g. Sunday first service")
+        start.add_argument(
+            "--department", type=int, action="append", default=[],
+            help="Only count this department (repeatable; default: everyone)",
+        )
+        start.add_argument("--minutes", type=int, help="End automatically after this many minutes")
+
+        end = actions.add_parser("end", help="End a running session now")
+        end.add_argument("session_id", type=int)
+
+        actions.add_parser("list", help="Recent sessions with headcounts")
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_start(self, options):
+        departments = list(Department.objects.filter(id__in=options["department"]))
+        if len(departments) != len(set(options["department"])):
+            raise CommandError("Unknown --department id")
+
+        now = timezone.now()
+        session = ServiceSession.objects.create(
+            name=options["name"],
+            starts_at=now,
+            ends_at=now + timedelta(minutes=options["minutes"]) if options["minutes"] else None,
+        )
+        session.departments.set(departments)
+
+        self.stdout.write(self.style.SUCCESS(f"Started {session} (id {session.id})"))
+
+    def handle_end(self, options):
+        session = ServiceSession.objects.filter(id=options["session_id"]).first()
+        if session is None:
+            raise CommandError(f"No session {options['session_id']}")
+
+        now = timezone.now()
+        if session.ends_at is not None and session.ends_at <= now:
+            raise CommandError(f"{session} already ended")
+
+        session.ends_at = now
+        session.save(update_fields=["ends_at"])
+        self.stdout.write(self.style.SUCCESS(f"Ended {session}"))
+
+    def handle_list(self, options):
+        sessions = ServiceSession.objects.prefetch_related("departments").order_by("-starts_at")[:20]
+
+        for session in sessions:
+            headcount = session_headcount(session)
+            state = "open" if session.ends_at is None else f"until {session.ends_at:%H:%M}"
+            self.stdout.write(
+                f"{session.id:>5}  {session.name:<30} {session.starts_at:%Y-%m-%d %H:%M} {state:<12} "
+                f"members {headcount['members']:>5}  visitors {headcount['visitors']:>5}"
+            )
@@ -0,0 +1,111 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What each kind of process imports before it does any work
+TARGETS = {
+    "setup": "",  # Management commands without system checks
+    "urls": "from importlib import import_module; import_module(settings.ROOT_URLCONF)",  # Checks, admin
+    "api": "import attendanceapi.urls",  # Serving workers, on their first request
+}
+# Imported by recognition only; none of them should show up in "setup"
+INFERENCE_MODULES = ("numpy", "cv2", "scipy", "onnxruntime", "insightface", "matplotlib", "albumentations")
+
+
+def parse_importtime(output):
+    """
+    (module, self µs, cumulative µs, depth) per line of -X importtime output.
+    """
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            own, cumulative = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # Header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), own, cumulative, depth))
+    return rows
+
+
+def measure_startup(target, top=10):
+    """
+    Imports of a fresh interpreter running django.setup() plus `target`.
+    """
+    code = "import django; django.setup(); from django.conf import settings; " + TARGETS[target]
+    env = {**os.environ, "FACE_MODEL_WARMUP": "0"}
+    env.setdefault("DJANGO_SETTINGS_MODULE", os.environ.get("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE))
+
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env, capture_output=True, text=True, cwd=settings.BASE_DIR,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise CommandError(f"{target}: {proc.stderr.strip().splitlines()[-1]}")
+
+    rows = parse_importtime(proc.stderr)
+    cumulative = {}
+    for name, _, total, _ in rows:
+        cumulative.setdefault(name, total)
+
+    return {
+        "target": target,
+        "wall_ms": round(wall * 1000, 1),
+        "import_ms": round(sum(total for _, _, total, depth in rows if depth == 0) / 1000, 1),
+        "modules": len(rows),
+        "inference_modules": {
+            name: round(cumulative[name] / 1000, 1) for name in INFERENCE_MODULES if name in cumulative
+        },
+        "slowest": [
+            {"module": name, "self_ms": round(own / 1000, 1), "cumulative_ms": round(total / 1000, 1)}
+            for name, own, total, _ in sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Startup cost per process kind, from python -X importtime in a fresh "
+        "interpreter: django.setup() alone (management commands), plus the "
+        "root URLconf (system checks, admin) and plus the API URLconf "
+        "(serving workers). Lists the slowest modules and which inference "
+        "libraries were pulled in. --budget-ms fails when a target is slower."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", action="append", choices=list(TARGETS), help="Repeatable; default all")
+        parser.add_argument("--top", type=int, default=10, help="Slowest modules listed per target")
+        parser.add_argument("--budget-ms", type=float, help="Fail if a target's wall time exceeds this")
+        parser.add_argument("--json", action="store_true", help="Emit JSON")
+
+    def handle(self, *args, **options):
+        reports = [measure_startup(target, options["top"]) for target in options["target"] or TARGETS]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(reports, indent=2))
+        else:
+            for report in reports:
+                self.stdout.write(
+                    f"{report['target']}: {report['wall_ms']:.0f} ms wall, {report['import_ms']:.0f} ms "
+                    f"importing {report['modules']} modules"
+                )
+                loaded = ", ".join(f"{name} {ms:.0f} ms" for name, ms in report["inference_modules"].items())
+                self.stdout.write(f"  inference libraries: {loaded or 'none'}")
+                for row in report["slowest"]:
+                    self.stdout.write(
+                        f"  {row['self_ms']:>8.1f} ms self {row['cumulative_ms']:>8.1f} ms cumulative  {row['module']}"
+                    )
+
+        budget = options["budget_ms"]
+        over = [report["target"] for report in reports if budget is not None and report["wall_ms"] > budget]
+        if over:
+            raise CommandError(f"Over the {budget:.0f} ms startup budget: {', '.join(over)}")
@@ -0,0 +1,56 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from attendanceapi.services.metrics import (
+    finish_request_trace,
+    server_timing_header,
+    start_request_trace,
+)
+
+
+class PipelineTimingMiddleware:
+    """
+    Collects the pipeline spans recorded while handling a request and, when
+    settings.METRICS_SERVER_TIMING is on, reports them in a Server-Timing
+    response header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = start_request_trace()
+        started = time.perf_counter()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            spans = finish_request_trace(token)
+
+        return self._add_header(response, spans, started)
+
+    async def __acall__(self, request):
+        token = start_request_trace()
+        started = time.perf_counter()
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            spans = finish_request_trace(token)
+
+        return self._add_header(response, spans, started)
+
+    def _add_header(self, response, spans, started):
+        if spans and getattr(settings, "METRICS_SERVER_TIMING", False):
+            spans.append(("total", time.perf_counter() - started))
+            response["Server-Timing"] = server_timing_header(spans)
+
+        return response
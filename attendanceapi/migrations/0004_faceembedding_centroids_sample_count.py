@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendanceapi', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceembedding',
+            name='centroids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='faceembedding',
+            name='sample_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
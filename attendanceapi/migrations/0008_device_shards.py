@@ -0,0 +1,24 @@
+# Generated by Django 5.2.10 on 2026-10-19 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendanceapi', '0007_gallerychange'),
+        ('base', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='global_fallback',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='search_departments',
+            field=models.ManyToManyField(blank=True, related_name='search_devices', to='base.department'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.10 on 2026-10-19 19:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendanceapi', '0009_servicesession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaceModelVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('is_active', models.BooleanField(default=False)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='faceembedding',
+            name='model_version',
+            field=models.CharField(db_index=True, default='buffalo_s', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='VersionedEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('registered', 'Registered'), ('visitor', 'Visitor')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('model_version', models.CharField(max_length=64)),
+                ('embedding', models.JSONField(blank=True, null=True)),
+                ('centroids', models.JSONField(blank=True, null=True)),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('error', models.CharField(blank=True, default='', max_length=32)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_version', 'kind'], name='attendancea_model_v_723ea4_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id', 'model_version'), name='unique_versioned_embedding')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-19 19:57
+
+from django.db import migrations, models
+
+
+def scope_existing_keys(apps, schema_editor):
+    # Keys written before scoping keep deduplicating for the device that sent them
+    IdempotencyKey = apps.get_model('attendanceapi', 'IdempotencyKey')
+    for row in IdempotencyKey.objects.filter(device__isnull=False).only('id', 'device_id'):
+        IdempotencyKey.objects.filter(id=row.id).update(owner=f'device:{row.device_id}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendanceapi', '0010_model_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='idempotencykey',
+            name='unique_idempotency_key',
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='owner',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(scope_existing_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('scope', 'owner', 'key'), name='unique_idempotency_key'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.10 on 2026-10-19 20:50
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def version_existing_changes(apps, schema_editor):
+    # Logged changes keep their id as version; the counter continues from there
+    GalleryChange = apps.get_model('attendanceapi', 'GalleryChange')
+    GalleryVersion = apps.get_model('attendanceapi', 'GalleryVersion')
+    GalleryChange.objects.update(version=F('id'))
+    latest = GalleryChange.objects.aggregate(latest=Max('id'))['latest'] or 0
+    GalleryVersion.objects.update_or_create(pk=1, defaults={'value': latest})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendanceapi', '0011_idempotencykey_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GalleryVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='gallerychange',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(version_existing_changes, migrations.RunPython.noop),
+    ]
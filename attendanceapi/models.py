@@ -1,5 +1,8 @@
 # attendance/models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from userauth.models import CustomUser, TempUser
 from django.utils import timezone
 from django.conf import settings
@@ -16,7 +19,7 @@ class Attendance(models.Model):
     date = models.DateField()
     time = models.TimeField()
     
-    created_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
         return f"Attendance: {self.member.first_name} {self.member.last_name} - {self.date}"
@@ -24,7 +27,10 @@ class Attendance(models.Model):
 class FaceEmbedding(models.Model):
     
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="face_embedding")
-    embedding = models.JSONField(null=True, blank=True)
+    embedding = models.JSONField(null=True, blank=True)  # Fused template (normalised mean)
+    centroids = models.JSONField(null=True, blank=True)  # Optional sub-centroids for multi-image enrollment
+    sample_count = models.PositiveIntegerField(default=1)  # Enrollment images behind the template
+    model_version = models.CharField(max_length=64, default="buffalo_s", db_index=True)  # Model pack that produced the vectors
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -41,8 +47,175 @@ class TempAttendance(models.Model):
     department = models.ForeignKey('base.Department', on_delete=models.SET_NULL, null=True, blank=True)
     date = models.DateField()
     time = models.TimeField()
-    created_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
         return f"TempAttendance: {self.temp_user.temp_username} - {self.date}"
 
+
+class Device(models.Model):
+    """
+    A camera or kiosk that submits frames. Requests identify themselves with
+    the X-Device-Key header; only the SHA-256 of the key is stored.
+    """
+    name = models.CharField(max_length=100)
+    camera_id = models.SlugField(max_length=64, unique=True)  # Key for per-camera state and CAMERA_PROFILES
+    department = models.ForeignKey('base.Department', on_delete=models.SET_NULL, null=True, blank=True)
+    # Gallery shards searched besides the device's own department
+    search_departments = models.ManyToManyField('base.Department', blank=True, related_name="search_devices")
+    global_fallback = models.BooleanField(default=True)  # Search every shard when the scoped search misses
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    profile = models.JSONField(null=True, blank=True)  # Overrides roi / max_side / decode_reduction
+    is_active = models.BooleanField(default=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Device: {self.name} ({self.camera_id})"
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied idempotency key that has already been processed, with
+    the result it produced, so retried submissions never write twice.
+    """
+    scope = models.CharField(max_length=32)  # e.g. "edge_sync"
+    owner = models.CharField(max_length=64, blank=True, default="")  # Keys are unique per owner, e.g. "device:3"
+    key = models.CharField(max_length=128)
+    device = models.ForeignKey(Device, on_delete=models.SET_NULL, null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "owner", "key"], name="unique_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"IdempotencyKey: {self.scope}/{self.owner}/{self.key}"
+
+class ServiceSession(models.Model):
+    """
+    A service (mass, meeting, shift) attendance is counted against. While a
+    session is active each person is marked at most once in it.
+    """
+    name = models.CharField(max_length=100)
+    departments = models.ManyToManyField('base.Department', blank=True, related_name="service_sessions")  # Empty: everyone
+    starts_at = models.DateTimeField(db_index=True)
+    ends_at = models.DateTimeField(null=True, blank=True)  # Open until ended
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"ServiceSession: {self.name} ({self.starts_at:%Y-%m-%d %H:%M})"
+
+class FaceModelVersion(models.Model):
+    """
+    A face model pack known to the gallery. The active one is what workers
+    load and match with; switching it is the re-embedding cutover.
+    """
+    name = models.CharField(max_length=64, unique=True)  # insightface pack, e.g. "buffalo_l"
+    is_active = models.BooleanField(default=False)
+    activated_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"FaceModelVersion: {self.name}{' (active)' if self.is_active else ''}"
+
+class VersionedEmbedding(models.Model):
+    """
+    Embedding of one identity under a given model pack, kept beside the live
+    gallery: re-embedding jobs stage the next version here and the cutover
+    snapshots the outgoing one, so a cutover can be rolled back.
+    """
+    kind = models.CharField(max_length=16, choices=[("registered", "Registered"), ("visitor", "Visitor")])
+    object_id = models.BigIntegerField()  # CustomUser id (registered) or TempUser id (visitor)
+    model_version = models.CharField(max_length=64)
+    embedding = models.JSONField(null=True, blank=True)  # None when no stored image gave a usable face
+    centroids = models.JSONField(null=True, blank=True)
+    sample_count = models.PositiveIntegerField(default=0)
+    error = models.CharField(max_length=32, blank=True, default="")  # e.g. NO_IMAGE, NO_FACE
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id", "model_version"], name="unique_versioned_embedding"),
+        ]
+        indexes = [models.Index(fields=["model_version", "kind"])]
+
+    def __str__(self):
+        return f"VersionedEmbedding: {self.kind} {self.object_id} ({self.model_version})"
+
+class GalleryVersion(models.Model):
+    """
+    Single-row counter of the gallery version (see next_gallery_version).
+    """
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"GalleryVersion: {self.value}"
+
+class GalleryChange(models.Model):
+    """
+    Append-only log of gallery writes, tagged with the gallery version they
+    were committed under: caches and edge devices fetch the changes after the
+    version they hold instead of reloading every embedding. Deletes are kept
+    as tombstones.
+    """
+    REGISTERED = "registered"
+    VISITOR = "visitor"
+    KIND_CHOICES = [(REGISTERED, "Registered"), (VISITOR, "Visitor")]
+
+    UPSERT = "upsert"
+    DELETE = "delete"
+    OP_CHOICES = [(UPSERT, "Upsert"), (DELETE, "Delete")]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()  # CustomUser id (registered) or TempUser id (visitor)
+    op = models.CharField(max_length=8, choices=OP_CHOICES)
+    version = models.BigIntegerField(db_index=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"GalleryChange {self.version}: {self.op} {self.kind} {self.object_id}"
+
+def next_gallery_version():
+    """
+    Bumps the gallery version and returns it. Call it in the transaction that
+    writes the GalleryChange rows: the counter row stays locked until that
+    transaction ends, so versions are committed in order and a reader that
+    sees version N also sees every change up to N. (Auto-increment ids do
+    not give that: a change can commit after one with a higher id.)
+    """
+    if not GalleryVersion.objects.filter(pk=1).update(value=F("value") + 1):
+        GalleryVersion.objects.get_or_create(pk=1)
+        GalleryVersion.objects.filter(pk=1).update(value=F("value") + 1)
+    return GalleryVersion.objects.values_list("value", flat=True).get(pk=1)
+
+def record_gallery_change(kind, object_id, op=GalleryChange.UPSERT):
+    with transaction.atomic():
+        GalleryChange.objects.create(kind=kind, object_id=object_id, op=op, version=next_gallery_version())
+
+@receiver(post_save, sender=FaceEmbedding)
+def log_face_embedding_save(sender, instance, **kwargs):
+    record_gallery_change(GalleryChange.REGISTERED, instance.user_id)
+
+@receiver(post_delete, sender=FaceEmbedding)
+def log_face_embedding_delete(sender, instance, **kwargs):
+    record_gallery_change(GalleryChange.REGISTERED, instance.user_id, GalleryChange.DELETE)
+
+@receiver(post_save, sender=CustomUser)
+def log_user_department_change(sender, instance, update_fields=None, **kwargs):
+    # The registered gallery is sharded by department
+    if update_fields is not None and "department" not in update_fields:
+        return
+    if FaceEmbedding.objects.filter(user_id=instance.id).exists():
+        record_gallery_change(GalleryChange.REGISTERED, instance.id)
+
+@receiver(post_save, sender=TempUser)
+def log_temp_user_save(sender, instance, created, update_fields=None, **kwargs):
+    # Appearance bumps and other partial saves leave the embedding alone
+    if created or update_fields is None or "face_embedding" in update_fields:
+        record_gallery_change(GalleryChange.VISITOR, instance.id)
+
+@receiver(post_delete, sender=TempUser)
+def log_temp_user_delete(sender, instance, **kwargs):
+    record_gallery_change(GalleryChange.VISITOR, instance.id, GalleryChange.DELETE)
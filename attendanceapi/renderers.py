@@ -0,0 +1,142 @@
+from abc import ABC, abstractmethod
+import orjson
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is only offered when the package is installed
+    msgpack = None
+
+# -------------------------------
+# Recognition response formats
+# -------------------------------
+# Camera clients polling recognize/recognize-and-mark at 10+ fps pay for the
+# response on every frame, so those endpoints render with orjson instead of
+# DRF's json encoder, and offer MessagePack on request. The format follows
+# the Accept header; anything else (or none) gets JSON, as before.
+#
+# A `schema=slim` media type parameter, e.g.
+#     Accept: application/msgpack; schema=slim
+# drops the envelope text and the per-face dicts from success responses:
+#     {"code": "...", "faces": [[x1, y1, x2, y2, user_id], ...], ...}
+# user_id is null for faces that are not a registered user, and
+# recognize-and-mark appends a marked flag (1/0) to each face. Errors keep
+# the usual envelope.
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+SLIM_SCHEMA = "slim"
+
+
+def slim_face(face):
+    user_id = face.get("user_id")
+    row = list(face["bbox"]) + [int(user_id) if user_id is not None else None]
+    if "attendance" in face:
+        attendance = face["attendance"]
+        row.append(1 if attendance and attendance["status"] == "marked" else 0)
+    return row
+
+
+def slim_recognition_body(body):
+    """
+    Slim schema of a recognition success body (other bodies unchanged).
+    """
+    if not isinstance(body, dict) or body.get("status") != "success":
+        return body
+
+    data = body.get("data") or {}
+    slim = {"code": body["code"], "faces": [slim_face(face) for face in data.get("faces", [])]}
+    slim.update((key, value) for key, value in data.items() if key != "faces")
+    return slim
+
+
+def media_type_params(media_type):
+    """
+    Parameters of a media type, e.g. {"schema": "slim"} for
+    "application/msgpack; schema=slim". Names are case-insensitive.
+    """
+    params = {}
+    for part in (media_type or "").split(";")[1:]:
+        name, _, value = part.partition("=")
+        if name.strip():
+            params[name.strip().lower()] = value.strip().strip('"')
+    return params
+
+
+def wants_slim(media_type):
+    return media_type_params(media_type).get("schema") == SLIM_SCHEMA
+
+
+class RecognitionRenderer(BaseRenderer, ABC):
+    charset = None
+
+    @abstractmethod
+    def encode(self, data):
+        """
+        Bytes of a response body.
+        """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if wants_slim(accepted_media_type):
+            data = slim_recognition_body(data)
+        return self.encode(data)
+
+
+class FastJSONRenderer(RecognitionRenderer):
+    media_type = "application/json"
+    format = "json"
+
+    def encode(self, data):
+        return orjson.dumps(data, default=str, option=ORJSON_OPTIONS)
+
+
+class MessagePackRenderer(RecognitionRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+
+    def encode(self, data):
+        return msgpack.packb(data, default=str, use_bin_type=True)
+
+
+RECOGNITION_RENDERERS = [FastJSONRenderer] + ([MessagePackRenderer] if msgpack is not None else [])
+
+
+class RecognitionNegotiation(DefaultContentNegotiation):
+    """
+    Like DRF's negotiation, but an unsupported Accept falls back to JSON
+    instead of 406 (camera clients predating the formats send all sorts).
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+def recognition_formats(view):
+    """
+    Goes above @api_view: the view renders with RECOGNITION_RENDERERS.
+    """
+    view.cls.renderer_classes = RECOGNITION_RENDERERS
+    view.cls.content_negotiation_class = RecognitionNegotiation
+    return view
+
+
+class _AcceptOnly:
+    # What DefaultContentNegotiation reads from a request
+    def __init__(self, accept):
+        self.META = {"HTTP_ACCEPT": accept or "*/*"}
+        self.query_params = {}
+
+
+def negotiate_recognition(accept):
+    """
+    (renderer, accepted media type) for an Accept header, for views outside
+    DRF (the async views).
+    """
+    renderers = [renderer() for renderer in RECOGNITION_RENDERERS]
+    return RecognitionNegotiation().select_renderer(_AcceptOnly(accept), renderers)
@@ -0,0 +1,267 @@
+import math
+import threading
+import time
+from django.conf import settings
+
+# -------------------------------
+# Admission control for live frames
+# -------------------------------
+# A live overlay frame is worthless once it is old, so under load we shed
+# instead of queueing:
+#   * per-camera token bucket (camera_max_fps, camera_burst)  -> 429
+#   * max frames in flight per process                          -> 503
+#   * frames older than max_queue_age_ms are dropped, both on arrival
+#     (client capture time / proxy X-Request-Start) and again right before
+#     inference
+#   * newest frame wins: a frame that is still waiting when a newer frame of
+#     the same camera has been admitted is dropped unprocessed
+# The camera key is the device's camera_id; unauthenticated frames are keyed
+# by client address (devices.admission_key), so all of one client's
+# anonymous cameras share a budget and newest-frame-wins between them.
+# Frames without a key only count against the in-flight limit.
+#
+# All of this state lives in the process. camera_max_fps and camera_burst
+# are meant for the whole deployment, so each process enforces its share
+# (divided by `processes`, which gunicorn.conf.py sets to the worker count);
+# with requests spread over the workers that adds up to the configured
+# rate. max_in_flight and the newest-frame-wins check only come into play
+# where a process runs frames concurrently: the ASGI app, whose frames
+# wait for the inference pool. A sync WSGI worker holds one frame at a time
+# and the sync views never re-check a frame; there the listen backlog is
+# the queue.
+#
+# captured_at comes from the client's clock. An age beyond
+# max_clock_skew_seconds is taken for a wrong clock rather than a frame
+# that queued that long, and the proxy's X-Request-Start (or nothing) is
+# used instead, so a skewed camera is not answered FRAME_STALE forever.
+
+ADMISSION_CONTROL = {
+    "enabled": True,
+    "max_in_flight": 4,
+    "max_queue_age_ms": 1000,
+    "camera_max_fps": 10.0,
+    "camera_burst": 5,
+    "processes": 1,  # Processes sharing the camera budget
+    "max_clock_skew_seconds": 10.0,
+    "retry_after_seconds": 1,
+}
+
+MAX_TRACKED_CAMERAS = 256
+
+REJECTION_REASONS = ("rate_limited", "overloaded", "stale", "superseded")
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a frame is not processed. reason is one of
+    REJECTION_REASONS; retry_after is set for 429/503 answers.
+    """
+
+    def __init__(self, reason, code, message, http_status, retry_after=None):
+        super().__init__(message)
+        self.reason = reason
+        self.code = code
+        self.message = message
+        self.http_status = http_status
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, camera_key, seq, upstream_age):
+        self.camera_key = camera_key
+        self.seq = seq
+        self.upstream_age = upstream_age
+        self.admitted_at = time.monotonic()
+
+    def age(self):
+        return self.upstream_age + (time.monotonic() - self.admitted_at)
+
+
+_lock = threading.Lock()
+_cameras = {}
+_state = {
+    "in_flight": 0,
+    "admitted": 0,
+    "completed": 0,
+    "rejected": {reason: 0 for reason in REJECTION_REASONS},
+}
+
+
+def admission_settings():
+    return {**ADMISSION_CONTROL, **getattr(settings, "ADMISSION_CONTROL", {})}
+
+
+def _epoch_seconds(value):
+    """
+    Accepts epoch seconds, milliseconds or microseconds.
+    """
+    value = float(value)
+    if value > 1e14:
+        return value / 1e6
+    if value > 1e11:
+        return value / 1e3
+    return value
+
+
+def frame_age_seconds(captured_at=None, request_start=None):
+    """
+    How long the frame existed before reaching us: client capture time if
+    given and plausible, else the proxy's X-Request-Start ("t=<epoch>" or a
+    bare epoch). Unparseable or future values count as 0, ages beyond
+    max_clock_skew_seconds are ignored.
+    """
+    max_skew = admission_settings()["max_clock_skew_seconds"]
+
+    for raw in (captured_at, request_start):
+        if raw in (None, ""):
+            continue
+        try:
+            started = _epoch_seconds(str(raw).strip().removeprefix("t="))
+        except ValueError:
+            continue
+        age = time.time() - started
+        if age > max_skew:
+            continue
+        return max(0.0, age)
+
+    return 0.0
+
+
+def _reject(reason, code, message, http_status, retry_after=None):
+    _state["rejected"][reason] += 1
+    raise AdmissionRejected(reason, code, message, http_status, retry_after)
+
+
+def camera_share(config):
+    """
+    (fps, burst) of a camera's budget this process enforces.
+    """
+    processes = max(1, int(config["processes"]))
+    return config["camera_max_fps"] / processes, max(1.0, config["camera_burst"] / processes)
+
+
+def _camera_state(camera_key, config, now):
+    camera = _cameras.get(camera_key)
+
+    if camera is None:
+        if len(_cameras) >= MAX_TRACKED_CAMERAS:
+            oldest = min(_cameras, key=lambda k: _cameras[k]["updated"])
+            del _cameras[oldest]
+        camera = _cameras[camera_key] = {
+            "tokens": camera_share(config)[1],
+            "updated": now,
+            "seq": 0,
+            "admitted": 0,
+            "rejected": 0,
+        }
+
+    # Refill the token bucket
+    elapsed = now - camera["updated"]
+    fps, burst = camera_share(config)
+    camera["tokens"] = min(burst, camera["tokens"] + elapsed * fps)
+    camera["updated"] = now
+    return camera
+
+
+def admit(camera_key=None, upstream_age=0.0):
+    """
+    Admits a frame or raises AdmissionRejected. Every admitted Ticket must
+    be passed to release() when the request finishes.
+    """
+    config = admission_settings()
+
+    if not config["enabled"]:
+        return None
+
+    now = time.monotonic()
+
+    with _lock:
+        if upstream_age * 1000 > config["max_queue_age_ms"]:
+            _reject("stale", "FRAME_STALE", "Frame too old, dropped", 200)
+
+        camera = None
+        if camera_key:
+            camera = _camera_state(camera_key, config, now)
+
+            if camera["tokens"] < 1.0:
+                camera["rejected"] += 1
+                wait = (1.0 - camera["tokens"]) / max(camera_share(config)[0], 1e-6)
+                _reject(
+                    "rate_limited", "CAMERA_RATE_LIMITED",
+                    "Camera is sending frames faster than allowed", 429,
+                    retry_after=max(1, math.ceil(wait)),
+                )
+
+        if _state["in_flight"] >= config["max_in_flight"]:
+            if camera:
+                camera["rejected"] += 1
+            _reject(
+                "overloaded", "SERVER_OVERLOADED",
+                "Recognition is at capacity, retry shortly", 503,
+                retry_after=config["retry_after_seconds"],
+            )
+
+        seq = 0
+        if camera:
+            camera["tokens"] -= 1.0
+            camera["seq"] += 1
+            camera["admitted"] += 1
+            seq = camera["seq"]
+
+        _state["in_flight"] += 1
+        _state["admitted"] += 1
+
+    return Ticket(camera_key, seq, upstream_age)
+
+
+def ensure_current(ticket):
+    """
+    Call right before inference when the frame may have waited since
+    admit() (the ASGI inference pool): drops it if it aged past
+    max_queue_age_ms meanwhile or a newer frame of the same camera has been
+    admitted since.
+    """
+    if ticket is None:
+        return
+
+    config = admission_settings()
+
+    with _lock:
+        if ticket.age() * 1000 > config["max_queue_age_ms"]:
+            _reject("stale", "FRAME_STALE", "Frame too old, dropped", 200)
+
+        camera = _cameras.get(ticket.camera_key) if ticket.camera_key else None
+        if camera and camera["seq"] > ticket.seq:
+            _reject("superseded", "FRAME_SUPERSEDED", "Newer frame from this camera received", 200)
+
+
+def release(ticket):
+    if ticket is None:
+        return
+
+    with _lock:
+        _state["in_flight"] -= 1
+        _state["completed"] += 1
+
+
+def admission_stats():
+    config = admission_settings()
+
+    with _lock:
+        return {
+            "enabled": config["enabled"],
+            "max_in_flight": config["max_in_flight"],
+            "processes": config["processes"],
+            "in_flight": _state["in_flight"],
+            "admitted": _state["admitted"],
+            "completed": _state["completed"],
+            "rejected": dict(_state["rejected"]),
+            "cameras": len(_cameras),
+        }
+
+
+def reset_admission():
+    with _lock:
+        _cameras.clear()
+        _state.update(in_flight=0, admitted=0, completed=0)
+        _state["rejected"] = {reason: 0 for reason in REJECTION_REASONS}
@@ -1,23 +1,296 @@
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
 from django.utils import timezone
 from datetime import timedelta
-from attendanceapi.models import Attendance
+from attendanceapi.models import Attendance, TempAttendance
+from attendanceapi.services.face_recognition_service import match_or_create_temp_users
+from attendanceapi.services.event_feed import notify_attendance_written
+from attendanceapi.services.metrics import span
+from attendanceapi.services.sessions import active_sessions, sessions_for
+from userauth.models import CustomUser, TempUser
 
 
 ATTENDANCE_COOLDOWN_MINUTES = 5
 
 
+# -------------------------------
+# Service sessions
+# -------------------------------
+# While service sessions are active a person is marked once per session:
+# the in-memory present-sets answer "already present" without a query. Only
+# people missing from a session hit the DB, looking for rows since
+# max(window_start, session starts_at): marks from before the session don't
+# count for it, and the cooldown window still bounds the lookup, which
+# covers marks other workers made since the last present-set refresh.
+# Without a session the cooldown window applies.
+
+def _identity(user=None, temp_user=None):
+    if user:
+        return user.department_id, user.id, None
+    return temp_user.department_id, None, temp_user.id
+
+
+def check_since(sessions, window_start, user=None, temp_user=None):
+    """
+    None when the person is already present in every session covering them,
+    else the datetime to look for earlier marks from.
+    """
+    department_id, user_id, temp_user_id = _identity(user, temp_user)
+    covering = sessions_for(sessions, department_id, visitor=temp_user_id is not None)
+    missing = [
+        state for state in covering
+        if not (state.present.has_member(user_id) if user_id is not None else state.present.has_visitor(temp_user_id))
+    ]
+
+    if covering and not missing:
+        return None
+    if missing:
+        return max(window_start, min(state.starts_at for state in missing))
+    return window_start
+
+
+def note_present(sessions, user=None, temp_user=None):
+    department_id, user_id, temp_user_id = _identity(user, temp_user)
+    for state in sessions_for(sessions, department_id, visitor=temp_user_id is not None):
+        state.note(user_id=user_id, temp_user_id=temp_user_id)
+
+
+def _recent_rows(since, user=None, temp_user=None):
+    if user:
+        return Attendance.objects.filter(member=user, created_at__gte=since)
+    return TempAttendance.objects.filter(temp_user=temp_user, created_at__gte=since)
+
+
 def has_recent_attendance(user=None, temp_user=None):
     """
-    Prevent duplicate attendance within cooldown window
+    Prevent duplicate attendance within cooldown window (or the active
+    service sessions)
     """
-    now = timezone.now()
+    if not user and not temp_user:
+        return False
+
+    window_start = timezone.now() - timedelta(minutes=ATTENDANCE_COOLDOWN_MINUTES)
+
+    with span("attendance_check"):
+        since = check_since(active_sessions(), window_start, user, temp_user)
+        if since is None:
+            return True
+        return _recent_rows(since, user, temp_user).exists()
+
+
+def build_attendance(user, distance=None, now=None):
+    """
+    Unsaved Attendance row for a registered user.
+    """
+    now = now or timezone.localtime()
+
+    return Attendance(
+        member=user,
+        distance=distance,
+        gender=user.gender or "undefined",
+        role=user.role,
+        department_id=user.department_id,
+        date=now.date(),
+        time=now.time(),
+        created_at=now,
+    )
+
+
+def build_temp_attendance(temp_user, distance=None, now=None):
+    """
+    Unsaved TempAttendance row for a visitor.
+    """
+    now = now or timezone.localtime()
+
+    return TempAttendance(
+        temp_user=temp_user,
+        distance=distance,
+        gender=temp_user.gender or "undefined",
+        department_id=temp_user.department_id,
+        date=now.date(),
+        time=now.time(),
+        created_at=now,
+    )
+
+
+def record_attendance_once(user=None, temp_user=None, distance=None):
+    """
+    Marks a registered user or a visitor unless already marked (cooldown
+    window or active service sessions). The check and the write share one
+    transaction, with the person's row locked where the database has row
+    locks, so concurrent frames of the same face write one row. Returns the
+    new Attendance / TempAttendance, or None for a duplicate.
+    """
+    sessions = active_sessions()
+    window_start = timezone.now() - timedelta(minutes=ATTENDANCE_COOLDOWN_MINUTES)
+    since = check_since(sessions, window_start, user, temp_user)
+    if since is None:
+        return None
+
+    with transaction.atomic():
+        if user:
+            _lock_rows(CustomUser, [user.id])
+        else:
+            _lock_rows(TempUser, [temp_user.id])
+
+        with span("attendance_check"):
+            if _recent_rows(since, user, temp_user).exists():
+                return None
+
+        attendance = build_attendance(user, distance) if user else build_temp_attendance(temp_user, distance)
+        with span("attendance_write"):
+            attendance.save()
+
+    note_present(sessions, user=user, temp_user=temp_user)
+    notify_attendance_written()
+    return attendance
+
+
+async def arecord_attendance_once(user=None, temp_user=None, distance=None):
+    """
+    Async variant of record_attendance_once (the transaction runs in a thread).
+    """
+    return await sync_to_async(record_attendance_once)(user, temp_user, distance)
+
+
+def _lock_rows(model, ids):
+    """
+    Row-locks the people about to be checked and marked until the
+    transaction ends. SQLite has no row locks and needs none: its write
+    transactions start with BEGIN IMMEDIATE and so already run one at a time.
+    """
+    if ids and connection.features.has_select_for_update:
+        list(model.objects.select_for_update().filter(id__in=ids).order_by("id").values_list("id", flat=True))
+
+
+def _recent_ids(model, field, since):
+    """
+    Ids in {id: since} with a row at or after their since (None: skipped).
+    One query for all of them.
+    """
+    pending = {object_id: value for object_id, value in since.items() if value is not None}
+    if not pending:
+        return set()
+
+    with span("attendance_check"):
+        rows = model.objects.filter(
+            **{f"{field}__in": pending}, created_at__gte=min(pending.values()),
+        ).values_list(field, "created_at")
+        return {object_id for object_id, created_at in rows if created_at >= pending[object_id]}
+
+
+def mark_frame_attendance(results):
+    """
+    Marks attendance for every confirmed face of one frame (the output of
+    recognize_faces_from_frame): at most one cooldown query per table (none
+    for people already present in the active service sessions), vectorised
+    visitor matching and bulk inserts in a single write transaction, opened
+    only if someone in the frame may need marking.
+    Returns one outcome per result: None for faces that are not confirmed,
+    else {"status": "marked" | "duplicate", ...}.
+    """
+    outcomes = [None] * len(results)
+    now = timezone.localtime()
     window_start = now - timedelta(minutes=ATTENDANCE_COOLDOWN_MINUTES)
 
-    filters = {"timestamp__gte": window_start}
+    registered = {}
+    visitors = []
+    created_visitors = set()
+    for index, result in enumerate(results):
+        if result.get("recognized"):
+            registered.setdefault(result["user"].id, []).append(index)
+        elif result.get("embedding") is not None:
+            visitors.append(index)
 
-    if user:
-        filters["user"] = user
-    if temp_user:
-        filters["temp_user"] = temp_user
+    if not registered and not visitors:
+        return outcomes
+
+    sessions = active_sessions()
+    new_rows = []
+
+    # Registered users already present in every session covering them are
+    # answered from memory; a frame of only such people opens no transaction
+    since = {
+        user_id: check_since(sessions, window_start, user=results[indexes[0]]["user"])
+        for user_id, indexes in registered.items()
+    }
+    pending = [user_id for user_id, value in since.items() if value is not None]
+
+    for user_id, indexes in registered.items():
+        if since[user_id] is None:
+            for index in indexes:
+                outcomes[index] = {"status": "duplicate", "user_type": "registered"}
+
+    if not pending and not visitors:
+        return outcomes
+
+    # One short write transaction for the frame: the cooldown checks, visitor
+    # upserts and inserts, so a concurrent frame of the same person cannot
+    # slip in between check and insert
+    with transaction.atomic():
+        # Registered users
+        if pending:
+            _lock_rows(CustomUser, pending)
+            recent = _recent_ids(Attendance, "member_id", since)
+
+            for user_id in pending:
+                indexes = registered[user_id]
+                if user_id in recent:
+                    for index in indexes:
+                        outcomes[index] = {"status": "duplicate", "user_type": "registered"}
+                    continue
+                result = results[indexes[0]]
+                new_rows.append((indexes, "registered", build_attendance(result["user"], result["distance"], now)))
+
+        # Visitors
+        if visitors:
+            matched = match_or_create_temp_users([results[i]["embedding"] for i in visitors])
+
+            since_temp = {
+                temp_user.id: check_since(sessions, window_start, temp_user=temp_user)
+                for temp_user, _, _ in matched
+            }
+            recent_temp = _recent_ids(TempAttendance, "temp_user_id", since_temp)
+
+            seen = {}
+            for index, (temp_user, created, distance) in zip(visitors, matched):
+                if since_temp[temp_user.id] is None or temp_user.id in recent_temp:
+                    outcomes[index] = {"status": "duplicate", "user_type": "visitor", "temp_user_id": temp_user.id}
+                elif temp_user.id in seen:
+                    seen[temp_user.id].append(index)
+                else:
+                    seen[temp_user.id] = [index]
+                    new_rows.append((seen[temp_user.id], "visitor", build_temp_attendance(temp_user, distance, now)))
+                if created:
+                    created_visitors.add(temp_user.id)
+
+        with span("attendance_write"):
+            Attendance.objects.bulk_create([row for _, kind, row in new_rows if kind == "registered"])
+            TempAttendance.objects.bulk_create([row for _, kind, row in new_rows if kind == "visitor"])
+
+    if new_rows:
+        notify_attendance_written()
+
+    for indexes, kind, row in new_rows:
+        if kind == "registered":
+            note_present(sessions, user=row.member)
+        else:
+            note_present(sessions, temp_user=row.temp_user)
+
+        for index in indexes:
+            if kind == "registered":
+                outcomes[index] = {
+                    "status": "marked",
+                    "user_type": "registered",
+                    "attendance_id": row.id,
+                }
+            else:
+                outcomes[index] = {
+                    "status": "marked",
+                    "user_type": "visitor",
+                    "temp_attendance_id": row.id,
+                    "temp_user_id": row.temp_user_id,
+                    "created": row.temp_user_id in created_visitors,
+                }
 
-    return Attendance.objects.filter(**filters).exists()
+    return outcomes
@@ -0,0 +1,50 @@
+import logging
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# SQLite connection profile
+# -------------------------------
+# Every gunicorn worker writes attendance. In SQLite's default rollback
+# journal a writer blocks all readers and a read transaction that later
+# writes can fail at once with "database is locked". In WAL mode readers and
+# the single writer run side by side; busy_timeout makes a blocked writer
+# wait for the lock instead of failing, and synchronous=NORMAL syncs the
+# WAL at checkpoints rather than on every commit (safe against corruption;
+# a power cut may lose the last commits). The PRAGMAs are applied to every
+# new connection; with CONN_MAX_AGE that is once per worker, not per request.
+# Unlike the others, journal_mode=wal persists in the database file; None
+# leaves the file's mode alone (settings.py does so for the checked-in
+# db.sqlite3).
+#
+# settings.py also opens transactions with BEGIN IMMEDIATE, so a write
+# transaction takes the write lock up front and waits for it (busy_timeout)
+# rather than failing on the upgrade from read to write.
+
+SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,  # ms a writer waits for the lock (set first: switching journal mode may wait too)
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -16000,  # Negative: KiB (16 MB page cache per connection)
+    "temp_store": "memory",
+    "wal_autocheckpoint": 1000,  # Pages
+}
+
+
+def sqlite_pragmas():
+    return {**SQLITE_PRAGMAS, **getattr(settings, "SQLITE_PRAGMAS", {})}
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite" or connection.is_in_memory_db():
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas().items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {name} = {value}")
+
@@ -0,0 +1,304 @@
+import hashlib
+import secrets
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from attendanceapi.models import Device
+from attendanceapi.services.face_tracker import FaceTracker
+
+# -------------------------------
+# Camera devices
+# -------------------------------
+# Frames identify their camera with an X-Device-Key header. The key resolves
+# to a Device whose camera_id is the key for all per-camera state: face
+# tracker, motion gate, admission control, camera profile and stats. Without
+# a key the request body's camera_id is used, prefixed "anon:", unless
+# DEVICE_AUTH["required"] is set. Admission control budgets such requests
+# by client address instead (admission_key).
+
+DEVICE_AUTH = {
+    "required": False,
+    "cache_seconds": 60,  # How long a resolved key is trusted without a query
+    "last_seen_interval": 60,  # Minimum seconds between last_seen_at writes
+}
+
+DEVICE_KEY_HEADER = "HTTP_X_DEVICE_KEY"
+ANONYMOUS_CAMERA_PREFIX = "anon:"
+ANONYMOUS_CLIENT_PREFIX = "client:"
+FACE_TRACK_TTL_SECONDS = 5
+MAX_TRACKED_DEVICES = 256
+FPS_SMOOTHING = 0.2
+
+
+class DeviceAuthError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def device_auth_settings():
+    return {**DEVICE_AUTH, **getattr(settings, "DEVICE_AUTH", {})}
+
+
+def hash_device_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def issue_device_key(device):
+    """
+    Generates a new API key for the device and stores only its hash.
+    Returns the key; it cannot be recovered later.
+    """
+    key = secrets.token_urlsafe(32)
+    device.key_hash = hash_device_key(key)
+    device.save(update_fields=["key_hash"] if device.pk else None)
+    forget_device_keys()
+    return key
+
+
+# -------------------------------
+# Key -> Device resolution
+# -------------------------------
+
+_key_lock = threading.Lock()
+_key_cache = {}
+
+
+def forget_device_keys():
+    with _key_lock:
+        _key_cache.clear()
+
+
+def _cached_device(key_hash):
+    with _key_lock:
+        entry = _key_cache.get(key_hash)
+    if entry and entry[1] > time.monotonic():
+        return entry
+    return None
+
+
+def _remember_device(key_hash, device):
+    ttl = device_auth_settings()["cache_seconds"]
+    with _key_lock:
+        _key_cache[key_hash] = (device, time.monotonic() + ttl)
+
+
+def _needs_touch(device):
+    interval = timedelta(seconds=device_auth_settings()["last_seen_interval"])
+    return device.last_seen_at is None or timezone.now() - device.last_seen_at > interval
+
+
+def _check(key, device):
+    if not key:
+        if device_auth_settings()["required"]:
+            raise DeviceAuthError("DEVICE_KEY_REQUIRED", "X-Device-Key header is required")
+        return None
+    if device is None:
+        raise DeviceAuthError("INVALID_DEVICE_KEY", "Unknown or disabled device key")
+    return device
+
+
+def resolve_device(request):
+    """
+    Device for the request's X-Device-Key, or None when no key was sent and
+    keys are optional. Raises DeviceAuthError otherwise.
+    """
+    key = request.META.get(DEVICE_KEY_HEADER)
+    if not key:
+        return _check(key, None)
+
+    key_hash = hash_device_key(key)
+    cached = _cached_device(key_hash)
+
+    if cached:
+        device = cached[0]
+    else:
+        device = Device.objects.filter(key_hash=key_hash, is_active=True).prefetch_related("search_departments").first()
+        _remember_device(key_hash, device)
+
+    if device and _needs_touch(device):
+        device.last_seen_at = timezone.now()
+        Device.objects.filter(pk=device.pk).update(last_seen_at=device.last_seen_at)
+
+    return _check(key, device)
+
+
+async def aresolve_device(request):
+    """
+    Async variant of resolve_device.
+    """
+    key = request.META.get(DEVICE_KEY_HEADER)
+    if not key:
+        return _check(key, None)
+
+    key_hash = hash_device_key(key)
+    cached = _cached_device(key_hash)
+
+    if cached:
+        device = cached[0]
+    else:
+        device = await Device.objects.filter(key_hash=key_hash, is_active=True).prefetch_related("search_departments").afirst()
+        _remember_device(key_hash, device)
+
+    if device and _needs_touch(device):
+        device.last_seen_at = timezone.now()
+        await Device.objects.filter(pk=device.pk).aupdate(last_seen_at=device.last_seen_at)
+
+    return _check(key, device)
+
+
+def camera_context(device, data):
+    """
+    (camera_key, profile_overrides) for a request: the device's camera when
+    authenticated, else the camera_id field from the body under "anon:" (a
+    slug never contains ":"), so an unauthenticated client cannot share a
+    device's tracker, motion or shard state. Its CAMERA_PROFILES entry
+    still applies.
+    """
+    if device is not None:
+        state = device_state(device.camera_id)
+        state["site"] = device_site(device)
+        state["shards"] = device_shards(device)
+        state["global_fallback"] = device.global_fallback
+        return device.camera_id, device.profile
+    camera_id = data.get("camera_id")
+    if not camera_id:
+        return None, None
+    return f"{ANONYMOUS_CAMERA_PREFIX}{camera_id}", getattr(settings, "CAMERA_PROFILES", {}).get(camera_id)
+
+
+def admission_key(device, request):
+    """
+    Whose frame budget (admission control) a request draws on: the device's
+    camera, else the client address. Unauthenticated clients choose their
+    camera_id freely, so keying on it would give them a fresh bucket for
+    every id they make up.
+    """
+    if device is not None:
+        return device.camera_id
+    return f"{ANONYMOUS_CLIENT_PREFIX}{request.META.get('REMOTE_ADDR') or 'unknown'}"
+
+
+def device_site(device):
+    """
+    Site key for state shared by the cameras of one place (the hot tier):
+    the device's department, or the camera itself without one.
+    """
+    if device.department_id:
+        return f"department-{device.department_id}"
+    return device.camera_id
+
+
+def camera_site(camera_key):
+    return device_state(camera_key).get("site") or camera_key or "default"
+
+
+def device_shards(device):
+    """
+    Department ids whose gallery shards the device searches, or None to
+    search the whole gallery (no department configured).
+    """
+    shards = {department.id for department in device.search_departments.all()}
+    if device.department_id:
+        shards.add(device.department_id)
+    return tuple(sorted(shards)) or None
+
+
+def camera_scope(camera_key):
+    """
+    (shards, global_fallback) for a camera; unauthenticated cameras search
+    everything.
+    """
+    state = device_state(camera_key)
+    return state["shards"], state["global_fallback"]
+
+
+# -------------------------------
+# Per-camera runtime state
+# -------------------------------
+
+_state_lock = threading.Lock()
+_states = {}
+
+
+def _new_state():
+    return {
+        "tracker": FaceTracker(FACE_TRACK_TTL_SECONDS),
+        "site": None,
+        "shards": None,
+        "global_fallback": True,
+        "frames": 0,
+        "faces": 0,
+        "recognized": 0,
+        "marked": 0,
+        "fps": 0.0,
+        "last_frame": None,
+    }
+
+
+def device_state(camera_key):
+    camera_key = camera_key or "default"
+
+    with _state_lock:
+        state = _states.get(camera_key)
+        if state is None:
+            if len(_states) >= MAX_TRACKED_DEVICES:
+                oldest = min(_states, key=lambda k: _states[k]["last_frame"] or 0)
+                del _states[oldest]
+            state = _states[camera_key] = _new_state()
+        return state
+
+
+def get_tracker(camera_key):
+    return device_state(camera_key)["tracker"]
+
+
+def record_frame(camera_key, faces=0, recognized=0):
+    state = device_state(camera_key)
+    now = time.monotonic()
+
+    with _state_lock:
+        if state["last_frame"] is not None:
+            interval = now - state["last_frame"]
+            if interval > 0:
+                state["fps"] += FPS_SMOOTHING * (1.0 / interval - state["fps"])
+        state["last_frame"] = now
+        state["frames"] += 1
+        state["faces"] += faces
+        state["recognized"] += recognized
+
+
+def record_mark(camera_key, count=1):
+    state = device_state(camera_key)
+    with _state_lock:
+        state["marked"] += count
+
+
+def device_stats():
+    now = time.monotonic()
+
+    with _state_lock:
+        items = list(_states.items())
+
+    return {
+        camera_key: {
+            "frames": state["frames"],
+            "faces": state["faces"],
+            "recognized": state["recognized"],
+            "marked": state["marked"],
+            "site": state["site"],
+            "shards": state["shards"],
+            "fps": round(state["fps"], 2),
+            "idle_seconds": round(now - state["last_frame"], 1) if state["last_frame"] else None,
+            "active_tracks": state["tracker"].active_tracks(),
+        }
+        for camera_key, state in items
+    }
+
+
+def reset_device_state():
+    with _state_lock:
+        _states.clear()
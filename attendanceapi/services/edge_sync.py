@@ -0,0 +1,134 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from attendanceapi.models import Attendance, IdempotencyKey
+from attendanceapi.services.attendance_service import build_attendance
+from attendanceapi.services.event_feed import notify_attendance_written
+from attendanceapi.services.idempotency import idempotency_owner
+from attendanceapi.services.metrics import span
+from userauth.models import CustomUser
+
+# -------------------------------
+# Edge event ingestion
+# -------------------------------
+# Edge devices match locally and queue attendance events while offline. Each
+# event carries an idempotency key, unique per device; the sync endpoint
+# writes unseen events in one transaction and reports already-ingested keys
+# as duplicates, so an edge can resend a batch whose response it never
+# received. When a concurrent sync of the same device commits one of the
+# keys first, the batch is re-checked and those keys become duplicates.
+
+EDGE_SYNC_SCOPE = "edge_sync"
+EDGE_SYNC_MAX_EVENTS = 500
+EDGE_SYNC_ATTEMPTS = 3
+
+
+def _captured_at(value):
+    """
+    Event time from epoch seconds; falls back to now for missing/bad values.
+    """
+    try:
+        moment = datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return timezone.localtime()
+    return timezone.localtime(moment)
+
+
+def _distance(value):
+    """
+    Match distance as a float (None if absent). Raises ValueError if unusable.
+    """
+    if value is None:
+        return None
+    distance = float(value)
+    if not math.isfinite(distance):
+        raise ValueError(f"Distance {value!r} is not finite")
+    return distance
+
+
+def ingest_edge_events(device, events):
+    """
+    Writes queued edge attendance events.
+    events: [{"idempotency_key", "user_id", "captured_at", "distance"}, ...]
+    Returns {"accepted": [...], "duplicates": [...], "rejected": [{"key", "reason"}]}.
+    """
+    rejected = []
+
+    valid = []
+    for event in events:
+        key = str(event.get("idempotency_key") or "")[:128]
+        try:
+            user_id = int(event["user_id"])
+        except (KeyError, TypeError, ValueError):
+            user_id = None
+        if not key or user_id is None:
+            rejected.append({"key": key or None, "reason": "MISSING_FIELDS"})
+            continue
+        try:
+            distance = _distance(event.get("distance"))
+        except (TypeError, ValueError):
+            rejected.append({"key": key, "reason": "INVALID_DISTANCE"})
+            continue
+        valid.append((key, {**event, "user_id": user_id, "distance": distance}))
+
+    if not valid:
+        return {"accepted": [], "duplicates": [], "rejected": rejected}
+
+    owner = idempotency_owner(device)
+    for attempt in range(EDGE_SYNC_ATTEMPTS):
+        try:
+            accepted, duplicates, missing = _write_events(device, owner, valid)
+            break
+        except IntegrityError:
+            # Another sync of this device committed some of the keys first
+            if attempt == EDGE_SYNC_ATTEMPTS - 1:
+                raise
+
+    if accepted:
+        notify_attendance_written()
+
+    return {"accepted": accepted, "duplicates": duplicates, "rejected": rejected + missing}
+
+
+def _write_events(device, owner, valid):
+    duplicates, missing = [], []
+
+    with transaction.atomic(), span("edge_ingest"):
+        seen = set(IdempotencyKey.objects.filter(
+            scope=EDGE_SYNC_SCOPE, owner=owner, key__in=[key for key, _ in valid],
+        ).values_list("key", flat=True))
+
+        users = CustomUser.objects.in_bulk({event["user_id"] for _, event in valid})
+
+        pending = []
+        for key, event in valid:
+            if key in seen:
+                duplicates.append(key)
+                continue
+
+            user = users.get(event["user_id"])
+            if user is None:
+                missing.append({"key": key, "reason": "USER_NOT_FOUND"})
+                continue
+
+            seen.add(key)
+            pending.append((key, build_attendance(
+                user, event["distance"], _captured_at(event.get("captured_at")),
+            )))
+
+        # A key a concurrent sync committed meanwhile fails this insert and
+        # rolls back the Attendance rows with it
+        Attendance.objects.bulk_create([row for _, row in pending])
+        IdempotencyKey.objects.bulk_create([
+            IdempotencyKey(
+                scope=EDGE_SYNC_SCOPE,
+                owner=owner,
+                key=key,
+                device=device,
+                response={"attendance_id": row.id},
+            )
+            for key, row in pending
+        ])
+
+    return [key for key, _ in pending], duplicates, missing
@@ -0,0 +1,118 @@
+import numpy as np
+from attendanceapi.models import FaceEmbedding
+from attendanceapi.services.face_model import face_model_version, get_face_app
+from attendanceapi.services.face_quality import (
+    ENROLLMENT_QUALITY,
+    assess_face,
+    select_best_face,
+)
+from attendanceapi.services.gallery import normalize
+from attendanceapi.services.model_versions import sync_active_model
+
+ENROLLMENT_MAX_FRAMES = 10
+ENROLLMENT_MAX_CENTROIDS = 3
+# Sub-centroids only pay off once there are enough samples to cluster
+ENROLLMENT_MIN_SAMPLES_PER_CENTROID = 2
+KMEANS_ITERATIONS = 10
+
+
+def _spherical_kmeans(vectors, k):
+    """
+    Small deterministic k-means on unit vectors (farthest-point init).
+    """
+    centroids = [vectors[0]]
+    for _ in range(1, k):
+        similarity = np.max(vectors @ np.stack(centroids).T, axis=1)
+        centroids.append(vectors[int(np.argmin(similarity))])
+    centroids = np.stack(centroids)
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(k):
+            members = vectors[assignment == i]
+            if len(members):
+                centroids[i] = normalize(members.mean(axis=0))
+
+    return centroids
+
+
+def build_template(embeddings):
+    """
+    Fuse several embeddings of one person into a template.
+    Returns (template, centroids) where the template is the normalised mean
+    and centroids is a (possibly empty) list of sub-cluster centres.
+    """
+    vectors = normalize(embeddings)
+    template = normalize(vectors.mean(axis=0))
+
+    k = min(ENROLLMENT_MAX_CENTROIDS, len(vectors) // ENROLLMENT_MIN_SAMPLES_PER_CENTROID)
+    if k < 2:
+        return template, []
+
+    return template, list(_spherical_kmeans(vectors, k))
+
+
+def collect_enrollment_embeddings(frames, app=None):
+    """
+    Runs detection on every enrollment frame, keeps the best face per frame
+    and quality-gates it (with `app`, e.g. another model pack, if given).
+    Returns (embeddings, rejected) where rejected is a list of
+    {"index": i, "reason": code}.
+    """
+    app = app or get_face_app()
+    embeddings = []
+    rejected = []
+
+    for index, frame in enumerate(frames):
+        if frame is None or frame.size == 0:
+            rejected.append({"index": index, "reason": "INVALID_IMAGE"})
+            continue
+
+        face = select_best_face(app.get(frame))
+        if face is None or face.embedding is None:
+            rejected.append({"index": index, "reason": "NO_FACE"})
+            continue
+
+        reason = assess_face(frame, face, ENROLLMENT_QUALITY)
+        if reason:
+            rejected.append({"index": index, "reason": reason})
+            continue
+
+        embeddings.append(np.asarray(face.embedding, dtype=np.float32))
+
+    return embeddings, rejected
+
+
+def enroll_user(user, frames):
+    """
+    Builds and stores a fused template for a registered user.
+    Returns (face_embedding, summary); face_embedding is None if no frame
+    produced a usable face.
+    """
+    # Enroll with the pack the gallery is on, even right after a cutover
+    sync_active_model()
+    embeddings, rejected = collect_enrollment_embeddings(frames)
+
+    summary = {
+        "samples_used": len(embeddings),
+        "rejected": rejected,
+        "centroids": 0,
+    }
+
+    if not embeddings:
+        return None, summary
+
+    template, centroids = build_template(embeddings)
+    summary["centroids"] = len(centroids)
+
+    face_embedding, _ = FaceEmbedding.objects.update_or_create(
+        user=user,
+        defaults={
+            "embedding": template.tolist(),
+            "centroids": [c.tolist() for c in centroids] or None,
+            "sample_count": len(embeddings),
+            "model_version": face_model_version(),
+        },
+    )
+
+    return face_embedding, summary
@@ -0,0 +1,453 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Max
+from attendanceapi.models import Attendance, TempAttendance
+
+# -------------------------------
+# Live attendance feed (Server-Sent Events)
+# -------------------------------
+# One tail poller thread per worker reads attendance rows past its cursor
+# (the highest Attendance and TempAttendance ids seen) and fans them out to
+# the subscribed streams. It runs while someone is subscribed (and for
+# idle_seconds after, so reconnects find their events in memory), polls
+# every poll_seconds (rows written by other workers) and is woken at once
+# by writes in this worker. Every dashboard therefore shares two indexed
+# "id > n" queries instead of re-running the day's attendance list.
+#
+# An event's id is the cursor after it, "<attendance_id>-<temp_attendance_id>".
+# Reconnects send it back as Last-Event-ID and are replayed from the last
+# replay_size events kept in memory, or from the DB (at most replay_limit
+# rows) when the cursor is older than that. Each subscriber buffers at most
+# subscriber_buffer events; a stream that falls behind is replayed from its
+# own cursor instead of growing without bound.
+#
+# Streams are only served by the ASGI view. A WSGI worker (gunicorn "sync",
+# the default) would be pinned to one dashboard for max_stream_seconds,
+# starving recognition and missing its arbiter heartbeat, so there the
+# endpoint answers 501 instead.
+
+ATTENDANCE_FEED = {
+    "poll_seconds": 1.0,
+    "replay_size": 1000,
+    "replay_limit": 500,
+    "subscriber_buffer": 256,
+    "max_subscribers": 200,
+    "heartbeat_seconds": 15,
+    "max_stream_seconds": 300,  # Clients reconnect with Last-Event-ID
+    "idle_seconds": 30,  # Keep tailing this long after the last stream closes
+    "retry_ms": 2000,
+}
+
+REGISTERED = "registered"
+VISITOR = "visitor"
+FEED_KINDS = (REGISTERED, VISITOR)
+
+
+def feed_settings():
+    return {**ATTENDANCE_FEED, **getattr(settings, "ATTENDANCE_FEED", {})}
+
+
+def format_cursor(cursor):
+    return f"{cursor[0]}-{cursor[1]}"
+
+
+def parse_cursor(value):
+    """
+    (attendance_id, temp_attendance_id) from an event id; None if malformed.
+    """
+    try:
+        registered, visitor = (int(part) for part in value.split("-"))
+    except (AttributeError, ValueError):
+        return None
+    if registered < 0 or visitor < 0:
+        return None
+    return registered, visitor
+
+
+def is_after(event, cursor):
+    """
+    True when the event's row is past the cursor (not yet delivered).
+    """
+    if event["kind"] == REGISTERED:
+        return event["row_id"] > cursor[0]
+    return event["row_id"] > cursor[1]
+
+
+def current_cursor():
+    registered = Attendance.objects.aggregate(last=Max("id"))["last"] or 0
+    visitor = TempAttendance.objects.aggregate(last=Max("id"))["last"] or 0
+    return registered, visitor
+
+
+def fetch_events(cursor, limit):
+    """
+    Attendance rows past the cursor as feed events (oldest first), at most
+    `limit` per table. Returns (events, cursor_after, truncated).
+    """
+    registered = list(
+        Attendance.objects.filter(id__gt=cursor[0]).order_by("id").values(
+            "id", "member_id", "member__first_name", "member__last_name", "role",
+            "gender", "department_id", "distance", "created_at",
+        )[:limit]
+    )
+    visitors = list(
+        TempAttendance.objects.filter(id__gt=cursor[1]).order_by("id").values(
+            "id", "temp_user_id", "temp_user__temp_username", "gender",
+            "department_id", "distance", "created_at",
+        )[:limit]
+    )
+
+    rows = [(row["created_at"], REGISTERED, row) for row in registered]
+    rows += [(row["created_at"], VISITOR, row) for row in visitors]
+    rows.sort(key=lambda item: (item[0], item[1], item[2]["id"]))
+
+    events = []
+    registered_id, visitor_id = cursor
+    for created_at, kind, row in rows:
+        if kind == REGISTERED:
+            registered_id = max(registered_id, row["id"])
+            data = {
+                "kind": kind,
+                "attendance_id": row["id"],
+                "user_id": row["member_id"],
+                "name": f"{row['member__first_name']} {row['member__last_name']}".strip(),
+                "role": row["role"],
+            }
+        else:
+            visitor_id = max(visitor_id, row["id"])
+            data = {
+                "kind": kind,
+                "temp_attendance_id": row["id"],
+                "temp_user_id": row["temp_user_id"],
+                "name": row["temp_user__temp_username"],
+            }
+        data.update({
+            "gender": row["gender"],
+            "department_id": row["department_id"],
+            "distance": row["distance"],
+            "created_at": created_at.isoformat(),
+        })
+        event_cursor = (registered_id, visitor_id)
+        events.append({
+            "id": format_cursor(event_cursor),
+            "cursor": event_cursor,
+            "kind": kind,
+            "row_id": row["id"],
+            "department_id": row["department_id"],
+            "data": data,
+        })
+
+    truncated = len(registered) >= limit or len(visitors) >= limit
+    return events, (registered_id, visitor_id), truncated
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: attendance\ndata: {json.dumps(event['data'])}\n\n"
+
+
+class FeedSubscriber:
+    """
+    One open stream: a bounded buffer of events matching its filters plus
+    the cursor of the last event it delivered.
+    """
+
+    def __init__(self, cursor, max_buffer, notify, kinds=FEED_KINDS, department_id=None):
+        self.cursor = cursor
+        self.max_buffer = max_buffer
+        self.kinds = kinds
+        self.department_id = department_id
+        self.lagged = False
+        self._notify = notify
+        self._buffer = deque()
+        self._lock = threading.Lock()
+
+    def wants(self, event):
+        if event["kind"] not in self.kinds:
+            return False
+        return self.department_id is None or event["department_id"] == self.department_id
+
+    def offer(self, events):
+        events = [event for event in events if self.wants(event)]
+        if not events:
+            return
+        with self._lock:
+            if len(self._buffer) + len(events) > self.max_buffer:
+                # Too slow: drop the backlog, the stream replays from its cursor
+                self._buffer.clear()
+                self.lagged = True
+            else:
+                self._buffer.extend(events)
+        self._notify()
+
+    def drain(self):
+        """
+        Buffered events not yet delivered, and whether the stream must
+        replay from its cursor first.
+        """
+        with self._lock:
+            events = list(self._buffer)
+            self._buffer.clear()
+            lagged, self.lagged = self.lagged, False
+        return events, lagged
+
+    def deliver(self, events):
+        """
+        SSE chunks for the events past the cursor; advances the cursor.
+        """
+        chunks = []
+        for event in events:
+            if is_after(event, self.cursor):
+                chunks.append(format_sse(event))
+                self.cursor = (max(self.cursor[0], event["cursor"][0]), max(self.cursor[1], event["cursor"][1]))
+        return chunks
+
+
+class FeedFull(Exception):
+    pass
+
+
+class AttendanceFeed:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._subscribers = set()
+        self._thread = None
+        self._woken = False
+        self._cursor = None
+        self._ring = deque()
+        self._ring_base = None  # Cursor just before the oldest ring event
+        self.events = 0
+        self.polls = 0
+        self.lagged = 0
+        self.db_replays = 0
+
+    # -- Subscriptions --
+
+    def has_room(self):
+        with self._cond:
+            return len(self._subscribers) < feed_settings()["max_subscribers"]
+
+    def subscribe(self, cursor, notify, kinds=FEED_KINDS, department_id=None):
+        """
+        Registers a stream. cursor None starts at the live edge; a cursor
+        past the newest rows (another database, or rows since deleted) is
+        clamped to them. Raises FeedFull beyond max_subscribers.
+        """
+        config = feed_settings()
+
+        if cursor is not None:
+            head = current_cursor()
+            cursor = (min(cursor[0], head[0]), min(cursor[1], head[1]))
+
+        with self._cond:
+            if len(self._subscribers) >= config["max_subscribers"]:
+                raise FeedFull()
+            if self._thread is None:
+                # Not tailing: start from the live edge with an empty ring
+                self._cursor = self._ring_base = current_cursor()
+                self._ring.clear()
+            subscriber = FeedSubscriber(
+                cursor if cursor is not None else self._cursor,
+                config["subscriber_buffer"], notify, kinds, department_id,
+            )
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="attendance-feed", daemon=True)
+                self._thread.start()
+
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._cond:
+            self._subscribers.discard(subscriber)
+
+    def live_cursor(self):
+        with self._cond:
+            return self._cursor
+
+    def wake(self):
+        """
+        Poll now (called after this worker writes attendance).
+        """
+        with self._cond:
+            if self._thread is not None:
+                self._woken = True
+                self._cond.notify_all()
+
+    # -- Replay --
+
+    def replay(self, cursor):
+        """
+        Events after the cursor: from memory when the ring reaches back that
+        far, else from the DB. Returns (events, complete); complete is False
+        when more than replay_limit rows were missed.
+        """
+        with self._cond:
+            base = self._ring_base
+            if base is not None and cursor[0] >= base[0] and cursor[1] >= base[1]:
+                return [event for event in self._ring if is_after(event, cursor)], True
+
+        self.db_replays += 1
+        events, _, truncated = fetch_events(cursor, feed_settings()["replay_limit"])
+        return events, not truncated
+
+    # -- Poller --
+
+    def _run(self):
+        idle_since = None
+        try:
+            while True:
+                config = feed_settings()
+                with self._cond:
+                    self._cond.wait_for(lambda: self._woken, timeout=config["poll_seconds"])
+                    if self._subscribers:
+                        idle_since = None
+                    elif idle_since is None:
+                        idle_since = time.monotonic()
+                    elif time.monotonic() - idle_since >= config["idle_seconds"]:
+                        # Reconnects within idle_seconds replayed from the ring
+                        self._thread = None
+                        return
+                    self._woken = False
+                    cursor = self._cursor
+
+                events, cursor, _ = fetch_events(cursor, config["replay_limit"])
+                self.polls += 1
+                close_old_connections()
+                if events:
+                    self._publish(events, cursor, config["replay_size"])
+        finally:
+            connection.close()
+
+    def _publish(self, events, cursor, replay_size):
+        with self._cond:
+            self._cursor = cursor
+            self._ring.extend(events)
+            while len(self._ring) > replay_size:
+                self._ring_base = self._ring.popleft()["cursor"]
+            subscribers = list(self._subscribers)
+            self.events += len(events)
+
+        for subscriber in subscribers:
+            was_lagged = subscriber.lagged
+            subscriber.offer(events)
+            if subscriber.lagged and not was_lagged:
+                self.lagged += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "subscribers": len(self._subscribers),
+                "running": self._thread is not None,
+                "cursor": format_cursor(self._cursor) if self._cursor else None,
+                "ring": len(self._ring),
+                "events": self.events,
+                "polls": self.polls,
+                "lagged": self.lagged,
+                "db_replays": self.db_replays,
+            }
+
+
+attendance_feed = AttendanceFeed()
+
+
+def notify_attendance_written():
+    attendance_feed.wake()
+
+
+def attendance_feed_stats():
+    return attendance_feed.stats()
+
+
+# -------------------------------
+# Stream bodies
+# -------------------------------
+# aiter_feed yields the SSE text of one connection. `headcount`
+# (optional) returns a service session's headcount dict, sent as a
+# "headcount" event whenever its revision changes.
+
+RESET_CHUNK = "event: reset\ndata: {}\n\n"
+HEARTBEAT_CHUNK = ": keepalive\n\n"
+
+
+def format_headcount(headcount):
+    return f"event: headcount\ndata: {json.dumps(headcount)}\n\n"
+
+
+def _replay_chunks(subscriber):
+    events, complete = attendance_feed.replay(subscriber.cursor)
+    if not complete:
+        # Missed more than replay_limit rows: the client reloads its list
+        subscriber.cursor = attendance_feed.live_cursor()
+        return [RESET_CHUNK]
+    return subscriber.deliver(events)
+
+
+def _headcount_chunks(headcount, last_revision):
+    if headcount is None or headcount["revision"] == last_revision:
+        return [], last_revision
+    return [format_headcount(headcount)], headcount["revision"]
+
+
+async def aiter_feed(cursor=None, kinds=FEED_KINDS, department_id=None, headcount=None):
+    """
+    SSE generator for the ASGI view; waiting costs no thread. cursor is the
+    parsed Last-Event-ID (None: live edge only) and headcount an async
+    callable. Raises FeedFull before yielding when the feed is full.
+    """
+    config = feed_settings()
+    if not attendance_feed.has_room():
+        raise FeedFull()
+
+    loop = asyncio.get_running_loop()
+    woken = asyncio.Event()
+
+    def notify():
+        try:
+            loop.call_soon_threadsafe(woken.set)
+        except RuntimeError:
+            pass  # Loop closed under a stream that was never finished
+
+    async def stream():
+        # Subscribed by the generator itself, so a stream that is never
+        # iterated (client gone before the first chunk) leaves nothing behind
+        try:
+            subscriber = await sync_to_async(attendance_feed.subscribe)(cursor, notify, kinds, department_id)
+        except FeedFull:
+            return  # Filled up since has_room(); the client retries
+
+        last_revision = None
+        deadline = time.monotonic() + config["max_stream_seconds"]
+        try:
+            yield f"retry: {config['retry_ms']}\n\n"
+            if cursor is not None:
+                for chunk in await sync_to_async(_replay_chunks)(subscriber):
+                    yield chunk
+
+            while time.monotonic() < deadline:
+                chunks, last_revision = _headcount_chunks(await headcount() if headcount else None, last_revision)
+                for chunk in chunks:
+                    yield chunk
+
+                try:
+                    await asyncio.wait_for(woken.wait(), config["heartbeat_seconds"])
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_CHUNK
+                    continue
+                woken.clear()
+
+                events, lagged = subscriber.drain()
+                if lagged:
+                    for chunk in await sync_to_async(_replay_chunks)(subscriber):
+                        yield chunk
+                for chunk in subscriber.deliver(events):
+                    yield chunk
+        finally:
+            attendance_feed.unsubscribe(subscriber)
+
+    return stream()
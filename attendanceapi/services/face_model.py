@@ -1,12 +1,180 @@
-from insightface.app import FaceAnalysis
+import os
+from attendanceapi.services.shared_model import (
+    FACE_MODEL_MODULES,
+    build_shared_face_app,
+    has_shared_weights,
+    share_model_weights,
+)
+
+# insightface (and through it onnxruntime, scipy, matplotlib, albumentations)
+# is imported on first use, not with this module: management commands,
+# admin and report processes import the services without ever running a
+# model, and importing the library alone takes over a second.
+
+# FACE_MODEL_STUB=1 swaps in the offline fake (benchmarks, load tests)
+FACE_MODEL_STUB = os.environ.get("FACE_MODEL_STUB", "0") == "1"
+FACE_MODEL_STUB_DELAY_MS = float(os.environ.get("FACE_MODEL_STUB_DELAY_MS", 0))
+FACE_MODEL_STUB_FACES = int(os.environ.get("FACE_MODEL_STUB_FACES", 1))
+FACE_MODEL_SHARE_WEIGHTS = os.environ.get("FACE_MODEL_SHARE_WEIGHTS", "1") == "1"
+
+# Pack used until the gallery names an active FaceModelVersion
+FACE_MODEL_NAME = os.environ.get("FACE_MODEL_NAME", "buffalo_s")
 
 _face_app = None
+_active_pack = None  # Set by model_versions.sync_active_model()
+
+
+def load_face_model(name):
+    """
+    Builds and prepares a face app for the given model pack. The stub
+    stands in for any pack.
+    """
+    if FACE_MODEL_STUB:
+        from attendanceapi.services.fake_face_model import FakeFaceAnalysis
+        app = FakeFaceAnalysis(
+            faces_per_frame=FACE_MODEL_STUB_FACES,
+            det_delay_ms=FACE_MODEL_STUB_DELAY_MS,
+            rec_delay_ms=FACE_MODEL_STUB_DELAY_MS / 4,
+        )
+    elif has_shared_weights(name):
+        app = build_shared_face_app(name)
+    else:
+        from insightface.app import FaceAnalysis
+        app = FaceAnalysis(name=name, allowed_modules=FACE_MODEL_MODULES)
+    app.prepare(ctx_id=0)
+    return app
+
 
 def get_face_app():
     global _face_app
 
     if _face_app is None:
-        _face_app = FaceAnalysis(name="buffalo_s")
-        _face_app.prepare(ctx_id=0)
+        _face_app = load_face_model(face_model_version())
 
     return _face_app
+
+
+def set_active_model_pack(name):
+    """
+    Switches the pack this process embeds with; the face app is rebuilt on
+    next use. Returns True if the pack changed.
+    """
+    global _active_pack, _face_app
+
+    if name == face_model_version():
+        _active_pack = name
+        return False
+
+    _active_pack = name
+    _face_app = None
+    return True
+
+
+def preload_inference_stack():
+    """
+    For gunicorn preload mode: import the inference libraries and load the
+    model pack's weights in the master so workers share them copy-on-write
+    (see shared_model). ONNX sessions are still built per worker; their
+    thread pools do not survive fork.
+    """
+    import cv2  # noqa: F401
+    import insightface.app  # noqa: F401
+    import onnxruntime  # noqa: F401
+    from scipy.spatial import distance  # noqa: F401
+
+    if FACE_MODEL_STUB:
+        return
+    if FACE_MODEL_SHARE_WEIGHTS:
+        share_model_weights(face_model_version())
+    else:
+        from insightface.utils import ensure_available
+        ensure_available("models", face_model_version())
+
+
+def face_model_version():
+    """
+    Identifies the model pack producing embeddings (embeddings of different
+    packs are not comparable).
+    """
+    return _active_pack or FACE_MODEL_NAME
+
+
+def reset_after_fork():
+    """
+    Drops any face app inherited from the parent process so the worker
+    creates fresh ONNX sessions on first use.
+    """
+    global _face_app
+    _face_app = None
+
+
+def set_face_app(app):
+    """
+    Replaces the process-wide face app (benchmarks inject a fake here).
+    Returns the previous one.
+    """
+    global _face_app
+
+    previous = _face_app
+    _face_app = app
+    return previous
+
+
+def detect_faces(frame):
+    """
+    Runs only the detector. Returns Face objects with bbox, kps and det_score
+    but no embedding, so callers can discard faces before paying for
+    recognition.
+    """
+    from insightface.app.common import Face
+
+    app = get_face_app()
+    bboxes, kpss = app.det_model.detect(frame, max_num=0, metric="default")
+
+    faces = []
+    for i in range(bboxes.shape[0]):
+        faces.append(Face(
+            bbox=bboxes[i, 0:4],
+            kps=kpss[i] if kpss is not None else None,
+            det_score=bboxes[i, 4],
+        ))
+
+    return faces
+
+
+def embed_face(frame, face):
+    """
+    Computes the recognition embedding for one detected face (in place).
+    """
+    app = get_face_app()
+    app.models["recognition"].get(frame, face)
+
+    return face.embedding
+
+
+def embed_faces(frame, faces):
+    """
+    Embeds all given faces of one frame, in a single batched recognition
+    call when the model supports it (ArcFace get_feat). Sets face.embedding
+    on each face and returns the embeddings in order.
+    """
+    if not faces:
+        return []
+
+    model = get_face_app().models["recognition"]
+
+    if len(faces) == 1 or not hasattr(model, "get_feat"):
+        return [embed_face(frame, face) for face in faces]
+
+    from insightface.utils import face_align
+
+    crops = [
+        face_align.norm_crop(frame, landmark=face.kps, image_size=model.input_size[0])
+        for face in faces
+    ]
+    features = model.get_feat(crops)
+
+    for face, feature in zip(faces, features):
+        face.embedding = feature.flatten()
+
+    return [face.embedding for face in faces]
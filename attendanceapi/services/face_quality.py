@@ -0,0 +1,148 @@
+import cv2
+import numpy as np
+from django.conf import settings
+
+# -------------------------------
+# Quality gate reason codes
+# -------------------------------
+FACE_TOO_SMALL = "FACE_TOO_SMALL"
+LOW_DET_SCORE = "LOW_DET_SCORE"
+FACE_BLURRY = "FACE_BLURRY"
+POSE_TOO_EXTREME = "POSE_TOO_EXTREME"
+
+# Enrollment photos become the reference template, so they are held to a
+# stricter standard than live frames.
+ENROLLMENT_QUALITY = {
+    "min_face_size": 80,
+    "min_det_score": 0.6,
+    "min_blur": 60.0,
+    "max_yaw": 30.0,
+    "max_pitch": 25.0,
+}
+
+# Live frames: loose enough to keep usable faces, tight enough to drop the
+# back rows of the hall. Override via settings.FACE_QUALITY_GATE.
+RECOGNITION_QUALITY = {
+    "enabled": True,
+    "min_face_size": 40,
+    "min_det_score": 0.5,
+    "min_blur": 25.0,
+    "max_yaw": 45.0,
+    "max_pitch": 35.0,
+}
+
+BLUR_SAMPLE_SIZE = 112
+
+
+def recognition_quality_thresholds():
+    """
+    Recognition quality gate settings, merged over the defaults.
+    """
+    return {**RECOGNITION_QUALITY, **getattr(settings, "FACE_QUALITY_GATE", {})}
+
+
+def face_box_size(face):
+    """
+    Shortest side of the face bbox in pixels.
+    """
+    x1, y1, x2, y2 = face.bbox[:4]
+    return float(min(x2 - x1, y2 - y1))
+
+
+def select_best_face(faces):
+    """
+    Pick the face most worth embedding: highest detector score weighted by area.
+    """
+    if not faces:
+        return None
+
+    def _score(face):
+        x1, y1, x2, y2 = face.bbox[:4]
+        area = max(x2 - x1, 0) * max(y2 - y1, 0)
+        return float(face.det_score or 0.0) * float(area)
+
+    return max(faces, key=_score)
+
+
+def blur_score(frame, bbox):
+    """
+    Variance of the Laplacian over the face crop (higher is sharper).
+    The crop is resized first so the score does not depend on face size.
+    """
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = [int(v) for v in bbox[:4]]
+    x1, y1 = max(x1, 0), max(y1, 0)
+    x2, y2 = min(x2, w), min(y2, h)
+
+    if x2 <= x1 or y2 <= y1:
+        return 0.0
+
+    crop = frame[y1:y2, x1:x2]
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    crop = cv2.resize(crop, (BLUR_SAMPLE_SIZE, BLUR_SAMPLE_SIZE))
+
+    return float(cv2.Laplacian(crop, cv2.CV_64F).var())
+
+
+def estimate_pose(kps):
+    """
+    Coarse (yaw, pitch, roll) in degrees from the 5-point detector landmarks
+    (left eye, right eye, nose, left mouth corner, right mouth corner).
+    """
+    if kps is None or len(kps) < 5:
+        return None
+
+    kps = np.asarray(kps, dtype=np.float32)
+    left_eye, right_eye, nose, left_mouth, right_mouth = kps[:5]
+
+    eye_vec = right_eye - left_eye
+    interocular = float(np.linalg.norm(eye_vec))
+    if interocular < 1e-6:
+        return None
+
+    roll = float(np.degrees(np.arctan2(eye_vec[1], eye_vec[0])))
+
+    # Undo roll so yaw/pitch are measured in the face's own frame
+    theta = -np.radians(roll)
+    rotation = np.array([
+        [np.cos(theta), -np.sin(theta)],
+        [np.sin(theta), np.cos(theta)],
+    ], dtype=np.float32)
+    eye_mid = (left_eye + right_eye) / 2
+    nose_rel = rotation @ (nose - eye_mid)
+    mouth_rel = rotation @ ((left_mouth + right_mouth) / 2 - eye_mid)
+
+    yaw_ratio = np.clip(2.0 * nose_rel[0] / interocular, -1.0, 1.0)
+    yaw = float(np.degrees(np.arcsin(yaw_ratio)))
+
+    pitch = 0.0
+    if mouth_rel[1] > 1e-6:
+        pitch_ratio = np.clip(2.0 * (nose_rel[1] / mouth_rel[1] - 0.5), -1.0, 1.0)
+        pitch = float(np.degrees(np.arcsin(pitch_ratio)))
+
+    return yaw, pitch, roll
+
+
+def assess_face(frame, face, thresholds):
+    """
+    Returns None when the face passes the quality gate,
+    otherwise the reason code for the first failing check.
+    Checks run cheapest first.
+    """
+    if face_box_size(face) < thresholds["min_face_size"]:
+        return FACE_TOO_SMALL
+
+    if float(face.det_score or 0.0) < thresholds["min_det_score"]:
+        return LOW_DET_SCORE
+
+    pose = estimate_pose(face.kps)
+    if pose is not None:
+        yaw, pitch, _ = pose
+        if abs(yaw) > thresholds["max_yaw"] or abs(pitch) > thresholds["max_pitch"]:
+            return POSE_TOO_EXTREME
+
+    if blur_score(frame, face.bbox) < thresholds["min_blur"]:
+        return FACE_BLURRY
+
+    return None
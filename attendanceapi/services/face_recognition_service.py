@@ -1,146 +1,266 @@
 # -------------------------------
-# In-memory short-term face cache
+# Recognition thresholds
 # -------------------------------
-FACE_STABILITY_CACHE = {}
+# Stability is tracked per camera (see services/devices.get_tracker): a face
+# must be seen FACE_CONFIRMATION_FRAMES times within the track TTL before it
+# is reported as recognized or turned into a visitor.
 FACE_CONFIRMATION_FRAMES = 3
-FACE_CACHE_TTL_SECONDS = 5
+TEMP_THRESHOLD = 0.5
 
+import time
 import numpy as np
-from django.utils import timezone
-from attendanceapi.models import FaceEmbedding, TempUser, TempAttendance
-from scipy.spatial.distance import cosine
-from attendanceapi.services.face_model import get_face_app
+from django.db.models import F
+from attendanceapi.models import TempUser
+from attendanceapi.services.devices import camera_scope, camera_site, get_tracker
+from attendanceapi.services.face_model import detect_faces, embed_face, embed_faces, face_model_version
+from attendanceapi.services.face_quality import (
+    assess_face,
+    recognition_quality_thresholds,
+    select_best_face,
+)
+from attendanceapi.services.gallery import (
+    VISITOR,
+    aget_registered_gallery,
+    gallery_sharding_settings,
+    get_registered_gallery,
+    get_registered_shards,
+    get_visitor_gallery,
+    normalize,
+    record_gallery_changes,
+)
+from attendanceapi.services.hot_tier import get_hot_tier, hot_tier_settings
+from attendanceapi.services.metrics import span, observe_faces, observe_gallery_size, observe_shard_match
 from django.utils.crypto import get_random_string
 
-def _embedding_key(embedding, precision=2):
+def shard_scope_label(shards):
+    return "+".join(f"department-{shard}" for shard in shards) if shards else "all"
+
+def _registered_scope(full, camera_key):
+    shards, global_fallback = camera_scope(camera_key)
+
+    if shards is None or not gallery_sharding_settings()["enabled"]:
+        scope = {"gallery": full, "fallback": None, "scope": "all"}
+    else:
+        scope = {
+            "gallery": get_registered_shards(shards),
+            "fallback": full if global_fallback else None,
+            "scope": shard_scope_label(shards),
+        }
+
+    observe_gallery_size(len(scope["gallery"][1]))
+    return scope
+
+def load_registered_scope(camera_key=None):
     """
-    Reduce embedding noise to allow stable hashing.
+    What a camera searches: {"gallery": its department shards, "fallback":
+    the full gallery when it may fall back on a miss (else None), "scope":
+    label for stats}. Cameras without departments search everything.
     """
-    return tuple(np.round(embedding, precision))
+    return _registered_scope(get_registered_gallery(), camera_key)
 
-def _cleanup_face_cache():
-    now = timezone.now()
-    expired = [
-        k for k, v in FACE_STABILITY_CACHE.items()
-        if (now - v["last_seen"]).total_seconds() > FACE_CACHE_TTL_SECONDS
-    ]
-    for k in expired:
-        del FACE_STABILITY_CACHE[k]
+async def aload_registered_scope(camera_key=None):
+    return _registered_scope(await aget_registered_gallery(), camera_key)
+
+def match_registered(embedding, gallery):
+    """
+    Best registered match for an embedding as (FaceEmbedding, cosine distance).
+    A person's distance is the minimum over their template and centroids.
+    """
+    owners, distances = match_registered_batch([embedding], gallery)
+    return owners[0], distances[0]
+
+def match_registered_batch(embeddings, gallery):
+    """
+    Matches several embeddings in one matrix product.
+    Returns (owners, distances), one entry per embedding.
+    """
+    matrix, owners = gallery
+
+    if matrix is None:
+        return [None] * len(embeddings), [float("inf")] * len(embeddings)
+
+    distances = 1.0 - matrix @ normalize(embeddings).T
+    best = np.argmin(distances, axis=0)
+
+    return (
+        [owners[int(row)] for row in best],
+        [float(distances[row, col]) for col, row in enumerate(best)],
+    )
+
+def match_registered_tiered(embeddings, gallery, threshold, site=None):
+    """
+    match_registered_batch through the site's hot tier: confident hot matches
+    skip the full gallery; the rest are matched in full and, when recognized,
+    promoted into the tier.
+    """
+    tier = get_hot_tier(site)
+    if tier is None or gallery[0] is None:
+        return match_registered_batch(embeddings, gallery)
+
+    probes = normalize(embeddings)
+
+    with span("match_hot"):
+        owners, distances = tier.match(probes, gallery, threshold - hot_tier_settings()["margin"])
+
+    misses = [i for i, owner in enumerate(owners) if owner is None]
+    if not misses:
+        return owners, distances
+
+    with span("match_full"):
+        matrix, gallery_owners = gallery
+        scores = 1.0 - matrix @ probes[misses].T
+        best = np.argmin(scores, axis=0)
+
+    for col, (i, row) in enumerate(zip(misses, best)):
+        row = int(row)
+        owners[i], distances[i] = gallery_owners[row], float(scores[row, col])
+        if distances[i] <= threshold:
+            tier.promote(gallery, row)
+
+    return owners, distances
+
+def match_registered_scoped(embeddings, scope, threshold, camera_key=None):
+    """
+    Matches embeddings in a camera's scope (load_registered_scope): its
+    shards through the hot tier first, then the fallback gallery for the
+    misses. Returns (owners, distances).
+    """
+    # Cameras sharing a shard scope share its hot tier
+    site = camera_site(camera_key) if scope["scope"] == "all" else scope["scope"]
+
+    started = time.perf_counter()
+    matches, distances = match_registered_tiered(embeddings, scope["gallery"], threshold, site)
+    observe_shard_match(scope["scope"], time.perf_counter() - started)
+
+    misses = [i for i, distance in enumerate(distances) if distance > threshold]
+
+    if misses and scope["fallback"] is not None:
+        started = time.perf_counter()
+        fallback_matches, fallback_distances = match_registered_batch(embeddings[misses], scope["fallback"])
+        observe_shard_match("global", time.perf_counter() - started)
+
+        for i, best_match, best_distance in zip(misses, fallback_matches, fallback_distances):
+            if best_distance < distances[i]:
+                matches[i], distances[i] = best_match, best_distance
+
+    return matches, distances
 
-def recognize_faces_from_frame(frame, threshold=0.5):
+def recognize_faces_from_frame(frame, threshold=0.5, gallery=None, camera_key=None, scope=None):
     """
     Attendance-grade face recognition with temporal stability.
+    Pass a preloaded scope (load_registered_scope) or a plain gallery to keep
+    this call free of DB access (the async views run it in the inference
+    executor; edge devices pass their own gallery).
     """
 
-    app = get_face_app()
-    detected_faces = app.get(frame)
+    with span("detect"):
+        detected_faces = detect_faces(frame)
+
+    observe_faces(len(detected_faces))
 
     if not detected_faces:
         return []
 
-    _cleanup_face_cache()
+    quality = recognition_quality_thresholds()
+    results = [None] * len(detected_faces)
+    accepted = []
+
+    # ------------------------------------
+    # Step 0: Quality gate (before embedding)
+    # ------------------------------------
+    for index, face in enumerate(detected_faces):
+        if quality["enabled"]:
+            with span("quality_gate"):
+                reason = assess_face(frame, face, quality)
+            if reason:
+                results[index] = {
+                    "recognized": False,
+                    "rejected": True,
+                    "reason": reason,
+                    "bbox": face.bbox.astype(int).tolist(),
+                }
+                continue
 
-    embeddings_db = FaceEmbedding.objects.select_related("user").all()
-    results = []
+        accepted.append(index)
 
-    for face in detected_faces:
-        embedding = np.array(face.embedding)
-        bbox = face.bbox.astype(int).tolist()
-        emb_key = _embedding_key(embedding) + tuple(bbox)
+    if accepted:
+        with span("embed"):
+            embeddings = np.array(embed_faces(frame, [detected_faces[i] for i in accepted]))
 
+        if gallery is not None:
+            scope = {"gallery": gallery, "fallback": None, "scope": "all"}
+        elif scope is None:
+            scope = load_registered_scope(camera_key)
 
         # ------------------------------------
-        # Step 1: DB match (registered users)
+        # Step 1: DB match (registered users), all faces at once, in the
+        # camera's shards first, then the whole gallery for the misses
         # ------------------------------------
-        best_match = None
-        best_distance = float("inf")
+        with span("match"):
+            matches, distances = match_registered_scoped(embeddings, scope, threshold, camera_key)
 
-        for record in embeddings_db:
-            dist = cosine(np.array(record.embedding), embedding)
-            if dist < best_distance:
-                best_distance = dist
-                best_match = record
+        tracker = get_tracker(camera_key)
 
-        # ------------------------------------
-        # Step 2: Update stability cache
-        # ------------------------------------
-        cache = FACE_STABILITY_CACHE.get(emb_key)
-
-        if not cache:
-            FACE_STABILITY_CACHE[emb_key] = {
-                "count": 1,
-                "last_seen": timezone.now(),
-                "best_match": best_match,
-                "best_distance": best_distance,
-            }
-
-            results.append({
-                "recognized": False,
-                "unstable": True,
-                "bbox": bbox,
-            })
-            continue
-
-        cache["count"] += 1
-        cache["last_seen"] = timezone.now()
+        for index, embedding, best_match, best_distance in zip(accepted, embeddings, matches, distances):
+            bbox = detected_faces[index].bbox.astype(int).tolist()
 
-        # ------------------------------------
-        # Step 3: Confirm recognition
-        # ------------------------------------
-        bbox = face.bbox.astype(int).tolist()
+            # ------------------------------------
+            # Step 2: Update this camera's face track
+            # ------------------------------------
+            track = tracker.observe(embedding)
 
-        if cache["count"] >= FACE_CONFIRMATION_FRAMES:
-            if best_match and best_distance <= threshold:
-                results.append({
+            if track["count"] < FACE_CONFIRMATION_FRAMES:
+                results[index] = {
+                    "recognized": False,
+                    "unstable": True,
+                    "bbox": bbox,
+                }
+
+            # ------------------------------------
+            # Step 3: Confirm recognition
+            # ------------------------------------
+            elif best_match and best_distance <= threshold:
+                results[index] = {
                     "recognized": True,
                     "user": best_match.user,
                     "distance": best_distance,
                     "bbox": bbox,
-                })
+                }
 
             else:
-                results.append({
+                results[index] = {
                     "recognized": False,
                     "embedding": embedding,
                     "bbox": bbox,
-                })
-
-        else:
-            bbox = face.bbox.astype(int).tolist()
-            results.append({
-                "recognized": False,
-                "unstable": True,
-                "bbox": bbox,
-            })
+                }
 
     return results
 
-def match_or_create_temp_user(embedding):
+def match_or_create_temp_user(embedding, camera_key=None):
     """
     Attendance-grade unknown face handling.
     """
 
-    _cleanup_face_cache()
-    emb_key = _embedding_key(embedding)
-
     # Only create temp user AFTER stability
-    cache = FACE_STABILITY_CACHE.get(emb_key)
-    if not cache or cache["count"] < FACE_CONFIRMATION_FRAMES:
+    track = get_tracker(camera_key).observe(embedding)
+    if track["count"] < FACE_CONFIRMATION_FRAMES:
         return None, False
 
-    temps = TempUser.objects.all()
-    best_match = None
-    best_distance = float("inf")
+    with span("temp_match"):
+        matrix, temp_ids = get_visitor_gallery()
+        best_match = None
+        best_distance = float("inf")
 
-    for temp in temps:
-        dist = cosine(embedding, np.array(temp.face_embedding))
-        if dist < best_distance:
-            best_distance = dist
-            best_match = temp
+        if temp_ids:
+            distances = 1.0 - matrix @ normalize(embedding)
+            best = int(np.argmin(distances))
+            best_distance = float(distances[best])
+            if best_distance < TEMP_THRESHOLD:
+                best_match = TempUser.objects.filter(id=temp_ids[best]).first()
 
-    if best_match and best_distance < TEMP_THRESHOLD:
+    if best_match:
         best_match.appearances += 1
-        best_match.save()
+        best_match.save(update_fields=["appearances"])
         return best_match, False
 
     # Create only ONCE
@@ -151,60 +271,105 @@ def match_or_create_temp_user(embedding):
         temp_username=username,
         temp_email=email,
         face_embedding=embedding.tolist(),
+        model_version=face_model_version(),
         appearances=1,
     )
 
     return temp_user, True
 
-def extract_face_embedding(frame):
+def match_or_create_temp_users(embeddings, threshold=TEMP_THRESHOLD):
     """
-    Accepts an OpenCV image (np.ndarray).
-    Returns a single face embedding or None if no face is detected.
+    Vectorised visitor lookup for several confirmed unknown faces.
+    Matches against all TempUser embeddings in one matrix product, bumps
+    appearances of matched visitors with a single UPDATE and bulk-creates
+    the rest. Returns [(temp_user, created, distance), ...] in input order.
     """
+    if not len(embeddings):
+        return []
 
-    if frame is None:
-        return None
-
-    if not isinstance(frame, np.ndarray):
-        raise TypeError(
-            f"Expected OpenCV frame (np.ndarray), got {type(frame)}"
-        )
-
-    if frame.size == 0:
-        return None
+    probes = normalize(embeddings)
+
+    with span("temp_match"):
+        matrix, ids = get_visitor_gallery()
+        matched = [(None, float("inf"))] * len(probes)
+
+        if ids:
+            distances = 1.0 - matrix @ probes.T
+            best = np.argmin(distances, axis=0)
+            matched = [(ids[int(row)], float(distances[row, col])) for col, row in enumerate(best)]
+
+    matched_ids = {temp_id for temp_id, distance in matched if distance < threshold}
+    temp_users = {}
+
+    if matched_ids:
+        TempUser.objects.filter(id__in=matched_ids).update(appearances=F("appearances") + 1)
+        temp_users = TempUser.objects.in_bulk(matched_ids)
+
+    new_users = []
+    for (temp_id, distance), embedding in zip(matched, embeddings):
+        if temp_id not in matched_ids:
+            username = f"visitor_{get_random_string(8)}"
+            new_users.append(TempUser(
+                temp_username=username,
+                temp_email=f"{username}@mispartechnologies.com",
+                face_embedding=np.asarray(embedding).tolist(),
+                model_version=face_model_version(),
+                appearances=1,
+            ))
+
+    new_users = TempUser.objects.bulk_create(new_users)
+    record_gallery_changes(VISITOR, [temp_user.id for temp_user in new_users])
+    created = iter(new_users)
+
+    return [
+        (temp_users[temp_id], False, distance) if temp_id in matched_ids
+        else (next(created), True, None)
+        for temp_id, distance in matched
+    ]
 
-    app = get_face_app()
-    detected_faces = app.get(frame)
+def extract_gated_face(frame):
+    """
+    The best face of a frame, embedded only once it passes the recognition
+    quality gate.
+    Returns (face, reason); face (with .bbox and .embedding) is None when no
+    face was found (reason None) or the face was rejected (reason set).
+    """
+    with span("detect"):
+        detected_faces = detect_faces(frame)
 
-    if not detected_faces:
-        return None
+    observe_faces(len(detected_faces))
+    face = select_best_face(detected_faces)
 
-    # Take the most confident / first detected face
-    face = detected_faces[0]
+    if face is None:
+        return None, None
 
-    if not hasattr(face, "embedding") or face.embedding is None:
-        return None
+    quality = recognition_quality_thresholds()
+    if quality["enabled"]:
+        with span("quality_gate"):
+            reason = assess_face(frame, face, quality)
+        if reason:
+            return None, reason
 
-    return np.array(face.embedding)
+    with span("embed"):
+        face.embedding = np.array(embed_face(frame, face))
+    return face, None
 
-def recognize_face(embedding):
+def recognize_face(embedding, threshold=0.5, gallery=None, camera_key=None, scope=None):
     """
-    Attempts to match embedding with registered users.
-    Returns user object or None.
+    Attempts to match embedding with registered users in the camera's scope
+    (its shards, hot tier and fallback; pass a preloaded scope to skip the
+    DB). A plain gallery is searched as is. Returns user object or None.
     """
-    # TEMP: no registered user match
-    return None
-
-    """
-    Matches embedding with temp users or creates new one.
-    """
-    from attendanceapi.models import TemporaryUser
-
-    temp_user, created = TemporaryUser.objects.get_or_create(
-        default=True  # placeholder logic
-    )
+    with span("match"):
+        if gallery is not None:
+            best_match, best_distance = match_registered(embedding, gallery)
+        else:
+            if scope is None:
+                scope = load_registered_scope(camera_key)
+            matches, distances = match_registered_scoped(np.array([embedding]), scope, threshold, camera_key)
+            best_match, best_distance = matches[0], distances[0]
 
-    temp_user.appearances += 1
-    temp_user.save()
+    if best_match and best_distance <= threshold:
+        return best_match.user
 
-    return temp_user, created
\ No newline at end of file
+    return None
@@ -0,0 +1,296 @@
+import atexit
+import hashlib
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from attendanceapi.models import Attendance, TempAttendance
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Face ROI thumbnails (background writer)
+# -------------------------------
+# Marking only copies the face crop out of the frame and queues it with the
+# id of the attendance row it belongs to. A writer thread resizes the crop to
+# a fixed square, encodes it (WebP, JPEG if the OpenCV build lacks WebP),
+# stores it under a content-addressed path (<upload_to>/<h[:2]>/<h>.<ext>,
+# h = SHA-256 of the encoded bytes; an existing file is reused, not
+# rewritten) and fills the rows' face_roi fields in batched bulk updates.
+#
+# The queue is bounded. When storage falls behind, new crops are dropped
+# (drop "newest") or the oldest queued ones make room (drop "oldest"); the
+# request never waits on storage. A dropped crop only leaves face_roi empty.
+
+FACE_ROI_STORAGE = {
+    "enabled": True,
+    "size": 112,  # Thumbnail side in pixels
+    "margin": 0.2,  # Context added around the detector box, per side
+    "format": "webp",  # "webp" or "jpeg"
+    "quality": 80,
+    "queue_size": 256,
+    "drop": "newest",  # "newest" or "oldest"
+    "batch_size": 50,  # Rows per face_roi bulk update
+    "flush_seconds": 2.0,  # Max delay before a partial batch is written
+}
+
+REGISTERED = "registered"
+VISITOR = "visitor"
+MODELS = {REGISTERED: Attendance, VISITOR: TempAttendance}
+KNOWN_DIGESTS = 4096  # Recently stored paths remembered to skip exists() calls
+
+
+def face_roi_settings():
+    return {**FACE_ROI_STORAGE, **getattr(settings, "FACE_ROI_STORAGE", {})}
+
+
+def crop_face(frame, bbox, margin):
+    """
+    Copy of the face box plus margin, clipped to the frame; None if empty.
+    """
+    x1, y1, x2, y2 = (int(v) for v in bbox[:4])
+    pad_x, pad_y = int((x2 - x1) * margin), int((y2 - y1) * margin)
+    h, w = frame.shape[:2]
+    x1, y1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+    x2, y2 = min(w, x2 + pad_x), min(h, y2 + pad_y)
+
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return frame[y1:y2, x1:x2].copy()
+
+
+def encode_thumbnail(crop, config):
+    """
+    Fixed-size thumbnail bytes and their file extension.
+    """
+    size = config["size"]
+    h, w = crop.shape[:2]
+    side = max(h, w)
+
+    # Pad to a square first so faces are not distorted
+    square = np.zeros((side, side) + crop.shape[2:], dtype=crop.dtype)
+    top, left = (side - h) // 2, (side - w) // 2
+    square[top:top + h, left:left + w] = crop
+    thumbnail = cv2.resize(square, (size, size), interpolation=cv2.INTER_AREA)
+
+    if config["format"] == "webp":
+        ok, encoded = cv2.imencode(".webp", thumbnail, [cv2.IMWRITE_WEBP_QUALITY, config["quality"]])
+        if ok:
+            return encoded.tobytes(), "webp"
+
+    ok, encoded = cv2.imencode(".jpg", thumbnail, [cv2.IMWRITE_JPEG_QUALITY, config["quality"]])
+    if not ok:
+        raise ValueError("Could not encode face thumbnail")
+    return encoded.tobytes(), "jpg"
+
+
+class FaceRoiWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._known = OrderedDict()  # path -> None, recently stored
+        self.pending_rows = 0  # Stored, face_roi not yet updated
+        self.stats_counters = {
+            "queued": 0,
+            "dropped": 0,
+            "written": 0,
+            "deduplicated": 0,
+            "failed": 0,
+            "rows_updated": 0,
+            "bytes_written": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats_counters[name] += amount
+
+    def _ensure_started(self, config):
+        with self._lock:
+            if self._thread is None:
+                self._queue = queue.Queue(maxsize=config["queue_size"])
+                self._thread = threading.Thread(target=self._run, name="face-roi-writer", daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def submit(self, kind, row_id, crop):
+        """
+        Queues a crop for the row; never blocks. Returns False if dropped.
+        """
+        config = face_roi_settings()
+        jobs = self._ensure_started(config)
+        job = (kind, row_id, crop)
+
+        try:
+            jobs.put_nowait(job)
+        except queue.Full:
+            if config["drop"] != "oldest":
+                self._count("dropped")
+                return False
+            try:
+                jobs.get_nowait()
+                jobs.task_done()
+                self._count("dropped")
+            except queue.Empty:
+                pass
+            try:
+                jobs.put_nowait(job)
+            except queue.Full:
+                self._count("dropped")
+                return False
+
+        self._count("queued")
+        return True
+
+    # -- Writer thread --
+
+    def _path(self, kind, data, extension):
+        digest = hashlib.sha256(data).hexdigest()
+        upload_to = MODELS[kind]._meta.get_field("face_roi").upload_to
+        return f"{upload_to}{digest[:2]}/{digest}.{extension}"
+
+    def _save(self, path, data):
+        if path in self._known or default_storage.exists(path):
+            self._count("deduplicated")
+        else:
+            path = default_storage.save(path, ContentFile(data))
+            self._count("written")
+            self._count("bytes_written", len(data))
+
+        self._known[path] = None
+        self._known.move_to_end(path)
+        if len(self._known) > KNOWN_DIGESTS:
+            self._known.popitem(last=False)
+        return path
+
+    def _flush(self, pending):
+        for kind, paths in pending.items():
+            if not paths:
+                continue
+            model = MODELS[kind]
+            rows = [model(id=row_id, face_roi=path) for row_id, path in paths.items()]
+            model.objects.bulk_update(rows, ["face_roi"])
+            self._count("rows_updated", len(rows))
+            paths.clear()
+        close_old_connections()
+
+    def _run(self):
+        pending = {REGISTERED: {}, VISITOR: {}}
+        last_flush = time.monotonic()
+
+        while True:
+            config = face_roi_settings()
+            try:
+                job = self._queue.get(timeout=config["flush_seconds"])
+            except queue.Empty:
+                job = None
+
+            if job is not None:
+                kind, row_id, crop = job
+                try:
+                    data, extension = encode_thumbnail(crop, config)
+                    pending[kind][row_id] = self._save(self._path(kind, data, extension), data)
+                except Exception:
+                    logger.exception("Face ROI write failed")
+                    self._count("failed")
+                self.pending_rows = sum(len(paths) for paths in pending.values())
+                self._queue.task_done()
+
+            waiting = self.pending_rows
+            if waiting and (waiting >= config["batch_size"] or time.monotonic() - last_flush >= config["flush_seconds"]):
+                try:
+                    self._flush(pending)
+                except Exception:
+                    logger.exception("Face ROI update failed")
+                    self._count("failed", waiting)
+                    for paths in pending.values():
+                        paths.clear()
+                last_flush = time.monotonic()
+                self.pending_rows = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.stats_counters,
+                "queue_depth": self._queue.qsize() if self._queue else 0,
+                "pending_rows": self.pending_rows,
+                "running": self._thread is not None,
+            }
+
+    def wait_idle(self, timeout=5.0):
+        """
+        Waits (up to timeout) until queued crops are stored and their rows
+        updated (process exit, benchmarks).
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue is not None and time.monotonic() < deadline:
+            if self._queue.unfinished_tasks == 0 and not self.pending_rows:
+                return True
+            time.sleep(0.05)
+        return self._queue is None
+
+
+face_roi_writer = FaceRoiWriter()
+
+
+def attach_face_crops(frame, results):
+    """
+    Copies the crop of every markable face (confirmed user or visitor
+    candidate) into result["face_crop"], before the frame is released.
+    """
+    config = face_roi_settings()
+    if not config["enabled"]:
+        return
+
+    for result in results:
+        if result.get("recognized") or result.get("embedding") is not None:
+            result["face_crop"] = crop_face(frame, result["bbox"], config["margin"])
+
+
+def crop_face_roi(frame, bbox):
+    """
+    Crop for submit_face_roi, or None when thumbnails are off.
+    """
+    config = face_roi_settings()
+    return crop_face(frame, bbox, config["margin"]) if config["enabled"] else None
+
+
+def _submit(kind, row_id, crop):
+    if crop is None or row_id is None or not face_roi_settings()["enabled"]:
+        return False
+    return face_roi_writer.submit(kind, row_id, crop)
+
+
+def submit_face_roi(attendance, crop):
+    """
+    Queues the crop for a saved Attendance or TempAttendance row.
+    """
+    kind = REGISTERED if isinstance(attendance, Attendance) else VISITOR
+    return _submit(kind, attendance.id, crop)
+
+
+def submit_marked_face_rois(results, outcomes):
+    """
+    Queues the crops of the faces mark_frame_attendance wrote rows for.
+    """
+    for result, outcome in zip(results, outcomes):
+        if not outcome or outcome["status"] != "marked":
+            continue
+        if outcome["user_type"] == REGISTERED:
+            _submit(REGISTERED, outcome["attendance_id"], result.get("face_crop"))
+        else:
+            _submit(VISITOR, outcome["temp_attendance_id"], result.get("face_crop"))
+
+
+def face_roi_stats():
+    return face_roi_writer.stats()
+
+
+atexit.register(face_roi_writer.wait_idle, 2.0)
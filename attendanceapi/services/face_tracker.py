@@ -0,0 +1,70 @@
+import threading
+import time
+from attendanceapi.services.gallery import normalize
+
+# -------------------------------
+# Per-camera face tracks
+# -------------------------------
+# A track follows one face across consecutive frames of the same camera so
+# recognition is only confirmed after it has been seen a few times. Faces are
+# associated with tracks by embedding similarity, which, unlike the exact
+# rounded-embedding keys used before, survives normal frame-to-frame noise.
+
+TRACK_MIN_SIMILARITY = 0.6
+TRACK_SMOOTHING = 0.3  # Weight of the newest embedding in the track template
+MAX_TRACKS_PER_CAMERA = 64
+
+
+class FaceTracker:
+    def __init__(self, ttl_seconds, min_similarity=TRACK_MIN_SIMILARITY, max_tracks=MAX_TRACKS_PER_CAMERA):
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self.max_tracks = max_tracks
+        self._lock = threading.Lock()
+        self._tracks = []
+        self._next_id = 1
+
+    def _prune(self, now):
+        self._tracks = [t for t in self._tracks if now - t["last_seen"] <= self.ttl_seconds]
+
+    def observe(self, embedding, now=None):
+        """
+        Adds one sighting of a face. Returns its track dict
+        ({"id", "count", "last_seen", ...}); count is the number of
+        sightings within the TTL, including this one.
+        """
+        now = time.monotonic() if now is None else now
+        vector = normalize(embedding)
+
+        with self._lock:
+            self._prune(now)
+
+            best, best_similarity = None, self.min_similarity
+            for track in self._tracks:
+                similarity = float(track["embedding"] @ vector)
+                if similarity >= best_similarity:
+                    best, best_similarity = track, similarity
+
+            if best is None:
+                if len(self._tracks) >= self.max_tracks:
+                    self._tracks.remove(min(self._tracks, key=lambda t: t["last_seen"]))
+                best = {"id": self._next_id, "count": 0, "embedding": vector}
+                self._next_id += 1
+                self._tracks.append(best)
+            else:
+                best["embedding"] = normalize(
+                    (1 - TRACK_SMOOTHING) * best["embedding"] + TRACK_SMOOTHING * vector
+                )
+
+            best["count"] += 1
+            best["last_seen"] = now
+            return best
+
+    def active_tracks(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._tracks)
+
+    def clear(self):
+        with self._lock:
+            self._tracks = []
@@ -0,0 +1,144 @@
+import time
+import numpy as np
+from insightface.app.common import Face
+
+# -------------------------------
+# Offline stand-in for FaceAnalysis
+# -------------------------------
+# Used by benchmarks and load tests so the pipeline runs on CPU without
+# downloading the model pack. Faces are laid out side by side, frontal and
+# large enough to pass the quality gate; embeddings are drawn from
+# `identities` (plus noise) so gallery matches actually happen.
+
+EMBEDDING_SIZE = 512
+
+
+class _FakeDetector:
+    taskname = "detection"
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def prepare(self, ctx_id, **kwargs):
+        pass
+
+    def detect(self, img, input_size=None, max_num=0, metric="default"):
+        if self.owner.det_delay:
+            time.sleep(self.owner.det_delay)
+
+        h, w = img.shape[:2]
+        count = self.owner.faces_per_frame
+        if max_num:
+            count = min(count, max_num)
+
+        bboxes = np.zeros((count, 5), dtype=np.float32)
+        kpss = np.zeros((count, 5, 2), dtype=np.float32)
+        slot = w / max(count, 1)
+        side = min(slot * 0.8, h * 0.6)
+
+        for i in range(count):
+            x1 = i * slot + (slot - side) / 2
+            y1 = (h - side) / 2
+            bboxes[i] = [x1, y1, x1 + side, y1 + side, 0.9]
+
+            cx, cy = x1 + side / 2, y1 + side / 2
+            kpss[i] = [
+                [cx - side * 0.18, cy - side * 0.12],
+                [cx + side * 0.18, cy - side * 0.12],
+                [cx, cy + side * 0.02],
+                [cx - side * 0.14, cy + side * 0.16],
+                [cx + side * 0.14, cy + side * 0.16],
+            ]
+
+        return bboxes, kpss
+
+
+class _FakeRecognizer:
+    taskname = "recognition"
+    input_size = (112, 112)
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def prepare(self, ctx_id, **kwargs):
+        pass
+
+    def get(self, img, face):
+        if self.owner.rec_delay:
+            time.sleep(self.owner.rec_delay)
+
+        face.embedding = self.owner.next_embedding()
+        return face.embedding
+
+    def get_feat(self, imgs):
+        # One delay per batch, like a single batched ONNX run
+        if self.owner.rec_delay:
+            time.sleep(self.owner.rec_delay)
+
+        imgs = imgs if isinstance(imgs, list) else [imgs]
+        return np.stack([self.owner.next_embedding() for _ in imgs])
+
+
+class FakeFaceAnalysis:
+    """
+    Same surface as insightface FaceAnalysis as far as this project uses it:
+    prepare(), get(), det_model.detect() and models["recognition"].get()/get_feat().
+    """
+
+    def __init__(self, faces_per_frame=1, identities=None, noise=0.05,
+                 det_delay_ms=0, rec_delay_ms=0, seed=0):
+        self.faces_per_frame = faces_per_frame
+        self.noise = noise
+        self.det_delay = det_delay_ms / 1000.0
+        self.rec_delay = rec_delay_ms / 1000.0
+        self._rng = np.random.default_rng(seed)
+        self._cursor = 0
+        self.set_identities(identities)
+
+        self.det_model = _FakeDetector(self)
+        self.models = {
+            "detection": self.det_model,
+            "recognition": _FakeRecognizer(self),
+        }
+
+    def set_identities(self, identities):
+        """
+        Vectors the fake "sees". None means a fresh random face every time.
+        """
+        self.identities = None if identities is None else np.asarray(identities, dtype=np.float32)
+        self._cursor = 0
+
+    def next_embedding(self):
+        if self.identities is None or not len(self.identities):
+            return self._rng.standard_normal(EMBEDDING_SIZE).astype(np.float32)
+
+        base = self.identities[self._cursor % len(self.identities)]
+        self._cursor += 1
+        noise = self._rng.standard_normal(base.shape[0]).astype(np.float32)
+        return base / np.linalg.norm(base) + self.noise * noise / np.sqrt(base.shape[0])
+
+    def prepare(self, ctx_id=0, det_thresh=0.5, det_size=(640, 640)):
+        self.det_thresh = det_thresh
+        self.det_size = det_size
+
+    def get(self, img, max_num=0):
+        bboxes, kpss = self.det_model.detect(img, max_num=max_num)
+        faces = []
+
+        for i in range(bboxes.shape[0]):
+            face = Face(bbox=bboxes[i, 0:4], kps=kpss[i], det_score=bboxes[i, 4])
+            self.models["recognition"].get(img, face)
+            faces.append(face)
+
+        return faces
+
+
+def synthetic_frame(width=1280, height=720, seed=0):
+    """
+    Textured BGR frame (noise over a gradient) that survives JPEG and the
+    blur check.
+    """
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 160, width, dtype=np.float32)[None, :, None]
+    noise = rng.integers(0, 96, size=(height, width, 3)).astype(np.float32)
+    return np.clip(gradient + noise, 0, 255).astype(np.uint8)
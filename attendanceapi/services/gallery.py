@@ -0,0 +1,368 @@
+import threading
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from attendanceapi.models import FaceEmbedding, GalleryChange, GalleryVersion, next_gallery_version
+from attendanceapi.services.face_model import face_model_version
+from attendanceapi.services.metrics import span
+from attendanceapi.services.model_versions import sync_active_model
+from userauth.models import TempUser
+
+# -------------------------------
+# In-process galleries
+# -------------------------------
+# The normalised match matrices (registered users and visitors) are built
+# once per worker and then kept current from the GalleryChange log: each
+# frame costs one read of the version counter, and a new version only
+# re-reads the rows that changed since the version the worker holds.
+#
+# Registered rows are grouped by department shard. Cameras search the shards
+# of their device (department plus search_departments) and, with
+# global_fallback, the whole gallery for faces the shards did not match.
+#
+# Only embeddings of the active model pack are loaded. When a new gallery
+# version turns out to come with a pack switch, both indexes start over.
+
+GALLERY_SHARDING = {
+    "enabled": True,
+}
+
+REGISTERED = GalleryChange.REGISTERED
+VISITOR = GalleryChange.VISITOR
+GALLERY_KINDS = (REGISTERED, VISITOR)
+
+
+def gallery_sharding_settings():
+    return {**GALLERY_SHARDING, **getattr(settings, "GALLERY_SHARDING", {})}
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def record_vectors(record):
+    """
+    Fused template plus any enrollment sub-centroids of one FaceEmbedding.
+    """
+    vectors = [record.embedding] if record.embedding else []
+    vectors.extend(record.centroids or [])
+    return vectors
+
+
+def build_registered_gallery(records):
+    """
+    Stacks every registered template and centroid into one normalised matrix.
+    Returns (matrix, owners) where owners[i] is the FaceEmbedding of row i.
+    """
+    rows = []
+    owners = []
+
+    for record in records:
+        for vector in record_vectors(record):
+            rows.append(vector)
+            owners.append(record)
+
+    if not rows:
+        return None, []
+
+    return normalize(rows), owners
+
+
+# -------------------------------
+# Versions and change collection
+# -------------------------------
+
+def gallery_version():
+    """
+    Current gallery version (0 before the first change).
+    """
+    return GalleryVersion.objects.filter(pk=1).values_list("value", flat=True).first() or 0
+
+
+async def agallery_version():
+    return await GalleryVersion.objects.filter(pk=1).values_list("value", flat=True).afirst() or 0
+
+
+def record_gallery_changes(kind, object_ids, op=GalleryChange.UPSERT):
+    """
+    Logs changes made with bulk_create/update, which send no signals. The
+    batch shares one version.
+    """
+    if not object_ids:
+        return
+
+    with transaction.atomic():
+        version = next_gallery_version()
+        GalleryChange.objects.bulk_create([
+            GalleryChange(kind=kind, object_id=object_id, op=op, version=version) for object_id in object_ids
+        ])
+
+
+def _load_registered(object_ids=None):
+    records = FaceEmbedding.objects.select_related("user").filter(model_version=face_model_version())
+    if object_ids is not None:
+        records = records.filter(user_id__in=object_ids)
+
+    return {
+        record.user_id: (record, normalize(vectors))
+        for record in records
+        if (vectors := record_vectors(record))
+    }
+
+
+def _load_visitors(object_ids=None):
+    rows = TempUser.objects.filter(model_version=face_model_version())
+    if object_ids is not None:
+        rows = rows.filter(id__in=object_ids)
+
+    return {
+        temp_id: (temp_id, normalize([vector]))
+        for temp_id, vector in rows.values_list("id", "face_embedding")
+        if vector
+    }
+
+
+_LOADERS = {REGISTERED: _load_registered, VISITOR: _load_visitors}
+
+
+def collect_gallery_changes(since, kinds=GALLERY_KINDS, version=None):
+    """
+    Gallery delta from `since` to the current version.
+    Returns {"since", "version", "reset", "upserts": [(kind, object_id, owner,
+    vectors)], "deletes": [(kind, object_id)]}. Changed rows are read in their
+    current state, so repeated or out-of-order changes collapse to one entry.
+    With since 0 (or a since the log does not know) the delta is a full
+    snapshot and reset is set: drop everything, then apply.
+    """
+    if version is None:
+        version = gallery_version()
+
+    reset = since <= 0 or since > version
+    upserts, deletes = [], []
+
+    for kind in kinds:
+        if reset:
+            changed = None
+        else:
+            changed = set(GalleryChange.objects.filter(
+                version__gt=since, version__lte=version, kind=kind,
+            ).values_list("object_id", flat=True))
+            if not changed:
+                continue
+
+        current = _LOADERS[kind](changed)
+        upserts.extend((kind, object_id, owner, vectors) for object_id, (owner, vectors) in current.items())
+        deletes.extend((kind, object_id) for object_id in (changed or ()) if object_id not in current)
+
+    return {
+        "since": 0 if reset else since,
+        "version": version,
+        "reset": reset,
+        "upserts": upserts,
+        "deletes": deletes,
+    }
+
+
+# -------------------------------
+# Gallery index (cache + delta apply)
+# -------------------------------
+
+class GalleryIndex:
+    """
+    One gallery kind as {object_id: (owner, vectors)} plus the stacked
+    (matrix, owners) that matching reads. Deltas replace or drop entries and
+    restack; nothing else is re-read. Also used on edge devices, which apply
+    deltas fetched from /api/gallery/changes/.
+
+    With shard_of (owner -> shard key) rows are stacked grouped by shard, so
+    one shard's gallery is a slice of the full matrix rather than a copy.
+    """
+
+    def __init__(self, kind, version=None, entries=None, shard_of=None):
+        self.kind = kind
+        self.version = version
+        self.entries = entries or {}
+        self.shard_of = shard_of
+        self.gallery = (None, [])
+        self.shards = {}  # shard -> (start_row, end_row)
+        self._scoped = {}
+        self._lock = threading.Lock()
+        self._restack()
+
+    def _restack(self):
+        items = list(self.entries.values())
+        if self.shard_of:
+            keyed = [(self.shard_of(owner), owner, vectors) for owner, vectors in items]
+            keyed.sort(key=lambda item: (item[0] is None, item[0] or 0))
+        else:
+            keyed = [(None, owner, vectors) for owner, vectors in items]
+
+        rows, owners, shards = [], [], {}
+        for shard, owner, vectors in keyed:
+            start, _ = shards.get(shard, (len(owners), None))
+            rows.append(vectors)
+            owners.extend([owner] * len(vectors))
+            shards[shard] = (start, len(owners))
+
+        gallery = (np.vstack(rows), owners) if rows else (None, [])
+        # Readers take (gallery, shards, scoped) together; swap them at once
+        self._layout = (gallery, shards, {})
+        self.gallery, self.shards, self._scoped = self._layout
+
+    def scoped(self, shards):
+        """
+        (matrix, owners) restricted to the given shards. Cached until the
+        next restack, so the same scope always returns the same object.
+        """
+        gallery, ranges, cache = self._layout
+        key = frozenset(shards)
+
+        scoped = cache.get(key)
+        if scoped is None:
+            matrix, owners = gallery
+            slices = sorted(ranges[shard] for shard in key if shard in ranges)
+            if not slices:
+                scoped = (None, [])
+            elif len(slices) == 1:
+                start, end = slices[0]
+                scoped = (matrix[start:end], owners[start:end])
+            else:
+                scoped = (
+                    np.vstack([matrix[start:end] for start, end in slices]),
+                    [owner for start, end in slices for owner in owners[start:end]],
+                )
+            cache[key] = scoped
+
+        return scoped
+
+    def shard_stats(self):
+        gallery, ranges, _ = self._layout
+        owners = gallery[1]
+        return {
+            shard: {"identities": len(set(map(id, owners[start:end]))), "vectors": end - start}
+            for shard, (start, end) in ranges.items()
+        }
+
+    def current(self, version):
+        return self.gallery if self.version == version else None
+
+    def apply(self, delta):
+        """
+        Applies a collect_gallery_changes() (or decoded) delta; returns the
+        number of changed entries.
+        """
+        if delta["reset"]:
+            self.entries = {}
+
+        changed = 0
+        for kind, object_id, owner, vectors in delta["upserts"]:
+            if kind == self.kind:
+                self.entries[object_id] = (owner, vectors)
+                changed += 1
+
+        for kind, object_id in delta["deletes"]:
+            if kind == self.kind and self.entries.pop(object_id, None) is not None:
+                changed += 1
+
+        if changed or delta["reset"]:
+            self._restack()
+        self.version = delta["version"]
+        return changed
+
+    def refresh(self, version):
+        """
+        Brings the index up to `version` from the change log.
+        """
+        with self._lock:
+            if self.version != version:
+                with span("gallery_load"):
+                    self.apply(collect_gallery_changes(self.version or 0, (self.kind,), version))
+            return self.gallery
+
+    def clear(self):
+        with self._lock:
+            self.version = None
+            self.entries = {}
+            self._restack()
+
+
+def registered_shard(record):
+    """
+    Shard of a registered identity: its user's department id (or None).
+    """
+    return record.user.department_id
+
+
+_registered = GalleryIndex(REGISTERED, shard_of=registered_shard)
+_visitors = GalleryIndex(VISITOR)
+
+
+def _get(index):
+    with span("gallery_check"):
+        version = gallery_version()
+    cached = index.current(version)
+    if cached is not None:
+        return cached
+    if sync_active_model():
+        invalidate_gallery()
+    return index.refresh(version)
+
+
+async def _aget(index):
+    with span("gallery_check"):
+        version = await agallery_version()
+    cached = index.current(version)
+    if cached is not None:
+        return cached
+    if await sync_to_async(sync_active_model)():
+        invalidate_gallery()
+    return await sync_to_async(index.refresh)(version)
+
+
+def get_registered_gallery():
+    """
+    Cached (matrix, owners), updated in place when the gallery version moves.
+    """
+    return _get(_registered)
+
+
+async def aget_registered_gallery():
+    """
+    Async variant of get_registered_gallery for the ASGI views; same cache.
+    """
+    return await _aget(_registered)
+
+
+def get_registered_shards(shards):
+    """
+    Registered gallery restricted to department shards, from the same cache
+    (call after get_registered_gallery so the cache is current).
+    """
+    return _registered.scoped(shards)
+
+
+def registered_shard_stats():
+    return _registered.shard_stats()
+
+
+def get_visitor_gallery():
+    """
+    Cached (matrix, temp_user_ids) of visitor embeddings.
+    """
+    return _get(_visitors)
+
+
+def is_gallery_loaded():
+    return _registered.version is not None
+
+
+def gallery_size():
+    return len(_registered.gallery[1])
+
+
+def invalidate_gallery():
+    _registered.clear()
+    _visitors.clear()
@@ -0,0 +1,193 @@
+import hashlib
+import hmac
+import io
+import json
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from attendanceapi.services.gallery import (
+    GALLERY_KINDS,
+    REGISTERED,
+    GalleryIndex,
+    collect_gallery_changes,
+)
+from attendanceapi.services.model_versions import active_model_version
+
+# -------------------------------
+# Binary gallery deltas and exportable bundles
+# -------------------------------
+# A delta (collect_gallery_changes) travels as an .npz: an int64 header
+# [since, version, reset], the kind/id/row count of every upsert, their
+# vectors as float16 (half the size; cosine distances move by well under
+# 1e-3), the deleted kind/ids and the display names of registered users.
+#
+# A bundle is a signed full snapshot of the registered gallery for edge
+# devices:   MAGIC | HMAC-SHA256(payload) | payload
+# where the payload is the snapshot delta plus a JSON manifest. The HMAC key
+# is settings.GALLERY_BUNDLE_KEY and must be shared with the edge devices.
+# There is no fallback: SECRET_KEY ships in the source, so a bundle signed
+# with it could be forged by anyone. Without the key bundles are neither
+# exported nor loaded.
+
+DELTA_MAGIC = b"ATTDELTA1\n"
+DELTA_CONTENT_TYPE = "application/x-gallery-delta"
+BUNDLE_MAGIC = b"ATTGALLERY1\n"
+BUNDLE_FORMAT = 2
+SIGNATURE_SIZE = 32
+VECTOR_DTYPE = np.float16
+
+
+def bundle_signing_key():
+    """
+    Raises ValueError when GALLERY_BUNDLE_KEY is not set.
+    """
+    key = getattr(settings, "GALLERY_BUNDLE_KEY", "")
+    if not key:
+        raise ValueError("GALLERY_BUNDLE_KEY is not set; gallery bundles cannot be signed or verified")
+    return key.encode()
+
+
+def _sign(payload):
+    return hmac.new(bundle_signing_key(), payload, hashlib.sha256).digest()
+
+
+def display_name(user):
+    return user.get_full_name() or user.username
+
+
+class EdgeUser:
+    """
+    Stand-in for CustomUser on an edge device (what the overlay needs).
+    """
+
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.username = name
+
+    def get_full_name(self):
+        return self.username
+
+
+class EdgeIdentity:
+    """
+    Stand-in for a FaceEmbedding gallery owner (exposes .user).
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+
+def _delta_arrays(delta):
+    upserts = delta["upserts"]
+    vectors = [vectors for _, _, _, vectors in upserts]
+    dim = vectors[0].shape[1] if vectors else 0
+
+    return {
+        "header": np.asarray([delta["since"], delta["version"], int(delta["reset"])], dtype=np.int64),
+        "kinds": np.asarray([GALLERY_KINDS.index(kind) for kind, _, _, _ in upserts], dtype=np.uint8),
+        "ids": np.asarray([object_id for _, object_id, _, _ in upserts], dtype=np.int64),
+        "counts": np.asarray([len(v) for v in vectors], dtype=np.uint32),
+        "vectors": np.vstack(vectors).astype(VECTOR_DTYPE) if vectors else np.zeros((0, dim), VECTOR_DTYPE),
+        "delete_kinds": np.asarray([GALLERY_KINDS.index(kind) for kind, _ in delta["deletes"]], dtype=np.uint8),
+        "delete_ids": np.asarray([object_id for _, object_id in delta["deletes"]], dtype=np.int64),
+        "names": _json_array({
+            str(object_id): display_name(owner.user)
+            for kind, object_id, owner, _ in upserts if kind == REGISTERED
+        }),
+    }
+
+
+def _json_array(value):
+    return np.frombuffer(json.dumps(value).encode(), dtype=np.uint8)
+
+
+def _delta_from_arrays(arrays):
+    since, version, reset = arrays["header"].tolist()
+    names = json.loads(arrays["names"].tobytes())
+    vectors = arrays["vectors"].astype(np.float32)
+    upserts = []
+    offset = 0
+
+    for kind_index, object_id, count in zip(arrays["kinds"].tolist(), arrays["ids"].tolist(), arrays["counts"].tolist()):
+        kind = GALLERY_KINDS[kind_index]
+        owner = EdgeIdentity(EdgeUser(object_id, names.get(str(object_id), str(object_id)))) if kind == REGISTERED else object_id
+        upserts.append((kind, object_id, owner, vectors[offset:offset + count]))
+        offset += count
+
+    return {
+        "since": since,
+        "version": version,
+        "reset": bool(reset),
+        "upserts": upserts,
+        "deletes": [
+            (GALLERY_KINDS[kind_index], object_id)
+            for kind_index, object_id in zip(arrays["delete_kinds"].tolist(), arrays["delete_ids"].tolist())
+        ],
+    }
+
+
+def encode_delta(delta):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **_delta_arrays(delta))
+    return DELTA_MAGIC + buffer.getvalue()
+
+
+def decode_delta(data):
+    """
+    Parses encode_delta() bytes. Raises ValueError on anything else.
+    """
+    if not data.startswith(DELTA_MAGIC):
+        raise ValueError("Not a gallery delta")
+    return _delta_from_arrays(np.load(io.BytesIO(data[len(DELTA_MAGIC):]), allow_pickle=False))
+
+
+def build_bundle():
+    """
+    Serialises the current registered gallery. Returns (bundle_bytes, manifest).
+    Raises ValueError when GALLERY_BUNDLE_KEY is not set.
+    """
+    bundle_signing_key()  # Fail before collecting the gallery
+    delta = collect_gallery_changes(0, (REGISTERED,))
+    arrays = _delta_arrays(delta)
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": delta["version"],
+        "model": active_model_version(),  # Pack the edge device must embed with
+        "created_at": timezone.now().isoformat(),
+        "dim": int(arrays["vectors"].shape[1]),
+        "users": len(delta["upserts"]),
+        "vectors": len(arrays["vectors"]),
+    }
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, manifest=_json_array(manifest), **arrays)
+    payload = buffer.getvalue()
+
+    return BUNDLE_MAGIC + _sign(payload) + payload, manifest
+
+
+def read_bundle(data):
+    """
+    Verifies and loads bundle bytes into a registered GalleryIndex. Raises
+    ValueError if the file is not a bundle, the signature does not match or
+    GALLERY_BUNDLE_KEY is not set.
+    """
+    if not data.startswith(BUNDLE_MAGIC):
+        raise ValueError("Not a gallery bundle")
+
+    signature = data[len(BUNDLE_MAGIC):len(BUNDLE_MAGIC) + SIGNATURE_SIZE]
+    payload = data[len(BUNDLE_MAGIC) + SIGNATURE_SIZE:]
+
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError("Gallery bundle signature mismatch")
+
+    arrays = np.load(io.BytesIO(payload), allow_pickle=False)
+    manifest = json.loads(arrays["manifest"].tobytes())
+
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format')}")
+
+    index = GalleryIndex(REGISTERED)
+    index.apply(_delta_from_arrays(arrays))
+    return index, manifest
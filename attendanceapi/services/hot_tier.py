@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+
+# -------------------------------
+# Recently-seen identity tier
+# -------------------------------
+# During a service the same few hundred people pass the cameras again and
+# again. Each site (the cameras searching the same gallery shards, else one
+# camera) keeps the vectors of identities matched in the last ttl_seconds, at most
+# max_identities with the least recently seen evicted first. Probes are
+# matched against this small matrix first; a hot match only counts when it
+# beats the recognition threshold by `margin`, otherwise the probe falls
+# through to the full gallery search and its match is promoted.
+
+HOT_TIER = {
+    "enabled": True,
+    "ttl_seconds": 600,
+    "max_identities": 500,
+    "margin": 0.1,
+}
+
+MAX_SITES = 64
+
+
+def hot_tier_settings():
+    return {**HOT_TIER, **getattr(settings, "HOT_TIER", {})}
+
+
+class HotTier:
+    def __init__(self, ttl_seconds, max_identities):
+        self.ttl_seconds = ttl_seconds
+        self.max_identities = max_identities
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # owner -> (vectors, expires_at), oldest first
+        self._source = None  # full gallery the entries were copied from
+        self._matrix = None
+        self._owners = []
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.last_used = time.monotonic()
+
+    def _sync_source(self, gallery):
+        # A restacked full gallery means enrollments changed; drop copies
+        if gallery is not self._source:
+            self._entries.clear()
+            self._source = gallery
+            self._dirty = True
+
+    def _expire(self, now):
+        while self._entries:
+            owner, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[owner]
+            self.evictions += 1
+            self._dirty = True
+
+    def _restack(self):
+        rows, owners = [], []
+        for owner, (vectors, _) in self._entries.items():
+            rows.append(vectors)
+            owners.extend([owner] * len(vectors))
+        self._matrix = np.vstack(rows) if rows else None
+        self._owners = owners
+        self._dirty = False
+
+    def match(self, probes, gallery, cutoff):
+        """
+        Best hot match per normalised probe as (owners, distances); entries
+        are None / inf where the hot tier has no match within cutoff.
+        """
+        now = time.monotonic()
+        owners = [None] * len(probes)
+        distances = [float("inf")] * len(probes)
+
+        with self._lock:
+            self.last_used = now
+            self._sync_source(gallery)
+            self._expire(now)
+            if self._dirty:
+                self._restack()
+
+            if self._matrix is not None:
+                scores = 1.0 - self._matrix @ probes.T
+                best = np.argmin(scores, axis=0)
+
+                for col, row in enumerate(best):
+                    distance = float(scores[row, col])
+                    if distance <= cutoff:
+                        owner = self._owners[int(row)]
+                        owners[col], distances[col] = owner, distance
+                        # Seen again: refresh recency and expiry
+                        self._entries[owner] = (self._entries[owner][0], now + self.ttl_seconds)
+                        self._entries.move_to_end(owner)
+
+            hits = sum(owner is not None for owner in owners)
+            self.hits += hits
+            self.misses += len(probes) - hits
+
+        return owners, distances
+
+    def promote(self, gallery, row):
+        """
+        Copies all vectors of the owner of full-gallery `row` into the tier.
+        """
+        matrix, gallery_owners = gallery
+        owner = gallery_owners[row]
+
+        # A person's template and centroids are stacked next to each other
+        start, end = row, row + 1
+        while start > 0 and gallery_owners[start - 1] is owner:
+            start -= 1
+        while end < len(gallery_owners) and gallery_owners[end] is owner:
+            end += 1
+
+        with self._lock:
+            self._sync_source(gallery)
+            self._entries[owner] = (matrix[start:end].copy(), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(owner)
+            while len(self._entries) > self.max_identities:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "identities": len(self._entries),
+                "vectors": sum(len(vectors) for vectors, _ in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+_tiers_lock = threading.Lock()
+_tiers = {}
+
+
+def get_hot_tier(site):
+    """
+    The site's hot tier, or None when the tier is disabled.
+    """
+    config = hot_tier_settings()
+    if not config["enabled"]:
+        return None
+
+    site = site or "default"
+
+    with _tiers_lock:
+        tier = _tiers.get(site)
+        if tier is None:
+            if len(_tiers) >= MAX_SITES:
+                del _tiers[min(_tiers, key=lambda k: _tiers[k].last_used)]
+            tier = _tiers[site] = HotTier(config["ttl_seconds"], config["max_identities"])
+        return tier
+
+
+def hot_tier_stats():
+    with _tiers_lock:
+        items = list(_tiers.items())
+    return {site: tier.stats() for site, tier in items}
+
+
+def reset_hot_tiers():
+    with _tiers_lock:
+        _tiers.clear()
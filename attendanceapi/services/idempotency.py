@@ -0,0 +1,132 @@
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from attendanceapi.models import IdempotencyKey
+
+# -------------------------------
+# Idempotency-Key for mark_attendance
+# -------------------------------
+# A client may send an Idempotency-Key header with a mark request. The key
+# is claimed (an IdempotencyKey row with no response) before the frame is
+# processed and completed with the response afterwards, so a retry gets the
+# stored response instead of a second Attendance row. A retry arriving while
+# the first attempt still runs is refused; a claim left behind by a crashed
+# worker is taken over after STALE_CLAIM_SECONDS. Server errors release the
+# claim so the client can try again.
+#
+# Keys are unique per owner (idempotency_owner): the device that sent them,
+# else the client, so two clients that happen to pick the same key never
+# see each other's responses.
+#
+# Processed keys are remembered for their scope's TTL. An expired key is
+# claimed afresh like a new one, and purge_idempotency_keys (the management
+# command of that name, run daily) deletes expired rows so the table stays
+# bounded. Scopes without a TTL are kept.
+
+MARK_SCOPE = "mark"
+IDEMPOTENCY_KEY_MAX_LENGTH = 128
+IDEMPOTENCY_OWNER_MAX_LENGTH = 64
+STALE_CLAIM_SECONDS = 60
+
+IDEMPOTENCY_KEY_TTL_SECONDS = {
+    MARK_SCOPE: 24 * 3600,
+    "edge_sync": 30 * 24 * 3600,  # Edge queues may hold events through long outages
+}
+
+
+def idempotency_key_ttls():
+    return {**IDEMPOTENCY_KEY_TTL_SECONDS, **getattr(settings, "IDEMPOTENCY_KEY_TTL_SECONDS", {})}
+
+
+class IdempotencyInProgress(Exception):
+    pass
+
+
+def idempotency_owner(device=None, client=None):
+    """
+    Owner of a client's keys: "device:<id>" for an authenticated device,
+    else "client:<client>" (e.g. the remote address).
+    """
+    if device is not None:
+        return f"device:{device.id}"
+    return f"client:{client or ''}"[:IDEMPOTENCY_OWNER_MAX_LENGTH]
+
+
+def claim_idempotency_key(scope, key, device=None, owner=None):
+    """
+    Returns (claim, replay): the new IdempotencyKey row to complete later,
+    or None plus the stored {"status_code", "body"} of an earlier request.
+    Raises IdempotencyInProgress while another request holds the key.
+    owner defaults to idempotency_owner(device).
+    """
+    owner = idempotency_owner(device) if owner is None else owner
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(scope=scope, owner=owner, key=key, device=device), None
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.filter(scope=scope, owner=owner, key=key).first()
+
+    if existing is None:
+        raise IdempotencyInProgress()
+
+    now = timezone.now()
+
+    if existing.response is not None:
+        ttl = idempotency_key_ttls().get(scope)
+        if ttl is None or existing.created_at >= now - timedelta(seconds=ttl):
+            return None, existing.response
+        # Expired: reuse the key as if it were new
+        taken = IdempotencyKey.objects.filter(
+            id=existing.id, created_at=existing.created_at,
+        ).update(response=None, created_at=now, device=device)
+    else:
+        stale_before = now - timedelta(seconds=STALE_CLAIM_SECONDS)
+        taken = IdempotencyKey.objects.filter(
+            id=existing.id, response__isnull=True, created_at__lt=stale_before,
+        ).update(created_at=now, device=device)
+
+    if not taken:
+        raise IdempotencyInProgress()
+    existing.response = None
+    return existing, None
+
+
+def complete_idempotency_key(claim, status_code, body):
+    """
+    Stores the response of a claimed key; server errors release it instead.
+    """
+    if status_code >= 500:
+        claim.delete()
+        return
+
+    claim.response = {"status_code": status_code, "body": body}
+    claim.save(update_fields=["response"])
+
+
+def purge_idempotency_keys(now=None):
+    """
+    Deletes keys older than their scope's TTL. Returns {scope: deleted}.
+    """
+    now = now or timezone.now()
+    deleted = {}
+    for scope, ttl in idempotency_key_ttls().items():
+        if ttl is not None:
+            deleted[scope], _ = IdempotencyKey.objects.filter(
+                scope=scope, created_at__lt=now - timedelta(seconds=ttl),
+            ).delete()
+    return deleted
+
+
+async def aclaim_idempotency_key(scope, key, device=None, owner=None):
+    """
+    Async variant of claim_idempotency_key.
+    """
+    return await sync_to_async(claim_idempotency_key)(scope, key, device, owner)
+
+
+async def acomplete_idempotency_key(claim, status_code, body):
+    await sync_to_async(complete_idempotency_key)(claim, status_code, body)
@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+# -------------------------------
+# Bounded inference executor
+# -------------------------------
+# The async views keep the event loop free by running decode + detection +
+# embedding here. max_workers caps concurrent inference per process (ONNX
+# Runtime already multi-threads each call, so keep this small); max_pending
+# caps work admitted to the pool, running or waiting. Beyond that callers get
+# InferenceBusy immediately instead of piling up behind the model.
+
+INFERENCE_EXECUTOR = {
+    "max_workers": 2,
+    "max_pending": 8,
+}
+
+
+class InferenceBusy(Exception):
+    pass
+
+
+_lock = threading.Lock()
+_executor = None
+_state = {
+    "pending": 0,
+    "submitted": 0,
+    "rejected": 0,
+}
+
+
+def executor_limits():
+    return {**INFERENCE_EXECUTOR, **getattr(settings, "INFERENCE_EXECUTOR", {})}
+
+
+def get_executor():
+    global _executor
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=executor_limits()["max_workers"],
+                thread_name_prefix="inference",
+            )
+    return _executor
+
+
+def _release(_future):
+    with _lock:
+        _state["pending"] -= 1
+
+
+async def run_inference(func, *args):
+    """
+    Runs func(*args) on the inference pool and awaits the result.
+    Raises InferenceBusy when max_pending calls are already admitted.
+    """
+    executor = get_executor()
+
+    with _lock:
+        if _state["pending"] >= executor_limits()["max_pending"]:
+            _state["rejected"] += 1
+            raise InferenceBusy()
+        _state["pending"] += 1
+        _state["submitted"] += 1
+
+    # Copy the context so pipeline spans land in the caller's request trace
+    context = contextvars.copy_context()
+    try:
+        future = executor.submit(context.run, func, *args)
+    except BaseException:
+        _release(None)
+        raise
+
+    # The slot is freed when the work finishes, even if the request is
+    # cancelled first, so abandoned frames still count against the limit
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+def inference_executor_stats():
+    limits = executor_limits()
+
+    with _lock:
+        return {
+            "max_workers": limits["max_workers"],
+            "max_pending": limits["max_pending"],
+            **_state,
+        }
@@ -0,0 +1,264 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# -------------------------------
+# In-process pipeline metrics
+# -------------------------------
+# Histograms are per worker process. Prometheus sums the per-worker series
+# when each worker is scraped (or aggregated) separately.
+
+METRIC_PREFIX = "attendance"
+QUANTILES = (0.5, 0.95, 0.99)
+RESERVOIR_SIZE = 2048
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+SIZE_BUCKETS = (0, 100, 1000, 5000, 10000, 50000, 100000, 500000)
+
+# Spans of the request currently being handled, for the Server-Timing header
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram plus a bounded reservoir of recent samples
+    for quantile estimates.
+    """
+
+    def __init__(self, name, help_text, buckets, label_name=None):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_name = label_name
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self):
+        return {
+            "counts": [0] * (len(self.buckets) + 1),
+            "sum": 0.0,
+            "count": 0,
+            "recent": deque(maxlen=RESERVOIR_SIZE),
+        }
+
+    def observe(self, value, label=None):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = self._new_series()
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+            series["recent"].append(value)
+
+    def snapshot(self):
+        """
+        {label: {"count", "sum", "buckets", "quantiles"}} for every series.
+        """
+        with self._lock:
+            series_items = [
+                (label, list(s["counts"]), s["sum"], s["count"], sorted(s["recent"]))
+                for label, s in self._series.items()
+            ]
+
+        snapshot = {}
+        for label, counts, total, count, recent in series_items:
+            quantiles = {}
+            if recent:
+                for q in QUANTILES:
+                    quantiles[q] = recent[min(len(recent) - 1, int(q * len(recent)))]
+            snapshot[label] = {
+                "count": count,
+                "sum": total,
+                "buckets": counts,
+                "quantiles": quantiles,
+            }
+
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+STAGE_SECONDS = Histogram(
+    f"{METRIC_PREFIX}_stage_duration_seconds",
+    "Time spent in each recognition pipeline stage",
+    LATENCY_BUCKETS,
+    label_name="stage",
+)
+FACES_PER_FRAME = Histogram(
+    f"{METRIC_PREFIX}_faces_per_frame",
+    "Faces detected per processed frame",
+    COUNT_BUCKETS,
+)
+GALLERY_SIZE = Histogram(
+    f"{METRIC_PREFIX}_gallery_size",
+    "Gallery vectors searched per frame",
+    SIZE_BUCKETS,
+)
+
+SHARD_MATCH_SECONDS = Histogram(
+    f"{METRIC_PREFIX}_shard_match_seconds",
+    "Registered gallery match time per shard scope",
+    LATENCY_BUCKETS,
+    label_name="scope",
+)
+
+HISTOGRAMS = [STAGE_SECONDS, FACES_PER_FRAME, GALLERY_SIZE, SHARD_MATCH_SECONDS]
+
+
+@contextmanager
+def span(stage):
+    """
+    Times a block as one pipeline stage.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage)
+
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def start_request_trace():
+    return _request_spans.set([])
+
+
+def finish_request_trace(token):
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+
+def observe_faces(count):
+    FACES_PER_FRAME.observe(count)
+
+
+def observe_gallery_size(size):
+    GALLERY_SIZE.observe(size)
+
+
+def observe_shard_match(scope, seconds):
+    SHARD_MATCH_SECONDS.observe(seconds, scope)
+
+
+def _summary_ms(histogram):
+    summary = {}
+    for label, data in histogram.snapshot().items():
+        summary[label] = {"count": data["count"]}
+        for q, value in data["quantiles"].items():
+            summary[label][f"p{int(q * 100)}"] = round(value * 1000, 3)
+
+    return summary
+
+
+def stage_summary():
+    """
+    {stage: {"count", "p50", "p95", "p99"}} in milliseconds, for JSON stats.
+    """
+    return _summary_ms(STAGE_SECONDS)
+
+
+def shard_match_summary():
+    """
+    {scope: {"count", "p50", "p95", "p99"}} in milliseconds, for JSON stats.
+    """
+    return _summary_ms(SHARD_MATCH_SECONDS)
+
+
+def server_timing_header(spans):
+    """
+    Server-Timing value: same-named spans are summed, durations in ms.
+    """
+    totals = {}
+    for stage, elapsed in spans:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+
+    return ", ".join(
+        f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in totals.items()
+    )
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def render_histogram(histogram):
+    lines = [
+        f"# HELP {histogram.name} {histogram.help_text}",
+        f"# TYPE {histogram.name} histogram",
+    ]
+    quantile_lines = []
+
+    for label, data in sorted(histogram.snapshot().items(), key=lambda i: str(i[0])):
+        labels = {histogram.label_name: label} if histogram.label_name else {}
+
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), data["buckets"]):
+            cumulative += count
+            bucket_labels = {**labels, "le": _format_bound(bound)}
+            lines.append(f"{histogram.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{histogram.name}_sum{_format_labels(labels)} {data['sum']}")
+        lines.append(f"{histogram.name}_count{_format_labels(labels)} {data['count']}")
+
+        for q, value in data["quantiles"].items():
+            quantile_labels = {**labels, "quantile": str(q)}
+            quantile_lines.append(
+                f"{histogram.name}_recent{_format_labels(quantile_labels)} {value}"
+            )
+
+    if quantile_lines:
+        lines.append(
+            f"# HELP {histogram.name}_recent Quantiles over the last {RESERVOIR_SIZE} observations"
+        )
+        lines.append(f"# TYPE {histogram.name}_recent summary")
+        lines.extend(quantile_lines)
+
+    return lines
+
+
+def render_family(name, help_text, values, label_name=None, kind="gauge"):
+    """
+    Plain gauge/counter family.
+    values: a number, or {label: number} when label_name is given.
+    """
+    full_name = f"{METRIC_PREFIX}_{name}"
+    lines = [f"# HELP {full_name} {help_text}", f"# TYPE {full_name} {kind}"]
+
+    if label_name is None:
+        lines.append(f"{full_name} {values}")
+    else:
+        for label, value in values.items():
+            lines.append(f"{full_name}{_format_labels({label_name: label})} {value}")
+
+    return lines
+
+
+def render_prometheus(extra_lines=()):
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(render_histogram(histogram))
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
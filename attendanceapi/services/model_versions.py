@@ -0,0 +1,41 @@
+import logging
+from django.db import DatabaseError
+from attendanceapi.models import FaceModelVersion
+from attendanceapi.services.face_model import FACE_MODEL_NAME, set_active_model_pack
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Active face model pack
+# -------------------------------
+# Embeddings are only comparable within one model pack, so the gallery is
+# tagged with the pack that produced it and FaceModelVersion names the one
+# in use. Workers re-read it whenever the gallery version moves (a cutover
+# always logs gallery changes) and switch packs before matching against the
+# new vectors.
+
+
+def active_model_version():
+    """
+    Name of the active model pack (FACE_MODEL_NAME until one is activated).
+    """
+    name = FaceModelVersion.objects.filter(is_active=True).values_list("name", flat=True).first()
+    return name or FACE_MODEL_NAME
+
+
+def sync_active_model():
+    """
+    Points this process at the active pack. Returns True if it changed, in
+    which case cached galleries of the old pack must be dropped.
+    """
+    try:
+        name = active_model_version()
+    except DatabaseError:
+        # Edge devices and fresh databases have no version table yet
+        logger.warning("Could not read the active face model, keeping the current one")
+        return False
+
+    changed = set_active_model_pack(name)
+    if changed:
+        logger.info("Switched to face model pack %s", name)
+    return changed
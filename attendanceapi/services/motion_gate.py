@@ -0,0 +1,139 @@
+import threading
+import time
+import cv2
+import numpy as np
+from django.conf import settings
+from attendanceapi.services.metrics import span
+
+# -------------------------------
+# Per-camera change detection
+# -------------------------------
+# Each camera keeps a tiny grayscale thumbnail of the last frame that went
+# through full inference. New frames are compared against it; if almost no
+# pixels changed, the previous result is reused instead of running detection.
+
+MOTION_GATE = {
+    "enabled": True,
+    "sample_width": 64,  # Thumbnail width used for the diff
+    "pixel_threshold": 20,  # Grey-level change for a pixel to count as moved
+    "min_changed_ratio": 0.01,  # Fraction of moved pixels that counts as motion
+    "max_skip_seconds": 10.0,  # Force a full pass at least this often
+    "gate_with_faces": False,  # Also skip when the last result had faces
+}
+
+MAX_TRACKED_CAMERAS = 256
+
+_camera_state = {}
+_stats = {"frames": 0, "skipped": 0}
+_lock = threading.Lock()
+
+
+def motion_gate_settings():
+    return {**MOTION_GATE, **getattr(settings, "MOTION_GATE", {})}
+
+
+def _thumbnail(frame, width):
+    h, w = frame.shape[:2]
+    height = max(1, int(h * width / max(w, 1)))
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (3, 3), 0)
+
+
+def check_motion(camera_key, frame):
+    """
+    Returns (skip, cached_result). When skip is True the caller should
+    return cached_result instead of running inference.
+    """
+    config = motion_gate_settings()
+
+    if not config["enabled"]:
+        return False, None
+
+    with span("motion_gate"):
+        return _check_motion(camera_key, frame, config)
+
+
+def _check_motion(camera_key, frame, config):
+    thumb = _thumbnail(frame, config["sample_width"])
+    now = time.monotonic()
+
+    with _lock:
+        _stats["frames"] += 1
+        state = _camera_state.get(camera_key)
+        if state is None:
+            state = {"frames": 0, "skipped": 0}
+            _camera_state[camera_key] = state
+        state["frames"] += 1
+
+        reference = state.get("reference")
+        result = state.get("result")
+
+        if (
+            reference is None
+            or result is None
+            or reference.shape != thumb.shape
+            or now - state["processed_at"] > config["max_skip_seconds"]
+            or (result and not config["gate_with_faces"])
+        ):
+            state["pending"] = thumb
+            return False, None
+
+        diff = cv2.absdiff(reference, thumb)
+        changed = np.count_nonzero(diff > config["pixel_threshold"]) / diff.size
+
+        if changed >= config["min_changed_ratio"]:
+            state["pending"] = thumb
+            return False, None
+
+        _stats["skipped"] += 1
+        state["skipped"] += 1
+        return True, result
+
+
+def remember_result(camera_key, result):
+    """
+    Stores the result of a full inference pass as the camera's reference.
+    """
+    with _lock:
+        state = _camera_state.get(camera_key)
+        if state is None or state.get("pending") is None:
+            return
+
+        state["reference"] = state.pop("pending")
+        state["result"] = result
+        state["processed_at"] = time.monotonic()
+
+        if len(_camera_state) > MAX_TRACKED_CAMERAS:
+            oldest = min(
+                _camera_state,
+                key=lambda k: _camera_state[k].get("processed_at", 0.0),
+            )
+            _camera_state.pop(oldest, None)
+
+
+def motion_gate_stats():
+    with _lock:
+        frames = _stats["frames"]
+        skipped = _stats["skipped"]
+        cameras = {
+            key: {
+                "frames": state["frames"],
+                "skipped": state["skipped"],
+                "skip_rate": round(state["skipped"] / state["frames"], 4) if state["frames"] else 0.0,
+            }
+            for key, state in _camera_state.items()
+        }
+
+    return {
+        "frames": frames,
+        "skipped": skipped,
+        "skip_rate": round(skipped / frames, 4) if frames else 0.0,
+        "cameras": cameras,
+    }
+
+
+def reset_motion_gate():
+    with _lock:
+        _camera_state.clear()
+        _stats.update(frames=0, skipped=0)
@@ -0,0 +1,350 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from attendanceapi.models import FaceEmbedding, FaceModelVersion, GalleryChange, VersionedEmbedding, next_gallery_version
+from attendanceapi.services.enrollment_service import build_template, collect_enrollment_embeddings
+from attendanceapi.services.face_model import load_face_model
+from attendanceapi.services.model_versions import active_model_version
+from userauth.models import CustomUser, TempUser
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Re-embedding for model pack upgrades
+# -------------------------------
+# A new model pack cannot match against vectors of the old one, so upgrading
+# means re-computing every embedding from the stored face_image /
+# captured_image of each identity. A process pool does the inference; each
+# worker loads the target pack once. Results are staged as
+# VersionedEmbedding rows (one per identity and pack) in batches, so an
+# interrupted run resumes where it stopped, while the live gallery keeps
+# serving the old pack.
+#
+# The cutover is one transaction, refused until enough registered
+# identities have a staged vector: the outgoing vectors are staged under
+# their own pack (for rollback), staged vectors replace the live ones, the
+# pack is activated and every touched identity is logged as a gallery
+# change, which makes workers switch packs on their next frame. Registered
+# users without a usable stored image keep their old-pack vector, which the
+# gallery no longer loads, until they re-enroll; visitors without one are
+# cleared and simply become new visitors on their next visit.
+
+REEMBEDDING = {
+    "workers": 2,  # Inference processes (0 or 1: in this process)
+    "batch_size": 50,  # Staged rows per insert
+    "chunksize": 4,  # Identities handed to a worker at a time
+    "progress_seconds": 5.0,
+    "min_coverage": 0.95,  # Registered identities needing a staged vector before cutover
+}
+
+REGISTERED = GalleryChange.REGISTERED
+VISITOR = GalleryChange.VISITOR
+MODELS = {REGISTERED: CustomUser, VISITOR: TempUser}
+STAGED_FIELDS = ["embedding", "centroids", "sample_count", "error", "created_at"]
+
+_worker_app = None
+
+
+class CutoverRefused(Exception):
+    pass
+
+
+def reembedding_settings():
+    return {**REEMBEDDING, **getattr(settings, "REEMBEDDING", {})}
+
+
+# -------------------------------
+# Job
+# -------------------------------
+
+def pending_reembeds(kind, version, retry_failed=False):
+    """
+    (kind, object_id, image names) of gallery identities with no staged
+    vector for `version` yet (or only a failed one, with retry_failed).
+    """
+    staged = VersionedEmbedding.objects.filter(kind=kind, model_version=version)
+    if retry_failed:
+        staged = staged.filter(embedding__isnull=False)
+    done = set(staged.values_list("object_id", flat=True))
+
+    if kind == REGISTERED:
+        rows = CustomUser.objects.filter(face_embedding__isnull=False).exclude(
+            face_embedding__model_version=version,
+        )
+    else:
+        rows = TempUser.objects.filter(face_embedding__isnull=False).exclude(model_version=version)
+
+    return [
+        (kind, object_id, [name for name in (face_image, captured_image) if name])
+        for object_id, face_image, captured_image in rows.values_list("id", "face_image", "captured_image")
+        if object_id not in done
+    ]
+
+
+def _init_worker(version):
+    global _worker_app
+    _worker_app = load_face_model(version)
+
+
+def _read_image(name):
+    try:
+        with default_storage.open(name) as fh:
+            data = fh.read()
+    except OSError:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def embed_stored_images(task):
+    """
+    Worker function: (kind, object_id, template, centroids, samples, error).
+    """
+    kind, object_id, names = task
+    if not names:
+        return kind, object_id, None, None, 0, "NO_IMAGE"
+
+    frames = [_read_image(name) for name in names]
+    embeddings, rejected = collect_enrollment_embeddings(frames, app=_worker_app)
+    if not embeddings:
+        return kind, object_id, None, None, 0, rejected[0]["reason"]
+
+    template, centroids = build_template(embeddings)
+    return kind, object_id, template.tolist(), [c.tolist() for c in centroids] or None, len(embeddings), ""
+
+
+def _stage(rows):
+    if rows:
+        VersionedEmbedding.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["kind", "object_id", "model_version"],
+            update_fields=STAGED_FIELDS,
+        )
+
+
+class ReembedProgress:
+    def __init__(self, total):
+        self.total = total
+        self.embedded = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._reported = self.started
+
+    @property
+    def done(self):
+        return self.embedded + self.failed
+
+    def add(self, error):
+        if error:
+            self.failed += 1
+        else:
+            self.embedded += 1
+
+    def due(self, interval):
+        now = time.monotonic()
+        if now - self._reported < interval:
+            return False
+        self._reported = now
+        return True
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        return {
+            "total": self.total,
+            "done": self.done,
+            "embedded": self.embedded,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 1),
+            "per_second": round(rate, 2),
+            "eta_seconds": round(remaining / rate, 1) if rate else None,
+        }
+
+
+def run_reembedding(version, kinds=(REGISTERED, VISITOR), workers=None, retry_failed=False, report=None):
+    """
+    Stages `version` embeddings for every identity that lacks one. Calls
+    report(progress) every progress_seconds and returns the final progress.
+    """
+    config = reembedding_settings()
+    workers = config["workers"] if workers is None else workers
+    tasks = [task for kind in kinds for task in pending_reembeds(kind, version, retry_failed)]
+    progress = ReembedProgress(len(tasks))
+
+    executor = None
+    if not tasks:
+        results = []
+    elif workers <= 1:
+        _init_worker(version)
+        results = map(embed_stored_images, tasks)
+    else:
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(version,),
+        )
+        results = executor.map(embed_stored_images, tasks, chunksize=config["chunksize"])
+
+    batch = []
+    try:
+        for kind, object_id, template, centroids, samples, error in results:
+            batch.append(VersionedEmbedding(
+                kind=kind, object_id=object_id, model_version=version, embedding=template,
+                centroids=centroids, sample_count=samples, error=error, created_at=timezone.now(),
+            ))
+            progress.add(error)
+
+            if len(batch) >= config["batch_size"]:
+                _stage(batch)
+                batch = []
+            if report and progress.due(config["progress_seconds"]):
+                report(progress.snapshot())
+
+        _stage(batch)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    logger.info("Re-embedding to %s: %s", version, progress.snapshot())
+    return progress.snapshot()
+
+
+# -------------------------------
+# Coverage and cutover
+# -------------------------------
+
+def embedding_coverage(version):
+    """
+    Per kind: identities in the live gallery, how many have a `version`
+    vector (staged or already live) and how many failed to re-embed.
+    """
+    registered = dict(FaceEmbedding.objects.values_list("user_id", "model_version"))
+    visitors = dict(TempUser.objects.filter(face_embedding__isnull=False).values_list("id", "model_version"))
+    live = {REGISTERED: registered, VISITOR: visitors}
+
+    coverage = {}
+    for kind, models in live.items():
+        ids = set(models)
+        staged = VersionedEmbedding.objects.filter(kind=kind, model_version=version)
+        ready = set(staged.filter(embedding__isnull=False).values_list("object_id", flat=True))
+        failed = set(staged.filter(embedding__isnull=True).values_list("object_id", flat=True))
+        ready |= {object_id for object_id, model in models.items() if model == version}
+
+        covered = len(ids & ready)
+        coverage[kind] = {
+            "total": len(ids),
+            "covered": covered,
+            "failed": len(ids & failed - ready),
+            "coverage": round(covered / len(ids), 4) if ids else 1.0,
+        }
+
+    return coverage
+
+
+def _snapshot_live(now):
+    rows = [
+        VersionedEmbedding(
+            kind=REGISTERED, object_id=record.user_id, model_version=record.model_version,
+            embedding=record.embedding, centroids=record.centroids,
+            sample_count=record.sample_count, created_at=now,
+        )
+        for record in FaceEmbedding.objects.filter(embedding__isnull=False)
+    ]
+    rows.extend(
+        VersionedEmbedding(
+            kind=VISITOR, object_id=temp_id, model_version=model_version,
+            embedding=vector, sample_count=1, created_at=now,
+        )
+        for temp_id, vector, model_version in TempUser.objects.filter(
+            face_embedding__isnull=False,
+        ).values_list("id", "face_embedding", "model_version")
+    )
+    _stage(rows)
+
+
+@transaction.atomic
+def cutover(version, min_coverage=None):
+    """
+    Makes `version` the live model pack. Raises CutoverRefused if it is
+    already active or registered coverage is below min_coverage.
+    """
+    min_coverage = reembedding_settings()["min_coverage"] if min_coverage is None else min_coverage
+    previous = active_model_version()
+    if version == previous:
+        raise CutoverRefused(f"{version} is already the active model")
+
+    coverage = embedding_coverage(version)
+    if coverage[REGISTERED]["coverage"] < min_coverage:
+        raise CutoverRefused(
+            f"Only {coverage[REGISTERED]['covered']}/{coverage[REGISTERED]['total']} registered "
+            f"identities have a {version} embedding (need {min_coverage:.0%})"
+        )
+
+    now = timezone.now()
+    _snapshot_live(now)
+
+    staged = {
+        kind: {
+            row.object_id: row
+            for row in VersionedEmbedding.objects.filter(kind=kind, model_version=version, embedding__isnull=False)
+        }
+        for kind in MODELS
+    }
+
+    records = list(FaceEmbedding.objects.exclude(model_version=version))
+    switched = []
+    for record in records:
+        row = staged[REGISTERED].get(record.user_id)
+        if row is not None:
+            record.embedding, record.centroids = row.embedding, row.centroids
+            record.sample_count, record.model_version = row.sample_count, version
+            record.updated_at = now
+            switched.append(record)
+    FaceEmbedding.objects.bulk_update(
+        switched, ["embedding", "centroids", "sample_count", "model_version", "updated_at"], batch_size=500,
+    )
+
+    # Visitors cleared by an earlier cutover come back when rolling back to
+    # it; visitors already on `version` were just staged with their own vector
+    visitors = list(TempUser.objects.filter(
+        Q(face_embedding__isnull=False) | Q(id__in=list(staged[VISITOR])),
+    ).only("id"))
+    for visitor in visitors:
+        row = staged[VISITOR].get(visitor.id)
+        visitor.face_embedding = row.embedding if row is not None else None
+        visitor.model_version = version
+    TempUser.objects.bulk_update(visitors, ["face_embedding", "model_version"], batch_size=500)
+
+    FaceModelVersion.objects.filter(is_active=True).update(is_active=False)
+    FaceModelVersion.objects.update_or_create(name=version, defaults={"is_active": True, "activated_at": now})
+
+    # Every touched identity, so workers and edge deltas drop old-pack vectors
+    gallery_version = next_gallery_version()
+    changes = [(REGISTERED, record.user_id) for record in records] + [(VISITOR, visitor.id) for visitor in visitors]
+    GalleryChange.objects.bulk_create([
+        GalleryChange(kind=kind, object_id=object_id, op=GalleryChange.UPSERT, version=gallery_version)
+        for kind, object_id in changes
+    ], batch_size=500)
+
+    summary = {
+        "previous": previous,
+        "version": version,
+        "registered_switched": len(switched),
+        "registered_stale": len(records) - len(switched),
+        "visitors_switched": sum(1 for visitor in visitors if visitor.face_embedding is not None),
+        "visitors_cleared": sum(1 for visitor in visitors if visitor.face_embedding is None),
+    }
+    logger.info("Face model cutover: %s", summary)
+    return summary
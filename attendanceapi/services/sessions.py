@@ -0,0 +1,233 @@
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from attendanceapi.models import Attendance, ServiceSession, TempAttendance
+from attendanceapi.services.metrics import span
+
+# -------------------------------
+# Service sessions
+# -------------------------------
+# Every worker keeps the present-set of each active ServiceSession in
+# memory: a bitmap over member ids plus a set of visitor ids, loaded from
+# the attendance tables when the session is first seen. Every
+# refresh_seconds the worker re-reads the active sessions and catches up on
+# rows written since (by id), so marks from other workers show up without
+# COUNT queries. "Already present" checks and the headcount are O(1).
+#
+# A row belongs to a session when the session has no departments, its
+# department is one of them, or (visitors) it has no department at all.
+
+SERVICE_SESSIONS = {
+    "refresh_seconds": 2.0,
+}
+
+
+def service_session_settings():
+    return {**SERVICE_SESSIONS, **getattr(settings, "SERVICE_SESSIONS", {})}
+
+
+class PresentSet:
+    """
+    Member ids as a bitmap (grown on demand) plus visitor ids as a set.
+    """
+
+    def __init__(self):
+        self._bits = bytearray()
+        self.members = 0
+        self.visitors = set()
+
+    def has_member(self, user_id):
+        index = user_id >> 3
+        return index < len(self._bits) and bool(self._bits[index] >> (user_id & 7) & 1)
+
+    def add_member(self, user_id):
+        if self.has_member(user_id):
+            return False
+        index = user_id >> 3
+        if index >= len(self._bits):
+            self._bits.extend(bytes(max(index + 1 - len(self._bits), len(self._bits))))
+        self._bits[index] |= 1 << (user_id & 7)
+        self.members += 1
+        return True
+
+    def has_visitor(self, temp_user_id):
+        return temp_user_id in self.visitors
+
+    def add_visitor(self, temp_user_id):
+        if temp_user_id in self.visitors:
+            return False
+        self.visitors.add(temp_user_id)
+        return True
+
+
+class SessionState:
+    def __init__(self, session):
+        self.id = session.id
+        self.name = session.name
+        self.starts_at = session.starts_at
+        self.ends_at = session.ends_at
+        self.departments = frozenset(d.id for d in session.departments.all())
+        self.present = PresentSet()
+        self.revision = 0  # Bumped on every headcount change (ETag)
+        self._watermarks = {"members": 0, "visitors": 0}
+        self._lock = threading.Lock()
+
+    def covers(self, department_id, visitor=False):
+        if not self.departments:
+            return True
+        if department_id is None:
+            return visitor
+        return department_id in self.departments
+
+    def _rows(self, model, id_field, watermark):
+        rows = model.objects.filter(id__gt=watermark, created_at__gte=self.starts_at)
+        if self.ends_at:
+            rows = rows.filter(created_at__lt=self.ends_at)
+        if self.departments:
+            condition = Q(department_id__in=self.departments)
+            if model is TempAttendance:
+                condition |= Q(department_id__isnull=True)
+            rows = rows.filter(condition)
+        return rows.values_list("id", id_field)
+
+    def catch_up(self):
+        """
+        Adds rows written since the last load (by any worker).
+        """
+        with span("session_catch_up"):
+            members = list(self._rows(Attendance, "member_id", self._watermarks["members"]))
+            visitors = list(self._rows(TempAttendance, "temp_user_id", self._watermarks["visitors"]))
+
+        with self._lock:
+            changed = False
+            for row_id, user_id in members:
+                changed |= self.present.add_member(user_id)
+                self._watermarks["members"] = max(self._watermarks["members"], row_id)
+            for row_id, temp_user_id in visitors:
+                changed |= self.present.add_visitor(temp_user_id)
+                self._watermarks["visitors"] = max(self._watermarks["visitors"], row_id)
+            if changed:
+                self.revision += 1
+
+    def note(self, user_id=None, temp_user_id=None):
+        with self._lock:
+            changed = False
+            if user_id is not None:
+                changed = self.present.add_member(user_id)
+            if temp_user_id is not None:
+                changed = self.present.add_visitor(temp_user_id) or changed
+            if changed:
+                self.revision += 1
+
+    def headcount(self):
+        members = self.present.members
+        visitors = len(self.present.visitors)
+        return {
+            "session_id": self.id,
+            "name": self.name,
+            "starts_at": self.starts_at.isoformat(),
+            "ends_at": self.ends_at.isoformat() if self.ends_at else None,
+            "departments": sorted(self.departments),
+            "members": members,
+            "visitors": visitors,
+            "total": members + visitors,
+            "revision": self.revision,
+        }
+
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_states = {}
+_refreshed_at = [0.0]
+
+
+def _refresh():
+    # One refresh at a time: two racing refreshes would each build a new
+    # SessionState, and note() calls made on the first would be dropped
+    # when the second replaced it
+    with _refresh_lock:
+        if not _stale():
+            return
+
+        now = timezone.now()
+        sessions = list(
+            ServiceSession.objects.filter(starts_at__lte=now)
+            .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+            .prefetch_related("departments")
+        )
+
+        with _lock:
+            current = {session.id: _states.get(session.id) for session in sessions}
+
+        for session in sessions:
+            state = current[session.id]
+            if state is None or state.ends_at != session.ends_at:
+                # New (or rescheduled) session: load its present-set from the DB
+                state = current[session.id] = SessionState(session)
+            state.catch_up()
+
+        with _lock:
+            _states.clear()
+            _states.update(current)
+            _refreshed_at[0] = time.monotonic()
+
+
+def _stale():
+    return time.monotonic() - _refreshed_at[0] >= service_session_settings()["refresh_seconds"]
+
+
+def active_sessions():
+    """
+    SessionStates of the sessions running now, refreshed at most every
+    refresh_seconds.
+    """
+    if _stale():
+        _refresh()
+    with _lock:
+        return list(_states.values())
+
+
+async def aactive_sessions():
+    if _stale():
+        await sync_to_async(_refresh)()
+    with _lock:
+        return list(_states.values())
+
+
+def get_session_state(session_id):
+    return next((state for state in active_sessions() if state.id == session_id), None)
+
+
+async def aget_session_state(session_id):
+    return next((state for state in await aactive_sessions() if state.id == session_id), None)
+
+
+def sessions_for(sessions, department_id, visitor=False):
+    return [state for state in sessions if state.covers(department_id, visitor)]
+
+
+def reset_sessions():
+    with _lock:
+        _states.clear()
+        _refreshed_at[0] = 0.0
+
+
+def session_headcount(session):
+    """
+    Headcount of any ServiceSession: from the present-set while it is active,
+    else loaded from the attendance tables.
+    """
+    state = get_session_state(session.id)
+    if state is None:
+        state = SessionState(session)
+        state.catch_up()
+    return state.headcount()
+
+
+def session_stats():
+    with _lock:
+        states = list(_states.values())
+    return {state.id: state.headcount() for state in states}
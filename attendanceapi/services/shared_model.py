@@ -0,0 +1,131 @@
+import atexit
+import copy
+import glob
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Model weights shared between gunicorn workers
+# -------------------------------
+# ONNX sessions do not survive fork, so every worker builds its own, and a
+# session built from the .onnx file keeps a private copy of the weights. In
+# preload mode the master instead optimises each model of the pack once, at
+# the full level (Conv+BatchNorm fusion and the CPU-specific NCHWc layout
+# rewrite both produce new weights, so they must happen before sharing; the
+# graph is built on the machine that runs it), saves the optimised graph
+# with its weights in a separate file and keeps the weights as numpy arrays.
+# Workers build their sessions from the optimised graph and register the
+# arrays with SessionOptions.add_initializer, which ONNX Runtime uses in
+# place rather than copying: the weight pages stay shared copy-on-write.
+# These sessions skip graph optimisation (already done) and weight
+# prepacking, which would put a private copy of MatMul/Gemm weights in a
+# kernel-specific layout; that costs some speed on MatMul-heavy models.
+#
+# CPU only: with CUDA the weights live on the GPU and nothing is shared.
+# FACE_MODEL_SHARE_WEIGHTS=0 turns sharing off (workers load the pack
+# themselves, as without preload).
+
+# Only these are used (detect_faces, embed_faces, FaceAnalysis.get). The
+# pack's landmark and gender/age models would cost memory and a pass per
+# face for attributes nothing reads.
+FACE_MODEL_MODULES = ["detection", "recognition"]
+
+PROVIDERS = ["CPUExecutionProvider"]
+MIN_SHARED_BYTES = 1024  # Smaller initializers stay inline in the graph
+
+# pack name -> [(model without session, optimised .onnx, {initializer: array})]
+_shared_packs = {}
+
+
+def has_shared_weights(name):
+    return name in _shared_packs
+
+
+def share_model_weights(name):
+    """
+    Master side: optimises the detection and recognition models of the pack
+    and keeps their weights for the workers forked afterwards. Returns the
+    shared bytes (0 when sharing does not apply).
+    """
+    import onnx
+    import onnxruntime
+    from insightface.model_zoo.model_zoo import ModelRouter
+    from insightface.utils import ensure_available
+    from onnx import numpy_helper
+
+    if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+        logger.info("CUDA available, face model weights are not shared")
+        return 0
+
+    model_dir = ensure_available("models", name)
+    cache_dir = tempfile.mkdtemp(prefix=f"face-model-{name}-")
+    atexit.register(shutil.rmtree, cache_dir, True)
+
+    models, tasks = [], set()
+    for onnx_file in sorted(glob.glob(os.path.join(model_dir, "*.onnx"))):
+        optimized = os.path.join(cache_dir, os.path.basename(onnx_file))
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.optimized_model_filepath = optimized
+        options.add_session_config_entry(
+            "session.optimized_model_external_initializers_file_name", os.path.basename(optimized) + ".weights",
+        )
+        options.add_session_config_entry(
+            "session.optimized_model_external_initializers_min_size_in_bytes", str(MIN_SHARED_BYTES),
+        )
+
+        # Routed like FaceAnalysis does; the session (built here only to
+        # write the optimised graph) is closed again before any fork
+        model = ModelRouter(onnx_file).get_model(sess_options=options, providers=PROVIDERS)
+        if model is None or model.taskname not in FACE_MODEL_MODULES or model.taskname in tasks:
+            continue
+        model.session = None
+        tasks.add(model.taskname)
+
+        external = {
+            tensor.name for tensor in onnx.load(optimized, load_external_data=False).graph.initializer
+            if tensor.data_location == onnx.TensorProto.EXTERNAL
+        }
+        weights = {
+            tensor.name: numpy_helper.to_array(tensor)
+            for tensor in onnx.load(optimized).graph.initializer if tensor.name in external
+        }
+        models.append((model, optimized, weights))
+
+    _shared_packs[name] = models
+    shared = sum(array.nbytes for _, _, weights in models for array in weights.values())
+    logger.info("Sharing %.1f MB of %s weights with workers", shared / 1e6, name)
+    return shared
+
+
+def build_shared_face_app(name):
+    """
+    Worker side: a FaceAnalysis for the pack whose sessions run on the
+    master's weight arrays. Call share_model_weights in the master first.
+    """
+    import onnxruntime
+    from insightface.app import FaceAnalysis
+
+    # FaceAnalysis.__init__ would load every model from disk again
+    app = FaceAnalysis.__new__(FaceAnalysis)
+    app.models = {}
+
+    for template, optimized, weights in _shared_packs[name]:
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        options.add_session_config_entry("session.disable_prepacking", "1")
+        values = {tensor: onnxruntime.OrtValue.ortvalue_from_numpy(array) for tensor, array in weights.items()}
+        for tensor, value in values.items():
+            options.add_initializer(tensor, value)
+
+        model = copy.copy(template)
+        model.session = onnxruntime.InferenceSession(optimized, options, providers=PROVIDERS)
+        model.shared_initializers = values  # Must outlive the session
+        app.models[model.taskname] = model
+
+    app.det_model = app.models["detection"]
+    return app
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+import numpy as np
+from attendanceapi.services.face_model import detect_faces, embed_face, face_model_version, get_face_app
+from attendanceapi.services.gallery import get_registered_gallery, gallery_size, is_gallery_loaded
+from attendanceapi.services.model_versions import sync_active_model
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Worker warm-up and readiness
+# -------------------------------
+# ONNX Runtime optimises its graphs on the first run, so the first real
+# frame of a fresh worker pays for session creation plus that first pass.
+# warm_up() does both ahead of time with a dummy image, then loads the
+# gallery, and only then reports the worker as ready.
+#
+# warm_up_model() runs from AppConfig.ready, where the database must not be
+# touched, so it warms the pack the process currently uses (FACE_MODEL_NAME
+# at startup). warm_up() runs in post_worker_init: it reads the active pack
+# from the database first and warms that one if it differs.
+
+WARMUP_FRAME_SIZE = 640
+
+_lock = threading.Lock()
+_state = {
+    "model_warm": False,
+    "warm_pack": None,
+    "warmup_seconds": None,
+    "error": None,
+}
+
+
+def _dummy_inference():
+    from insightface.app.common import Face
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, size=(WARMUP_FRAME_SIZE, WARMUP_FRAME_SIZE, 3), dtype=np.uint8)
+    detect_faces(frame)
+
+    # Recognition only runs on detected faces, so feed it a synthetic one
+    centre = WARMUP_FRAME_SIZE / 2
+    face = Face(
+        bbox=np.array([centre - 100, centre - 100, centre + 100, centre + 100], dtype=np.float32),
+        kps=np.array([
+            [centre - 35, centre - 25], [centre + 35, centre - 25], [centre, centre + 5],
+            [centre - 28, centre + 35], [centre + 28, centre + 35],
+        ], dtype=np.float32),
+        det_score=np.float32(1.0),
+    )
+    embed_face(frame, face)
+
+
+def warm_up_model():
+    """
+    Builds the face app of the current pack and runs one dummy detection +
+    embedding. Safe to call repeatedly; only does work for a pack that is
+    not warm yet. No database access.
+    """
+    with _lock:
+        pack = face_model_version()
+        if _state["warm_pack"] == pack:
+            return
+
+        started = time.perf_counter()
+        try:
+            get_face_app()
+            _dummy_inference()
+        except Exception as e:
+            _state["error"] = str(e)
+            raise
+
+        _state["model_warm"] = True
+        _state["warm_pack"] = pack
+        _state["error"] = None
+        _state["warmup_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info("Face model %s warm in %.2fs", pack, _state["warmup_seconds"])
+
+
+def warm_up():
+    """
+    Full worker warm-up: active pack, model, dummy inference, registered
+    gallery.
+    """
+    sync_active_model()
+    warm_up_model()
+    get_registered_gallery()
+    logger.info("Gallery loaded (%d vectors), worker ready", gallery_size())
+
+
+def readiness():
+    model_warm = _state["model_warm"]
+    gallery_loaded = is_gallery_loaded()
+
+    return {
+        "ready": model_warm and gallery_loaded,
+        "model_warm": model_warm,
+        "gallery_loaded": gallery_loaded,
+        "gallery_size": gallery_size(),
+        "warmup_seconds": _state["warmup_seconds"],
+        "error": _state["error"],
+    }
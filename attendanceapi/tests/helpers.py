@@ -0,0 +1,131 @@
+import base64
+import shutil
+import tempfile
+import cv2
+import numpy as np
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from attendanceapi.models import Attendance, Device, FaceEmbedding, TempAttendance
+from attendanceapi.services import face_model
+from attendanceapi.services.admission import reset_admission
+from attendanceapi.services.devices import forget_device_keys, issue_device_key, reset_device_state
+from attendanceapi.services.fake_face_model import FakeFaceAnalysis, synthetic_frame
+from attendanceapi.services.frame_cache import reset_frame_cache
+from attendanceapi.services.gallery import invalidate_gallery, normalize
+from attendanceapi.services.hot_tier import reset_hot_tiers
+from attendanceapi.services.metrics import reset_metrics
+from attendanceapi.services.motion_gate import reset_motion_gate
+from attendanceapi.services.sessions import reset_sessions
+from userauth.models import CustomUser
+
+# -------------------------------
+# Shared test helpers
+# -------------------------------
+# Endpoint tests run the real views on FakeFaceAnalysis (no model download).
+# Caches, trackers and tiers live in the process, and the gallery version
+# of a rolled-back test is reused by the next one, so PipelineTestCase
+# resets all of it around every test.
+
+
+def unit_vector(seed, dim=512):
+    return normalize(np.random.default_rng(seed).standard_normal(dim))
+
+
+def create_user(name, department=None):
+    return CustomUser.objects.create(username=name, email=f"{name}@example.com", department=department)
+
+
+def enroll(user, vector, centroids=None):
+    return FaceEmbedding.objects.create(
+        user=user,
+        embedding=normalize(vector).tolist(),
+        centroids=centroids,
+        model_version=face_model.face_model_version(),
+    )
+
+
+def create_device(camera_id, **fields):
+    """
+    A saved Device and its plain API key.
+    """
+    device = Device(name=camera_id, camera_id=camera_id, **fields)
+    return device, issue_device_key(device)
+
+
+def create_attendance(user):
+    now = timezone.now()
+    return Attendance.objects.create(member=user, date=now.date(), time=now.time(), created_at=now)
+
+
+def create_temp_attendance(visitor):
+    now = timezone.now()
+    return TempAttendance.objects.create(temp_user=visitor, date=now.date(), time=now.time(), created_at=now)
+
+
+def encode_frame(frame, quality=90):
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.tobytes()).decode()
+
+
+def frame_data(seed=0, width=320, height=240):
+    """
+    A textured camera frame as the clients send it (JPEG data URL). Each
+    seed gives different bytes.
+    """
+    return encode_frame(synthetic_frame(width, height, seed=seed))
+
+
+def temp_media_root(test_case):
+    """
+    Points MEDIA_ROOT (default_storage) at a directory removed after the test.
+    """
+    media_root = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    media = override_settings(MEDIA_ROOT=media_root)
+    media.enable()
+    test_case.addCleanup(media.disable)
+
+
+def reset_pipeline_state():
+    invalidate_gallery()
+    reset_admission()
+    reset_device_state()
+    forget_device_keys()
+    reset_hot_tiers()
+    reset_frame_cache()
+    reset_sessions()
+    reset_metrics()
+    reset_motion_gate()
+
+
+@override_settings(
+    MOTION_GATE={"enabled": False},
+    ADMISSION_CONTROL={"enabled": False},
+    FACE_ROI_STORAGE={"enabled": False},
+)
+class PipelineTestCase(TestCase):
+    """
+    The fake sees `identities` (None: a new face in every frame),
+    faces_per_frame at a time. Motion gate, admission control and face
+    crops are off unless a test turns them on.
+    """
+    faces_per_frame = 1
+    identities = None
+
+    def setUp(self):
+        self.face_app = FakeFaceAnalysis(faces_per_frame=self.faces_per_frame, identities=self.identities)
+        self.addCleanup(face_model.set_face_app, face_model.set_face_app(self.face_app))
+        reset_pipeline_state()
+        self.addCleanup(reset_pipeline_state)
+
+    def post_json(self, name, data, headers=None):
+        return self.client.post(reverse(name), data, content_type="application/json", headers=headers)
+
+    async def apost_json(self, view, data, headers=None):
+        """
+        Calls an async_views view directly; the URLconf only routes to them
+        under ATTENDANCE_ASYNC_VIEWS.
+        """
+        request = AsyncRequestFactory().post("/", data, content_type="application/json", headers=headers)
+        return await view(request)
@@ -0,0 +1,119 @@
+import time
+from django.test import SimpleTestCase, override_settings
+from attendanceapi.services.admission import (
+    AdmissionRejected,
+    admission_stats,
+    admit,
+    camera_share,
+    ensure_current,
+    frame_age_seconds,
+    release,
+    reset_admission,
+)
+from attendanceapi.tests.helpers import PipelineTestCase, frame_data
+
+ADMISSION = {"enabled": True, "camera_max_fps": 1, "camera_burst": 1, "max_in_flight": 4}
+
+
+@override_settings(ADMISSION_CONTROL=ADMISSION)
+class AdmitTests(SimpleTestCase):
+    def setUp(self):
+        reset_admission()
+        self.addCleanup(reset_admission)
+
+    def assertRejected(self, reason, func, *args):
+        with self.assertRaises(AdmissionRejected) as caught:
+            func(*args)
+        self.assertEqual(caught.exception.reason, reason)
+        return caught.exception
+
+    def test_camera_rate_limit(self):
+        release(admit("door"))
+
+        e = self.assertRejected("rate_limited", admit, "door")
+
+        self.assertEqual(e.http_status, 429)
+        self.assertEqual(e.retry_after, 1)
+        release(admit("lobby"))  # Other cameras have their own bucket
+
+    @override_settings(ADMISSION_CONTROL={**ADMISSION, "max_in_flight": 1})
+    def test_in_flight_limit(self):
+        ticket = admit()
+
+        e = self.assertRejected("overloaded", admit)
+
+        self.assertEqual(e.http_status, 503)
+        release(ticket)
+        release(admit())
+        self.assertEqual(admission_stats()["in_flight"], 0)
+
+    def test_stale_on_arrival(self):
+        e = self.assertRejected("stale", admit, "door", 2.0)
+
+        self.assertEqual(e.http_status, 200)
+
+    @override_settings(ADMISSION_CONTROL={**ADMISSION, "camera_burst": 2})
+    def test_newer_frame_supersedes(self):
+        older = admit("door")
+        newer = admit("door")
+
+        self.assertRejected("superseded", ensure_current, older)
+        ensure_current(newer)
+        release(older)
+        release(newer)
+
+    def test_process_share(self):
+        config = {**ADMISSION, "camera_max_fps": 10, "camera_burst": 5, "processes": 4}
+
+        self.assertEqual(camera_share(config), (2.5, 1.25))
+
+    @override_settings(ADMISSION_CONTROL={"enabled": False})
+    def test_disabled(self):
+        self.assertIsNone(admit("door", 60.0))
+
+
+class FrameAgeTests(SimpleTestCase):
+    def test_units(self):
+        now = time.time()
+
+        for captured_at in (now - 0.5, (now - 0.5) * 1e3, (now - 0.5) * 1e6):
+            with self.subTest(captured_at=captured_at):
+                self.assertAlmostEqual(frame_age_seconds(captured_at), 0.5, delta=0.1)
+
+    def test_proxy_header(self):
+        self.assertAlmostEqual(frame_age_seconds(None, f"t={int((time.time() - 0.5) * 1e6)}"), 0.5, delta=0.1)
+
+    def test_skewed_or_bad_clocks(self):
+        self.assertEqual(frame_age_seconds(time.time() - 3600), 0.0)
+        self.assertEqual(frame_age_seconds(time.time() + 60), 0.0)
+        self.assertEqual(frame_age_seconds("yesterday"), 0.0)
+
+
+@override_settings(ADMISSION_CONTROL=ADMISSION)
+class AdmissionEndpointTests(PipelineTestCase):
+    def test_rate_limited_camera(self):
+        self.post_json("recognize-frame", {"frame": frame_data(0), "camera_id": "door"})
+
+        response = self.post_json("recognize-frame", {"frame": frame_data(1), "camera_id": "door"})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(response.json()["code"], "CAMERA_RATE_LIMITED")
+        self.assertEqual(response.json()["data"]["reason"], "rate_limited")
+
+    def test_stale_frame_is_dropped(self):
+        response = self.post_json("recognize-and-mark", {"frame": frame_data(0), "captured_at": time.time() - 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "dropped")
+        self.assertEqual(response.json()["code"], "FRAME_STALE")
+        self.assertEqual(self.face_app._cursor, 0)
+
+    @override_settings(ADMISSION_CONTROL={**ADMISSION, "camera_burst": 2})
+    def test_released_after_each_frame(self):
+        self.post_json("recognize-frame", {"frame": frame_data(0)})
+        self.post_json("recognize-frame", {"frame": "data:image/jpeg;base64,AAAA"})
+
+        stats = admission_stats()
+        self.assertEqual(stats["admitted"], 2)
+        self.assertEqual(stats["in_flight"], 0)
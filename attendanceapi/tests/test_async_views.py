@@ -0,0 +1,69 @@
+import json
+import threading
+from unittest import mock
+from django.test import override_settings
+from attendanceapi import async_views
+from attendanceapi.models import Attendance
+from attendanceapi.services.face_recognition_service import FACE_CONFIRMATION_FRAMES
+from attendanceapi.tests.helpers import PipelineTestCase, create_user, enroll, frame_data, unit_vector
+
+
+def body(response):
+    return json.loads(response.content)
+
+
+class AsyncViewTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        enroll(self.user, unit_vector(1))
+
+    async def test_recognize_frame(self):
+        # Recognized once the track is confirmed
+        for seed in range(FACE_CONFIRMATION_FRAMES):
+            response = await self.apost_json(async_views.recognize_frame, {"frame": frame_data(seed)})
+
+        self.assertEqual(response.status_code, 200)
+        [face] = body(response)["data"]["faces"]
+        self.assertEqual(face["user_type"], "registered")
+
+    async def test_mark_attendance_then_duplicate(self):
+        first = await self.apost_json(async_views.mark_attendance, {"frame": frame_data(0)})
+        second = await self.apost_json(async_views.mark_attendance, {"frame": frame_data(1)})
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(body(first)["data"]["user_id"], self.user.id)
+        self.assertEqual(body(second)["code"], "ATTENDANCE_DUPLICATE")
+        self.assertEqual(await Attendance.objects.acount(), 1)
+
+    async def test_mark_matches_off_the_event_loop(self):
+        threads = []
+
+        def recognize_face(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return self.user
+
+        with mock.patch.object(async_views, "recognize_face", recognize_face):
+            response = await self.apost_json(async_views.mark_attendance, {"frame": frame_data(0)})
+
+        self.assertEqual(response.status_code, 201)
+        [thread] = threads
+        self.assertTrue(thread.startswith("inference"), thread)
+
+    @override_settings(INFERENCE_EXECUTOR={"max_pending": 0})
+    async def test_busy(self):
+        for view in (async_views.recognize_frame, async_views.mark_attendance):
+            with self.subTest(view=view.__name__):
+                response = await self.apost_json(view, {"frame": frame_data(0)})
+
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response["Retry-After"], "1")
+                self.assertEqual(body(response)["code"], "INFERENCE_BUSY")
+
+    async def test_frame_missing(self):
+        response = await self.apost_json(async_views.mark_attendance, {})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(body(response)["code"], "FRAME_MISSING")
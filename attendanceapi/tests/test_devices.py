@@ -0,0 +1,86 @@
+import numpy as np
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from attendanceapi.models import Device
+from attendanceapi.services.devices import admission_key, camera_context, device_stats
+from attendanceapi.services.face_tracker import FaceTracker
+from attendanceapi.tests.helpers import PipelineTestCase, create_device, frame_data, unit_vector
+
+
+class FaceTrackerTests(SimpleTestCase):
+    def test_noisy_sightings_share_a_track(self):
+        tracker = FaceTracker(ttl_seconds=5)
+        rng = np.random.default_rng(0)
+        face = unit_vector(1)
+
+        counts = [tracker.observe(face + 0.01 * rng.standard_normal(512), now=t)["count"] for t in range(3)]
+
+        self.assertEqual(counts, [1, 2, 3])
+        self.assertEqual(tracker.observe(unit_vector(2), now=3)["count"], 1)
+
+    def test_tracks_expire(self):
+        tracker = FaceTracker(ttl_seconds=5)
+        tracker.observe(unit_vector(1), now=0)
+
+        self.assertEqual(tracker.observe(unit_vector(1), now=10)["count"], 1)
+
+
+class CameraContextTests(SimpleTestCase):
+    def test_anonymous_camera_is_prefixed(self):
+        self.assertEqual(camera_context(None, {"camera_id": "door"})[0], "anon:door")
+        self.assertEqual(camera_context(None, {}), (None, None))
+
+    def test_anonymous_admission_is_per_client(self):
+        request = RequestFactory().post("/", REMOTE_ADDR="10.0.0.7")
+
+        self.assertEqual(admission_key(None, request), "client:10.0.0.7")
+        self.assertEqual(admission_key(Device(camera_id="door"), request), "door")
+
+
+class DeviceEndpointTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.device, self.key = create_device("door")
+
+    def test_device_key_selects_camera_state(self):
+        response = self.post_json(
+            "recognize-frame", {"frame": frame_data(0), "camera_id": "lobby"},
+            headers={"X-Device-Key": self.key},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(device_stats()["door"]["frames"], 1)
+        self.assertNotIn("anon:lobby", device_stats())
+        self.device.refresh_from_db()
+        self.assertIsNotNone(self.device.last_seen_at)
+
+    def test_anonymous_cannot_share_device_state(self):
+        self.post_json("recognize-frame", {"frame": frame_data(0), "camera_id": "door"})
+
+        self.assertEqual(set(device_stats()), {"anon:door"})
+
+    def test_rejected_keys(self):
+        Device.objects.filter(pk=self.device.pk).update(is_active=False)
+
+        for key in ("unknown", self.key):
+            with self.subTest(key=key):
+                response = self.post_json("mark-attendance", {"frame": frame_data(0)}, headers={"X-Device-Key": key})
+
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.json()["code"], "INVALID_DEVICE_KEY")
+
+    @override_settings(DEVICE_AUTH={"required": True})
+    def test_key_required(self):
+        response = self.post_json("recognize-frame", {"frame": frame_data(0), "camera_id": "door"})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "DEVICE_KEY_REQUIRED")
+
+    @override_settings(ADMISSION_CONTROL={"enabled": True, "camera_max_fps": 1, "camera_burst": 1})
+    def test_anonymous_camera_ids_share_one_budget(self):
+        first = self.post_json("recognize-frame", {"frame": frame_data(0), "camera_id": "cam-1"})
+        rotated = self.post_json("recognize-frame", {"frame": frame_data(1), "camera_id": "cam-2"})
+        device = self.post_json("recognize-frame", {"frame": frame_data(2)}, headers={"X-Device-Key": self.key})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(rotated.status_code, 429)
+        self.assertEqual(device.status_code, 200)
@@ -0,0 +1,110 @@
+from django.test import TestCase, override_settings
+from attendanceapi.models import Attendance
+from attendanceapi.services.gallery import gallery_version
+from attendanceapi.services.gallery_bundle import build_bundle, read_bundle
+from attendanceapi.services.edge_sync import EDGE_SYNC_MAX_EVENTS
+from attendanceapi.tests.helpers import PipelineTestCase, create_device, create_user, enroll, unit_vector
+
+
+class GalleryBundleTests(TestCase):
+    def setUp(self):
+        self.user = create_user("alice")
+        enroll(self.user, unit_vector(1), centroids=[unit_vector(2).tolist()])
+
+    @override_settings(GALLERY_BUNDLE_KEY="test-key")
+    def test_round_trip(self):
+        data, manifest = build_bundle()
+        index, loaded = read_bundle(data)
+
+        self.assertEqual(loaded, manifest)
+        self.assertEqual(manifest["users"], 1)
+        self.assertEqual(manifest["vectors"], 2)
+        matrix, owners = index.gallery
+        self.assertEqual(matrix.shape, (2, 512))
+        self.assertEqual({owner.user.id for owner in owners}, {self.user.id})
+
+    @override_settings(GALLERY_BUNDLE_KEY="test-key")
+    def test_tampered_payload_is_rejected(self):
+        data, _ = build_bundle()
+        tampered = data[:-1] + bytes([data[-1] ^ 1])
+
+        with self.assertRaisesMessage(ValueError, "signature mismatch"):
+            read_bundle(tampered)
+
+    def test_other_key_is_rejected(self):
+        with self.settings(GALLERY_BUNDLE_KEY="test-key"):
+            data, _ = build_bundle()
+
+        with self.settings(GALLERY_BUNDLE_KEY="other-key"):
+            with self.assertRaisesMessage(ValueError, "signature mismatch"):
+                read_bundle(data)
+
+    @override_settings(GALLERY_BUNDLE_KEY="")
+    def test_key_is_required(self):
+        with self.assertRaisesMessage(ValueError, "GALLERY_BUNDLE_KEY"):
+            build_bundle()
+
+    @override_settings(GALLERY_BUNDLE_KEY="test-key")
+    def test_not_a_bundle(self):
+        with self.assertRaisesMessage(ValueError, "Not a gallery bundle"):
+            read_bundle(b"PK\x03\x04")
+
+
+class EdgeSyncEndpointTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        self.device, self.key = create_device("gate")
+
+    def sync(self, events, key=None):
+        return self.post_json("edge-sync", {"events": events}, headers={"X-Device-Key": key or self.key})
+
+    def event(self, key, **fields):
+        return {"idempotency_key": key, "user_id": self.user.id, "captured_at": 1700000000, **fields}
+
+    def test_ingests_events_once(self):
+        events = [self.event("e1", distance=0.2), self.event("e2")]
+
+        first = self.sync(events)
+        resent = self.sync(events)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()["data"]["accepted"], ["e1", "e2"])
+        self.assertEqual(first.json()["data"]["gallery"], {"version": gallery_version()})
+        self.assertEqual(resent.json()["data"]["duplicates"], ["e1", "e2"])
+        self.assertEqual(Attendance.objects.filter(member=self.user).count(), 2)
+        self.assertEqual(Attendance.objects.get(distance=0.2).created_at.timestamp(), 1700000000)
+
+    def test_keys_are_per_device(self):
+        _, other_key = create_device("side-gate")
+
+        self.sync([self.event("e1")])
+        response = self.sync([self.event("e1")], key=other_key)
+
+        self.assertEqual(response.json()["data"]["accepted"], ["e1"])
+
+    def test_rejected_events(self):
+        response = self.sync([
+            {"user_id": self.user.id},
+            self.event("bad-distance", distance="nan"),
+            self.event("ghost", user_id=self.user.id + 100),
+        ])
+
+        self.assertEqual(response.json()["data"]["rejected"], [
+            {"key": None, "reason": "MISSING_FIELDS"},
+            {"key": "bad-distance", "reason": "INVALID_DISTANCE"},
+            {"key": "ghost", "reason": "USER_NOT_FOUND"},
+        ])
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_request_errors(self):
+        cases = [
+            (self.post_json("edge-sync", {"events": []}), 401, "DEVICE_KEY_REQUIRED"),
+            (self.sync("not-a-list"), 400, "INVALID_EVENTS"),
+            (self.sync([self.event(f"e{i}") for i in range(EDGE_SYNC_MAX_EVENTS + 1)]), 400, "TOO_MANY_EVENTS"),
+        ]
+
+        for response, status_code, code in cases:
+            with self.subTest(code=code):
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(response.json()["code"], code)
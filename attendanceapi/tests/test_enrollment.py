@@ -0,0 +1,91 @@
+import numpy as np
+from django.test import SimpleTestCase
+from attendanceapi.models import FaceEmbedding
+from attendanceapi.services.enrollment_service import ENROLLMENT_MAX_FRAMES, build_template
+from attendanceapi.services.gallery import normalize
+from attendanceapi.tests.helpers import PipelineTestCase, create_user, frame_data, unit_vector
+
+
+class BuildTemplateTests(SimpleTestCase):
+    def test_few_samples_give_template_only(self):
+        template, centroids = build_template([unit_vector(0), unit_vector(1), unit_vector(2)])
+
+        self.assertEqual(centroids, [])
+        self.assertAlmostEqual(float(np.linalg.norm(template)), 1.0, places=5)
+
+    def test_template_is_normalised_mean(self):
+        a, b = unit_vector(0), unit_vector(1)
+        template, _ = build_template([a, b])
+
+        np.testing.assert_allclose(template, normalize(a + b), atol=1e-6)
+
+    def test_sub_centroids_follow_clusters(self):
+        # Two poses of one person: two tight clusters around different centres
+        rng = np.random.default_rng(0)
+        centres = [unit_vector(10), unit_vector(11)]
+        samples = [normalize(centre + 0.005 * rng.standard_normal(512)) for centre in centres for _ in range(2)]
+
+        template, centroids = build_template(samples)
+
+        self.assertEqual(len(centroids), 2)
+        for centre in centres:
+            best = max(float(np.dot(centroid, centre)) for centroid in centroids)
+            self.assertGreater(best, 0.95)
+        for centroid in centroids:
+            self.assertAlmostEqual(float(np.linalg.norm(centroid)), 1.0, places=5)
+
+
+class EnrollFaceEndpointTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+
+    def test_enrolls_fused_template(self):
+        response = self.post_json("enroll-face", {
+            "user_id": self.user.id,
+            "frames": [frame_data(seed) for seed in range(3)],
+        })
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body["code"], "FACE_ENROLLED")
+        self.assertEqual(body["data"]["samples_used"], 3)
+        self.assertEqual(body["data"]["rejected"], [])
+
+        record = FaceEmbedding.objects.get(user=self.user)
+        self.assertEqual(record.sample_count, 3)
+        self.assertGreater(float(np.dot(record.embedding, unit_vector(1))), 0.99)
+
+    def test_reports_rejected_frames(self):
+        response = self.post_json("enroll-face", {
+            "user_id": self.user.id,
+            "frames": [frame_data(0), "not-an-image"],
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["data"]["rejected"], [{"index": 1, "reason": "INVALID_IMAGE"}])
+
+    def test_no_usable_face(self):
+        self.face_app.faces_per_frame = 0
+
+        response = self.post_json("enroll-face", {"user_id": self.user.id, "frames": [frame_data(0)]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["code"], "NO_USABLE_FACE")
+        self.assertFalse(FaceEmbedding.objects.filter(user=self.user).exists())
+
+    def test_input_errors(self):
+        cases = [
+            ({"frames": [frame_data(0)]}, 400, "ENROLLMENT_INPUT_MISSING"),
+            ({"user_id": self.user.id, "frames": ["x"] * (ENROLLMENT_MAX_FRAMES + 1)}, 400, "TOO_MANY_FRAMES"),
+            ({"user_id": self.user.id + 100, "frames": [frame_data(0)]}, 404, "USER_NOT_FOUND"),
+        ]
+
+        for data, status_code, code in cases:
+            with self.subTest(code=code):
+                response = self.post_json("enroll-face", data)
+
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(response.json()["code"], code)
@@ -0,0 +1,162 @@
+import json
+from unittest import mock
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from attendanceapi import async_views
+from attendanceapi.models import Attendance
+from attendanceapi.services import event_feed
+from attendanceapi.services.event_feed import (
+    AttendanceFeed,
+    FeedFull,
+    aiter_feed,
+    fetch_events,
+    format_cursor,
+    parse_cursor,
+)
+from attendanceapi.tests.helpers import create_attendance, create_temp_attendance, create_user
+from userauth.models import TempUser
+
+
+class EventFeedCursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        self.assertEqual(parse_cursor(format_cursor((12, 3))), (12, 3))
+
+    def test_malformed(self):
+        for value in (None, "", "12", "12-", "a-b", "1-2-3", "-1-2", "1--2"):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_cursor(value))
+
+
+class EventFeedReplayTests(TestCase):
+    def setUp(self):
+        self.user = create_user("alice")
+        self.visitor = TempUser.objects.create(temp_username="visitor_a", temp_email="a@example.com")
+
+    def test_replay_from_database(self):
+        first = create_attendance(self.user)
+        second = create_attendance(self.user)
+        visit = create_temp_attendance(self.visitor)
+
+        events, complete = AttendanceFeed().replay((first.id, 0))
+
+        self.assertTrue(complete)
+        self.assertEqual(
+            sorted((event["kind"], event["row_id"]) for event in events),
+            [("registered", second.id), ("visitor", visit.id)],
+        )
+        self.assertEqual(events[-1]["id"], format_cursor((second.id, visit.id)))
+
+    def test_replay_from_ring(self):
+        feed = AttendanceFeed()
+        feed._ring_base = (0, 0)
+        first = create_attendance(self.user)
+        second = create_attendance(self.user)
+        events, cursor, _ = fetch_events((0, 0), 10)
+        feed._publish(events, cursor, replay_size=10)
+        Attendance.objects.all().delete()  # The ring must not read the DB
+
+        replayed, complete = feed.replay((first.id, 0))
+
+        self.assertTrue(complete)
+        self.assertEqual([event["row_id"] for event in replayed], [second.id])
+        self.assertEqual(feed.db_replays, 0)
+
+    @override_settings(ATTENDANCE_FEED={"replay_limit": 1})
+    def test_truncated_replay_is_incomplete(self):
+        create_attendance(self.user)
+        create_attendance(self.user)
+
+        _, complete = AttendanceFeed().replay((0, 0))
+
+        self.assertFalse(complete)
+
+
+class FeedTestCase(TestCase):
+    """
+    Streams against a fresh feed whose poller thread exits at once (the
+    test database is not shared with other threads).
+    """
+
+    def setUp(self):
+        self.feed = AttendanceFeed()
+        for patcher in (
+            mock.patch.object(event_feed, "attendance_feed", self.feed),
+            mock.patch.object(AttendanceFeed, "_run", lambda feed: None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = create_user("alice")
+
+
+class SubscriptionTests(FeedTestCase):
+    def test_cursor_ahead_of_the_head_is_clamped(self):
+        mark = create_attendance(self.user)
+
+        subscriber = self.feed.subscribe((mark.id + 50, 7), lambda: None)
+
+        self.assertEqual(subscriber.cursor, (mark.id, 0))
+
+    def test_cursor_behind_the_head_is_kept(self):
+        create_attendance(self.user)
+
+        self.assertEqual(self.feed.subscribe((0, 0), lambda: None).cursor, (0, 0))
+
+    async def test_stream_subscribes_when_iterated(self):
+        stream = await aiter_feed()
+        self.assertEqual(self.feed.stats()["subscribers"], 0)
+
+        self.assertTrue((await anext(stream)).startswith("retry:"))
+        self.assertEqual(self.feed.stats()["subscribers"], 1)
+
+        await stream.aclose()
+        self.assertEqual(self.feed.stats()["subscribers"], 0)
+
+    async def test_replays_past_the_cursor(self):
+        first = await Attendance.objects.acreate(member=self.user, date="2026-01-01", time="09:00")
+        second = await Attendance.objects.acreate(member=self.user, date="2026-01-01", time="09:01")
+
+        stream = await aiter_feed((first.id, 0))
+        await anext(stream)
+        chunk = await anext(stream)
+        await stream.aclose()
+
+        self.assertTrue(chunk.startswith(f"id: {format_cursor((second.id, 0))}\n"))
+        self.assertEqual(json.loads(chunk.split("data: ", 1)[1])["attendance_id"], second.id)
+
+    @override_settings(ATTENDANCE_FEED={"max_subscribers": 0})
+    async def test_full_feed(self):
+        with self.assertRaises(FeedFull):
+            await aiter_feed()
+
+
+class AttendanceStreamEndpointTests(FeedTestCase):
+    async def get(self, **params):
+        return await async_views.attendance_stream(AsyncRequestFactory().get("/", params))
+
+    def test_wsgi_answers_501(self):
+        response = self.client.get(reverse("attendance-stream"))
+
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response.json()["code"], "STREAM_REQUIRES_ASGI")
+
+    async def test_stream_headers(self):
+        response = await self.get()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertEqual(self.feed.stats()["subscribers"], 0)  # Nothing until the body is read
+
+    async def test_bad_params(self):
+        for params in ({"last_event_id": "nope"}, {"kind": "robots"}, {"department": "x"}):
+            with self.subTest(params=params):
+                response = await self.get(**params)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(json.loads(response.content)["code"], "INVALID_PARAMS")
+
+    @override_settings(ATTENDANCE_FEED={"max_subscribers": 0})
+    async def test_full(self):
+        response = await self.get()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
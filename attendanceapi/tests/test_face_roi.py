@@ -0,0 +1,154 @@
+import queue
+from unittest import mock
+import cv2
+import numpy as np
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from attendanceapi.models import Attendance, TempAttendance
+from attendanceapi.services import face_roi
+from attendanceapi.services.face_recognition_service import FACE_CONFIRMATION_FRAMES
+from attendanceapi.services.face_roi import (
+    REGISTERED,
+    VISITOR,
+    FaceRoiWriter,
+    crop_face,
+    encode_thumbnail,
+    face_roi_settings,
+)
+from attendanceapi.tests.helpers import (
+    PipelineTestCase,
+    create_attendance,
+    create_device,
+    create_user,
+    enroll,
+    frame_data,
+    temp_media_root,
+    unit_vector,
+)
+
+FACE_ROI = {"enabled": True, "size": 32, "queue_size": 1}
+
+
+def crop(seed=0, shape=(40, 30, 3)):
+    return np.random.default_rng(seed).integers(0, 255, size=shape, dtype=np.uint8)
+
+
+class ThumbnailTests(SimpleTestCase):
+    def test_crop_adds_margin_and_clips(self):
+        frame = np.zeros((100, 100, 3), dtype=np.uint8)
+
+        self.assertEqual(crop_face(frame, [10, 10, 30, 50], 0.5).shape, (70, 40, 3))
+        self.assertEqual(crop_face(frame, [80, 80, 120, 120], 0.0).shape, (20, 20, 3))
+        self.assertIsNone(crop_face(frame, [50, 50, 50, 60], 0.2))
+
+    def test_fixed_size_thumbnail(self):
+        for image_format in ("webp", "jpeg"):
+            with self.subTest(format=image_format):
+                config = {**face_roi_settings(), "size": 32, "format": image_format}
+
+                data, extension = encode_thumbnail(crop(), config)
+
+                decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                self.assertEqual(decoded.shape, (32, 32, 3))
+                self.assertIn(extension, ("webp", "jpg") if image_format == "webp" else ("jpg",))
+
+
+@override_settings(FACE_ROI_STORAGE=FACE_ROI)
+class FaceRoiWriterTests(SimpleTestCase):
+    def setUp(self):
+        temp_media_root(self)
+        self.writer = FaceRoiWriter()
+        self.jobs = queue.Queue(maxsize=1)
+        # No writer thread: the tests drain the queue themselves
+        patcher = mock.patch.object(self.writer, "_ensure_started", return_value=self.jobs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_full_queue_drops_newest(self):
+        self.assertTrue(self.writer.submit(REGISTERED, 1, crop(1)))
+        self.assertFalse(self.writer.submit(REGISTERED, 2, crop(2)))
+
+        self.assertEqual(self.jobs.get_nowait()[1], 1)
+        self.assertEqual(self.writer.stats()["dropped"], 1)
+
+    @override_settings(FACE_ROI_STORAGE={**FACE_ROI, "drop": "oldest"})
+    def test_full_queue_drops_oldest(self):
+        self.writer.submit(REGISTERED, 1, crop(1))
+        self.assertTrue(self.writer.submit(REGISTERED, 2, crop(2)))
+
+        self.assertEqual(self.jobs.get_nowait()[1], 2)
+        self.assertEqual(self.writer.stats()["dropped"], 1)
+
+    def test_content_addressed_and_deduplicated(self):
+        data, extension = encode_thumbnail(crop(), {**face_roi_settings(), "format": "jpeg"})
+        path = self.writer._path(VISITOR, data, extension)
+
+        first = self.writer._save(path, data)
+        FaceRoiWriter()._save(path, data)  # Another worker: found in storage
+        self.writer._save(path, data)  # Same worker: known without a lookup
+
+        self.assertTrue(first.startswith("temp_attendance_faces/"))
+        self.assertEqual(first.rsplit("/", 1)[1].split(".")[0][:2], first.split("/")[1])
+        self.assertTrue(default_storage.exists(first))
+        self.assertEqual(self.writer.stats()["written"], 1)
+        self.assertEqual(self.writer.stats()["deduplicated"], 1)
+
+
+class FaceRoiFlushTests(TestCase):
+    def test_rows_are_updated_in_one_batch(self):
+        user = create_user("alice")
+        first, second = create_attendance(user), create_attendance(user)
+        writer = FaceRoiWriter()
+
+        with self.assertNumQueries(1):
+            writer._flush({REGISTERED: {first.id: "attendance_faces/ab/a.jpg", second.id: "attendance_faces/cd/c.jpg"}, VISITOR: {}})
+
+        self.assertEqual(Attendance.objects.get(id=first.id).face_roi.name, "attendance_faces/ab/a.jpg")
+        self.assertEqual(writer.stats()["rows_updated"], 2)
+
+
+@override_settings(FACE_ROI_STORAGE={"enabled": True})
+class FaceRoiEndpointTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        self.submitted = []
+        patcher = mock.patch.object(
+            face_roi.face_roi_writer, "submit", side_effect=lambda *job: self.submitted.append(job) or True,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_marked_face_is_queued(self):
+        enroll(create_user("alice"), unit_vector(1))
+
+        response = self.post_json("mark-attendance", {"frame": frame_data(0)})
+
+        [(kind, row_id, face_crop)] = self.submitted
+        self.assertEqual((kind, row_id), (REGISTERED, response.json()["data"]["attendance_id"]))
+        self.assertEqual(face_crop.ndim, 3)
+
+    def test_recognize_and_mark_queues_visitors(self):
+        for seed in range(FACE_CONFIRMATION_FRAMES):
+            self.post_json("recognize-and-mark", {"frame": frame_data(seed)})
+
+        [(kind, row_id, _)] = self.submitted
+        self.assertEqual((kind, row_id), (VISITOR, TempAttendance.objects.get().id))
+
+    @override_settings(FACE_ROI_STORAGE={"enabled": False})
+    def test_disabled(self):
+        enroll(create_user("alice"), unit_vector(1))
+
+        self.post_json("mark-attendance", {"frame": frame_data(0)})
+
+        self.assertEqual(self.submitted, [])
+
+    def test_stats(self):
+        _, key = create_device("door")
+
+        stats = self.client.get(reverse("pipeline-stats"), headers={"X-Device-Key": key}).json()["data"]["face_roi"]
+
+        self.assertEqual(stats["dropped"], 0)
+        self.assertIn("queue_depth", stats)
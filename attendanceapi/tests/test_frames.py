@@ -0,0 +1,75 @@
+from django.test import SimpleTestCase, override_settings
+from attendanceapi.services.fake_face_model import synthetic_frame
+from attendanceapi.services.image_utils import FrameTransform, apply_camera_profile, decode_camera_frame
+from attendanceapi.tests.helpers import PipelineTestCase, encode_frame, frame_data
+
+
+class FrameTransformTests(SimpleTestCase):
+    def test_identity(self):
+        self.assertEqual(FrameTransform().to_original([10, 20, 30, 40]), [10, 20, 30, 40])
+
+    def test_maps_crop_and_scale_back(self):
+        # ROI cropped at (100, 50), then downscaled by half
+        transform = FrameTransform(scale=0.5, offset_x=100, offset_y=50)
+
+        self.assertEqual(transform.to_original([10, 20, 30, 40]), [120, 90, 160, 130])
+
+    def test_ignores_extra_fields_and_rounds(self):
+        transform = FrameTransform(scale=3.0)
+
+        self.assertEqual(transform.to_original([10, 10, 20, 20, 0.99]), [3, 3, 7, 7])
+
+
+class CameraProfileTests(SimpleTestCase):
+    frame = synthetic_frame(640, 480)
+
+    def test_roi_then_max_side(self):
+        frame, transform = apply_camera_profile(self.frame, {"roi": [0.5, 0.25, 0.5, 0.5], "max_side": 160})
+
+        self.assertEqual(frame.shape[:2], (120, 160))
+        self.assertEqual(transform.to_original([0, 0, 160, 120]), [320, 120, 640, 360])
+
+    def test_degenerate_roi_is_ignored(self):
+        frame, transform = apply_camera_profile(self.frame, {"roi": [0.9, 0.9, 0.0, 0.5]})
+
+        self.assertEqual(frame.shape[:2], (480, 640))
+        self.assertEqual(transform.to_original([1, 2, 3, 4]), [1, 2, 3, 4])
+
+    def test_reduced_decode(self):
+        frame, transform = decode_camera_frame(encode_frame(self.frame), overrides={"decode_reduction": 2})
+
+        self.assertEqual(frame.shape[:2], (240, 320))
+        self.assertEqual(transform.to_original([10, 10, 20, 20]), [20, 20, 40, 40])
+
+    def test_undecodable(self):
+        self.assertEqual(decode_camera_frame("data:image/jpeg;base64,AAAA"), (None, None))
+        with self.assertRaises(ValueError):
+            decode_camera_frame("data:image/jpeg;base64,not base64")
+
+
+class CameraProfileEndpointTests(PipelineTestCase):
+    @override_settings(CAMERA_PROFILES={"door": {"roi": [0.5, 0.0, 0.5, 1.0]}})
+    def test_boxes_are_in_original_coordinates(self):
+        response = self.post_json("recognize-frame", {"frame": frame_data(0, 320, 240), "camera_id": "door"})
+
+        [face] = response.json()["data"]["faces"]
+        x1, _, x2, _ = face["bbox"]
+        # Detected in the right half only, reported in full-frame pixels
+        self.assertGreaterEqual(x1, 160)
+        self.assertLessEqual(x2, 320)
+
+    @override_settings(CAMERA_PROFILES={"default": {"max_side": 320}})
+    def test_downscaled_frame_maps_back(self):
+        response = self.post_json("recognize-frame", {"frame": frame_data(0, 640, 480)})
+
+        [face] = response.json()["data"]["faces"]
+        x1, y1, x2, y2 = face["bbox"]
+        # The fake's face is 60% of the (downscaled) frame height
+        self.assertAlmostEqual(y2 - y1, 288, delta=2)
+        self.assertAlmostEqual((x1 + x2) / 2, 320, delta=2)
+
+    def test_invalid_image(self):
+        response = self.post_json("recognize-frame", {"frame": "data:image/jpeg;base64,AAAA"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["code"], "INVALID_IMAGE")
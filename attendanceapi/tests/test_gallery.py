@@ -0,0 +1,181 @@
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from attendanceapi.models import FaceEmbedding, GalleryChange
+from attendanceapi.services.gallery import (
+    REGISTERED,
+    VISITOR,
+    GalleryIndex,
+    collect_gallery_changes,
+    gallery_version,
+    get_registered_gallery,
+    normalize,
+    record_gallery_changes,
+)
+from attendanceapi.services.gallery_bundle import decode_delta
+from attendanceapi.tests.helpers import PipelineTestCase, create_device, create_user, enroll, unit_vector
+from userauth.models import TempUser
+
+
+class GalleryIndexTests(SimpleTestCase):
+    def delta(self, upserts=(), deletes=(), reset=False, version=1):
+        return {"since": 0, "version": version, "reset": reset, "upserts": list(upserts), "deletes": list(deletes)}
+
+    def test_upserts_stack_every_vector(self):
+        index = GalleryIndex(REGISTERED)
+        changed = index.apply(self.delta(upserts=[
+            (REGISTERED, 1, "alice", normalize([unit_vector(1), unit_vector(2)])),
+            (REGISTERED, 2, "bob", normalize([unit_vector(3)])),
+            (VISITOR, 7, 7, normalize([unit_vector(4)])),  # Other kind, ignored
+        ]))
+
+        matrix, owners = index.gallery
+        self.assertEqual(changed, 2)
+        self.assertEqual(matrix.shape, (3, 512))
+        self.assertEqual(sorted(owners), ["alice", "alice", "bob"])
+        self.assertEqual(index.version, 1)
+
+    def test_tombstone_drops_entry(self):
+        index = GalleryIndex(REGISTERED)
+        index.apply(self.delta(upserts=[
+            (REGISTERED, 1, "alice", normalize([unit_vector(1)])),
+            (REGISTERED, 2, "bob", normalize([unit_vector(2)])),
+        ]))
+
+        changed = index.apply(self.delta(deletes=[(REGISTERED, 1), (REGISTERED, 99)], version=2))
+
+        self.assertEqual(changed, 1)
+        self.assertEqual(index.gallery[1], ["bob"])
+        self.assertEqual(index.version, 2)
+
+    def test_reset_replaces_everything(self):
+        index = GalleryIndex(REGISTERED)
+        index.apply(self.delta(upserts=[(REGISTERED, 1, "alice", normalize([unit_vector(1)]))]))
+
+        index.apply(self.delta(upserts=[(REGISTERED, 2, "bob", normalize([unit_vector(2)]))], reset=True, version=5))
+
+        self.assertEqual(index.gallery[1], ["bob"])
+
+    def test_empty_reset_clears_gallery(self):
+        index = GalleryIndex(REGISTERED)
+        index.apply(self.delta(upserts=[(REGISTERED, 1, "alice", normalize([unit_vector(1)]))]))
+
+        index.apply(self.delta(reset=True, version=2))
+
+        self.assertEqual(index.gallery, (None, []))
+
+
+class CollectGalleryChangesTests(TestCase):
+    def enroll(self, name, seed):
+        user = create_user(name)
+        enroll(user, unit_vector(seed))
+        return user
+
+    def test_since_zero_is_full_snapshot(self):
+        alice = self.enroll("alice", 1)
+        bob = self.enroll("bob", 2)
+
+        delta = collect_gallery_changes(0, (REGISTERED,))
+
+        self.assertTrue(delta["reset"])
+        self.assertEqual(delta["version"], gallery_version())
+        self.assertEqual(sorted(object_id for _, object_id, _, _ in delta["upserts"]), sorted([alice.id, bob.id]))
+        self.assertEqual(delta["deletes"], [])
+
+    def test_incremental_delta_with_tombstone(self):
+        alice = self.enroll("alice", 1)
+        bob = self.enroll("bob", 2)
+        since = gallery_version()
+
+        FaceEmbedding.objects.filter(user=alice).delete()
+        carol = self.enroll("carol", 3)
+        delta = collect_gallery_changes(since, (REGISTERED,))
+
+        self.assertFalse(delta["reset"])
+        self.assertEqual([object_id for _, object_id, _, _ in delta["upserts"]], [carol.id])
+        self.assertEqual(delta["deletes"], [(REGISTERED, alice.id)])
+
+        index = GalleryIndex(REGISTERED)
+        index.apply(collect_gallery_changes(0, (REGISTERED,), since))
+        index.apply(delta)
+        self.assertEqual(sorted(record.user_id for record in index.gallery[1]), sorted([bob.id, carol.id]))
+
+    def test_unknown_since_resets(self):
+        self.enroll("alice", 1)
+
+        delta = collect_gallery_changes(gallery_version() + 100, (REGISTERED,))
+
+        self.assertTrue(delta["reset"])
+        self.assertEqual(delta["since"], 0)
+
+    def test_repeated_changes_collapse(self):
+        visitor = TempUser.objects.create(
+            temp_username="visitor_a", temp_email="a@example.com", face_embedding=unit_vector(1).tolist(),
+        )
+        since = gallery_version()
+        visitor.face_embedding = unit_vector(2).tolist()
+        visitor.save()
+        visitor.save()
+
+        delta = collect_gallery_changes(since, (VISITOR,))
+
+        self.assertEqual(GalleryChange.objects.filter(version__gt=since).count(), 2)
+        self.assertEqual(len(delta["upserts"]), 1)
+        np.testing.assert_allclose(delta["upserts"][0][3][0], unit_vector(2), atol=1e-6)
+
+    def test_version_follows_the_counter_not_ids(self):
+        since = gallery_version()
+
+        record_gallery_changes(VISITOR, [1, 2, 3])
+
+        self.assertEqual(gallery_version(), since + 1)
+        self.assertEqual(set(GalleryChange.objects.filter(object_id__in=[1, 2, 3]).values_list("version", flat=True)), {since + 1})
+        # A change logged under a version a reader already holds is not re-sent
+        self.assertEqual(collect_gallery_changes(since + 1, (VISITOR,))["upserts"], [])
+
+    def test_worker_gallery_follows_versions(self):
+        alice = self.enroll("alice", 1)
+        self.assertEqual([owner.user_id for owner in get_registered_gallery()[1]], [alice.id])
+
+        bob = self.enroll("bob", 2)
+
+        self.assertEqual(sorted(owner.user_id for owner in get_registered_gallery()[1]), sorted([alice.id, bob.id]))
+
+
+class GalleryChangesEndpointTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        _, self.key = create_device("edge")
+        self.alice = create_user("alice")
+        enroll(self.alice, unit_vector(1))
+
+    def changes(self, **params):
+        return self.client.get(reverse("gallery-changes"), params, headers={"X-Device-Key": self.key})
+
+    def test_snapshot_then_delta(self):
+        snapshot = self.changes(since=0)
+        version = int(snapshot["X-Gallery-Version"])
+
+        self.assertEqual(snapshot["X-Gallery-Reset"], "1")
+        self.assertEqual([object_id for _, object_id, _, _ in decode_delta(snapshot.content)["upserts"]], [self.alice.id])
+
+        bob = create_user("bob")
+        enroll(bob, unit_vector(2))
+        delta = decode_delta(self.changes(since=version).content)
+
+        self.assertFalse(delta["reset"])
+        self.assertEqual([object_id for _, object_id, _, _ in delta["upserts"]], [bob.id])
+
+    def test_current_version_is_204(self):
+        version = gallery_version()
+
+        response = self.changes(since=version)
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response["X-Gallery-Version"], str(version))
+
+    def test_request_errors(self):
+        self.assertEqual(self.client.get(reverse("gallery-changes")).status_code, 401)
+        for params in ({"since": -1}, {"since": "x"}, {"kind": "robots"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.changes(**params).json()["code"], "INVALID_PARAMS")
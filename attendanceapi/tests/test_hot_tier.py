@@ -0,0 +1,124 @@
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from attendanceapi.services import hot_tier
+from attendanceapi.services.face_recognition_service import match_registered_tiered
+from attendanceapi.services.gallery import normalize
+from attendanceapi.services.hot_tier import HotTier, get_hot_tier, hot_tier_stats, reset_hot_tiers
+from attendanceapi.tests.helpers import PipelineTestCase, create_device, create_user, enroll, frame_data, unit_vector
+
+
+def gallery_of(*seeds):
+    owners = [f"user-{seed}" for seed in seeds]
+    return normalize(np.stack([unit_vector(seed) for seed in seeds])), owners
+
+
+class HotTierTests(SimpleTestCase):
+    def setUp(self):
+        self.gallery = gallery_of(1, 2, 3)
+
+    def test_promoted_identity_matches(self):
+        tier = HotTier(ttl_seconds=60, max_identities=10)
+        tier.promote(self.gallery, 1)
+
+        owners, distances = tier.match(normalize(np.stack([unit_vector(2), unit_vector(3)])), self.gallery, 0.4)
+
+        self.assertEqual(owners, ["user-2", None])
+        self.assertAlmostEqual(distances[0], 0.0, places=5)
+        self.assertEqual(tier.stats()["hits"], 1)
+        self.assertEqual(tier.stats()["misses"], 1)
+        self.assertEqual(tier.stats()["hit_rate"], 0.5)
+
+    def test_least_recently_seen_is_evicted(self):
+        tier = HotTier(ttl_seconds=60, max_identities=2)
+        tier.promote(self.gallery, 0)
+        tier.promote(self.gallery, 1)
+        tier.match(normalize(unit_vector(1)[None, :]), self.gallery, 0.4)  # user-1 seen again
+
+        tier.promote(self.gallery, 2)
+
+        owners, _ = tier.match(normalize(np.stack([unit_vector(1), unit_vector(2)])), self.gallery, 0.4)
+        self.assertEqual(owners, ["user-1", None])
+        self.assertEqual(tier.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        tier = HotTier(ttl_seconds=60, max_identities=10)
+        with mock.patch.object(hot_tier.time, "monotonic", return_value=1000.0):
+            tier.promote(self.gallery, 0)
+        with mock.patch.object(hot_tier.time, "monotonic", return_value=1061.0):
+            owners, _ = tier.match(normalize(unit_vector(1)[None, :]), self.gallery, 0.4)
+
+        self.assertEqual(owners, [None])
+        self.assertEqual(tier.stats()["identities"], 0)
+
+    def test_new_gallery_drops_copies(self):
+        tier = HotTier(ttl_seconds=60, max_identities=10)
+        tier.promote(self.gallery, 0)
+
+        owners, _ = tier.match(normalize(unit_vector(1)[None, :]), gallery_of(1, 2), 0.4)
+
+        self.assertEqual(owners, [None])
+
+    def test_centroids_are_promoted_with_the_template(self):
+        alice, bob = object(), object()
+        gallery = (normalize(np.stack([unit_vector(1), unit_vector(4), unit_vector(2)])), [alice, alice, bob])
+        tier = HotTier(ttl_seconds=60, max_identities=10)
+
+        tier.promote(gallery, 1)
+
+        self.assertEqual(tier.stats()["vectors"], 2)
+
+
+class TieredMatchTests(SimpleTestCase):
+    def setUp(self):
+        reset_hot_tiers()
+        self.addCleanup(reset_hot_tiers)
+        self.gallery = gallery_of(1, 2, 3)
+
+    def test_full_match_is_promoted_then_hits(self):
+        probes = np.stack([unit_vector(2)])
+
+        first = match_registered_tiered(probes, self.gallery, 0.5, "door")
+        second = match_registered_tiered(probes, self.gallery, 0.5, "door")
+
+        self.assertEqual(first[0], ["user-2"])
+        self.assertEqual(second[0], ["user-2"])
+        self.assertEqual(hot_tier_stats()["door"]["hits"], 1)
+        self.assertEqual(hot_tier_stats()["door"]["misses"], 1)
+
+    def test_unrecognized_probe_is_not_promoted(self):
+        match_registered_tiered(np.stack([unit_vector(9)]), self.gallery, 0.5, "door")
+
+        self.assertEqual(hot_tier_stats()["door"]["identities"], 0)
+
+    @override_settings(HOT_TIER={"enabled": False})
+    def test_disabled(self):
+        self.assertIsNone(get_hot_tier("door"))
+
+        owners, _ = match_registered_tiered(np.stack([unit_vector(2)]), self.gallery, 0.5, "door")
+
+        self.assertEqual(owners, ["user-2"])
+        self.assertEqual(hot_tier_stats(), {})
+
+
+class HotTierEndpointTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        _, self.key = create_device("door")
+        enroll(create_user("alice"), unit_vector(1))
+
+    def test_repeat_visits_resolve_in_the_hot_tier(self):
+        for seed in range(3):
+            self.post_json("recognize-frame", {"frame": frame_data(seed)}, headers={"X-Device-Key": self.key})
+
+        response = self.client.get(reverse("pipeline-stats"), headers={"X-Device-Key": self.key})
+
+        stats = response.json()["data"]["hot_tier"]["door"]
+        self.assertEqual(stats["identities"], 1)
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+        metrics = self.client.get(reverse("metrics"), headers={"X-Device-Key": self.key}).content.decode()
+        self.assertIn('attendance_hot_tier_hits_total{site="door"} 2', metrics)
@@ -0,0 +1,212 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from attendanceapi.models import Attendance, IdempotencyKey
+from attendanceapi.services.face_recognition_service import FACE_CONFIRMATION_FRAMES
+from attendanceapi.services.idempotency import (
+    MARK_SCOPE,
+    STALE_CLAIM_SECONDS,
+    IdempotencyInProgress,
+    claim_idempotency_key,
+    complete_idempotency_key,
+    idempotency_owner,
+    purge_idempotency_keys,
+)
+from attendanceapi.tests.helpers import PipelineTestCase, create_device, create_user, enroll, frame_data, unit_vector
+
+
+def age(claim, seconds):
+    IdempotencyKey.objects.filter(id=claim.id).update(created_at=timezone.now() - timedelta(seconds=seconds))
+
+
+class IdempotencyTests(TestCase):
+    owner = idempotency_owner(client="10.0.0.1")
+
+    def test_claim_then_replay(self):
+        claim, replay = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+        self.assertIsNotNone(claim)
+        self.assertIsNone(replay)
+
+        complete_idempotency_key(claim, 201, {"code": "ATTENDANCE_MARKED"})
+        claim, replay = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+
+        self.assertIsNone(claim)
+        self.assertEqual(replay, {"status_code": 201, "body": {"code": "ATTENDANCE_MARKED"}})
+
+    def test_claim_in_progress(self):
+        claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+
+        with self.assertRaises(IdempotencyInProgress):
+            claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+
+    def test_stale_claim_is_taken_over(self):
+        first, _ = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+        age(first, STALE_CLAIM_SECONDS + 1)
+
+        claim, replay = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+
+        self.assertEqual(claim.id, first.id)
+        self.assertIsNone(replay)
+
+    def test_server_error_releases_claim(self):
+        claim, _ = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+        complete_idempotency_key(claim, 500, {"code": "ATTENDANCE_FAILED"})
+
+        claim, replay = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+
+        self.assertIsNotNone(claim)
+        self.assertIsNone(replay)
+
+    def test_keys_are_scoped_per_owner(self):
+        claim, _ = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+        complete_idempotency_key(claim, 201, {"code": "ATTENDANCE_MARKED"})
+
+        claim, replay = claim_idempotency_key(MARK_SCOPE, "k1", owner=idempotency_owner(client="10.0.0.2"))
+
+        self.assertIsNotNone(claim)
+        self.assertIsNone(replay)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL_SECONDS={MARK_SCOPE: 3600})
+    def test_expired_key_is_claimed_afresh(self):
+        first, _ = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+        complete_idempotency_key(first, 201, {"code": "ATTENDANCE_MARKED"})
+        age(first, 3601)
+
+        claim, replay = claim_idempotency_key(MARK_SCOPE, "k1", owner=self.owner)
+
+        self.assertEqual(claim.id, first.id)
+        self.assertIsNone(replay)
+        self.assertIsNone(IdempotencyKey.objects.get().response)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL_SECONDS={MARK_SCOPE: 3600, "edge_sync": None})
+    def test_purge(self):
+        expired, _ = claim_idempotency_key(MARK_SCOPE, "old", owner=self.owner)
+        age(expired, 3601)
+        claim_idempotency_key(MARK_SCOPE, "new", owner=self.owner)
+        kept, _ = claim_idempotency_key("edge_sync", "event", owner=self.owner)
+        age(kept, 10 ** 7)
+
+        self.assertEqual(purge_idempotency_keys(), {MARK_SCOPE: 1})
+        self.assertEqual(set(IdempotencyKey.objects.values_list("key", flat=True)), {"new", "event"})
+
+    @override_settings(IDEMPOTENCY_KEY_TTL_SECONDS={MARK_SCOPE: 3600})
+    def test_purge_command(self):
+        expired, _ = claim_idempotency_key(MARK_SCOPE, "old", owner=self.owner)
+        age(expired, 3601)
+        out = StringIO()
+
+        call_command("purge_idempotency_keys", stdout=out)
+
+        self.assertIn("Purged 1 idempotency keys", out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class MarkIdempotencyEndpointTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        enroll(create_user("alice"), unit_vector(1))
+
+    def mark(self, seed, key="retry-1"):
+        return self.post_json("mark-attendance", {"frame": frame_data(seed)}, headers={"Idempotency-Key": key})
+
+    def test_retry_is_replayed(self):
+        first = self.mark(0)
+        retry = self.mark(1)  # Re-captured frame, same key
+
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_key_in_use(self):
+        IdempotencyKey.objects.create(scope=MARK_SCOPE, owner=idempotency_owner(client="127.0.0.1"), key="retry-1")
+
+        response = self.mark(0)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["code"], "IDEMPOTENCY_KEY_IN_USE")
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_expired_key_is_processed(self):
+        claim = IdempotencyKey.objects.create(
+            scope=MARK_SCOPE, owner=idempotency_owner(client="127.0.0.1"), key="retry-1",
+            response={"status_code": 201, "body": {"code": "ATTENDANCE_MARKED"}},
+        )
+        age(claim, 25 * 3600)
+
+        response = self.mark(0)
+
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_key_too_long(self):
+        response = self.mark(0, key="k" * 129)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["code"], "INVALID_IDEMPOTENCY_KEY")
+
+
+class FrameCacheEndpointTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        enroll(create_user("alice"), unit_vector(1))
+        self.frame = frame_data(0)
+
+    def confirm(self):
+        # Unconfirmed tracks may still resolve, so only later frames are cached
+        for seed in range(1, FACE_CONFIRMATION_FRAMES):
+            self.post_json("recognize-frame", {"frame": frame_data(seed)})
+        return self.post_json("recognize-frame", {"frame": self.frame})
+
+    def test_unconfirmed_result_is_not_cached(self):
+        self.post_json("recognize-frame", {"frame": self.frame})
+
+        resend = self.post_json("recognize-frame", {"frame": self.frame})
+
+        self.assertNotIn("frame_cached", resend.json()["data"])
+
+    def test_identical_resend_skips_inference(self):
+        first = self.confirm()
+        embedded = self.face_app._cursor
+
+        resend = self.post_json("recognize-frame", {"frame": self.frame})
+
+        self.assertEqual(self.face_app._cursor, embedded)
+        self.assertTrue(resend.json()["data"]["frame_cached"])
+        self.assertEqual(resend.json()["data"]["faces"], first.json()["data"]["faces"])
+
+    def test_terminal_mark_is_cached(self):
+        first = self.post_json("mark-attendance", {"frame": self.frame})
+
+        resend = self.post_json("mark-attendance", {"frame": self.frame})
+
+        self.assertEqual(resend["X-Frame-Cache"], "hit")
+        self.assertEqual(resend.json(), first.json())
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    @override_settings(FRAME_CACHE={"enabled": False})
+    def test_disabled(self):
+        self.confirm()
+
+        resend = self.post_json("recognize-frame", {"frame": self.frame})
+
+        self.assertNotIn("frame_cached", resend.json()["data"])
+
+    def test_stats(self):
+        _, key = create_device("door")
+        self.confirm()
+        self.post_json("recognize-frame", {"frame": self.frame})
+
+        stats = self.client.get(reverse("pipeline-stats"), headers={"X-Device-Key": key}).json()["data"]["frame_cache"]
+
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, FACE_CONFIRMATION_FRAMES, 1))
+        self.assertGreater(stats["bytes"], 0)
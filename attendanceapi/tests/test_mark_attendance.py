@@ -0,0 +1,96 @@
+from unittest import mock
+from django.db import connection
+from attendanceapi import async_views
+from attendanceapi.models import Attendance, TempAttendance
+from attendanceapi.services import attendance_service
+from attendanceapi.services.attendance_service import record_attendance_once
+from attendanceapi.services.face_recognition_service import FACE_CONFIRMATION_FRAMES
+from attendanceapi.tests.helpers import (
+    PipelineTestCase,
+    create_temp_attendance,
+    create_user,
+    enroll,
+    frame_data,
+    unit_vector,
+)
+from userauth.models import TempUser
+
+
+class MarkAttendanceTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        enroll(self.user, unit_vector(1))
+
+    def mark(self, seed=0):
+        return self.post_json("mark-attendance", {"frame": frame_data(seed)})
+
+    def test_marks_then_duplicate(self):
+        first = self.mark(0)
+        second = self.mark(1)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(first.json()["data"], {"attendance_id": Attendance.objects.get().id, "user_id": self.user.id})
+        self.assertEqual(second.json()["code"], "ATTENDANCE_DUPLICATE")
+
+    def test_cooldown_check_runs_in_the_write_transaction(self):
+        outer = len(connection.savepoint_ids)
+        depths = []
+        recent_rows = attendance_service._recent_rows
+
+        def spy(*args):
+            depths.append(len(connection.savepoint_ids))
+            return recent_rows(*args)
+
+        with mock.patch.object(attendance_service, "_recent_rows", spy):
+            self.mark()
+
+        [depth] = depths
+        self.assertGreater(depth, outer)
+
+    def test_record_once(self):
+        self.assertIsNotNone(record_attendance_once(user=self.user, distance=0.2))
+        self.assertIsNone(record_attendance_once(user=self.user))
+
+        self.assertEqual(Attendance.objects.get().distance, 0.2)
+
+
+class MarkVisitorTests(PipelineTestCase):
+    identities = [unit_vector(7)]
+
+    def setUp(self):
+        super().setUp()
+        self.visitor = TempUser.objects.create(
+            temp_username="visitor_a", temp_email="a@example.com", face_embedding=unit_vector(7).tolist(),
+        )
+
+    def confirm(self):
+        for seed in range(FACE_CONFIRMATION_FRAMES):
+            response = self.post_json("mark-attendance", {"frame": frame_data(seed)})
+        return response
+
+    def test_known_visitor_is_marked(self):
+        response = self.confirm()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["data"], {"temp_user_id": self.visitor.id, "created": False})
+        self.assertEqual(TempAttendance.objects.get().temp_user, self.visitor)
+
+    def test_visitor_duplicate(self):
+        create_temp_attendance(self.visitor)
+
+        response = self.confirm()
+
+        self.assertEqual(response.json()["code"], "TEMP_ATTENDANCE_DUPLICATE")
+        self.assertEqual(TempAttendance.objects.count(), 1)
+
+    async def test_async_visitor_duplicate(self):
+        for seed in range(FACE_CONFIRMATION_FRAMES):
+            response = await self.apost_json(async_views.mark_attendance, {"frame": frame_data(seed)})
+        again = await self.apost_json(async_views.mark_attendance, {"frame": frame_data(99)})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(await TempAttendance.objects.acount(), 1)
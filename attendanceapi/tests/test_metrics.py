@@ -0,0 +1,99 @@
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from attendanceapi.services.metrics import Histogram, render_family, render_histogram, server_timing_header
+from attendanceapi.tests.helpers import PipelineTestCase, create_device, create_user, frame_data
+from userauth.models import CustomUser
+
+
+class HistogramTests(SimpleTestCase):
+    def test_buckets_are_cumulative_in_exposition(self):
+        histogram = Histogram("latency", "Latency", (0.1, 1.0), label_name="stage")
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, "decode")
+
+        lines = render_histogram(histogram)
+
+        self.assertIn('latency_bucket{stage="decode",le="0.1"} 1', lines)
+        self.assertIn('latency_bucket{stage="decode",le="1.0"} 2', lines)
+        self.assertIn('latency_bucket{stage="decode",le="+Inf"} 3', lines)
+        self.assertIn('latency_count{stage="decode"} 3', lines)
+
+    def test_quantiles_from_recent_samples(self):
+        histogram = Histogram("latency", "Latency", (1.0,))
+        for value in range(100):
+            histogram.observe(value / 100)
+
+        quantiles = histogram.snapshot()[None]["quantiles"]
+
+        self.assertEqual(quantiles[0.5], 0.5)
+        self.assertEqual(quantiles[0.99], 0.99)
+
+    def test_server_timing_sums_repeated_stages(self):
+        header = server_timing_header([("detect", 0.010), ("embed", 0.002), ("embed", 0.003)])
+
+        self.assertEqual(header, "detect;dur=10.00, embed;dur=5.00")
+
+    def test_labelled_family(self):
+        lines = render_family("camera_fps", "FPS", {"door": 2.5}, label_name="camera")
+
+        self.assertEqual(lines[-1], 'attendance_camera_fps{camera="door"} 2.5')
+
+
+@override_settings(METRICS_ALLOWED_IPS=[])
+class MonitoringEndpointTests(PipelineTestCase):
+    def test_server_timing_header(self):
+        with self.settings(METRICS_SERVER_TIMING=True):
+            response = self.post_json("recognize-frame", {"frame": frame_data(0)})
+
+        stages = [part.split(";")[0] for part in response["Server-Timing"].split(", ")]
+        self.assertIn("detect", stages)
+        self.assertEqual(stages[-1], "total")
+
+    def test_no_server_timing_by_default(self):
+        response = self.post_json("recognize-frame", {"frame": frame_data(0)})
+
+        self.assertNotIn("Server-Timing", response)
+
+    def test_anonymous_clients_are_refused(self):
+        for name in ("metrics", "pipeline-stats"):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+
+                self.assertEqual(response.status_code, 403)
+                self.assertEqual(response.json()["code"], "MONITORING_FORBIDDEN")
+
+    def test_allowed_address(self):
+        self.post_json("recognize-frame", {"frame": frame_data(0)})
+
+        with self.settings(METRICS_ALLOWED_IPS=["127.0.0.1"]):
+            response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn('attendance_stage_duration_seconds_count{stage="detect"} 1', response.content.decode())
+
+    def test_device_key(self):
+        _, key = create_device("door")
+
+        response = self.client.get(reverse("pipeline-stats"), headers={"X-Device-Key": key})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["code"], "PIPELINE_STATS")
+        self.assertIn("stages_ms", response.json()["data"])
+
+    def test_invalid_device_key(self):
+        response = self.client.get(reverse("metrics"), headers={"X-Device-Key": "nope"})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "INVALID_DEVICE_KEY")
+
+    def test_staff_only(self):
+        user = create_user("alice")
+        self.client.force_login(user)
+
+        self.assertEqual(self.client.get(reverse("pipeline-stats")).status_code, 403)
+
+        CustomUser.objects.filter(pk=user.pk).update(is_staff=True)
+
+        self.assertEqual(self.client.get(reverse("pipeline-stats")).status_code, 200)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
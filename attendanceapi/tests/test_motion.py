@@ -0,0 +1,103 @@
+from django.test import SimpleTestCase, override_settings
+from attendanceapi.services.fake_face_model import synthetic_frame
+from attendanceapi.services.motion_gate import check_motion, motion_gate_stats, remember_result, reset_motion_gate
+from attendanceapi.tests.helpers import PipelineTestCase, create_user, encode_frame, enroll, unit_vector
+
+
+def moved_frame(frame):
+    # Same scene with a bright block: enough changed pixels for the thumbnail
+    moved = frame.copy()
+    moved[40:200, 40:200] = 255
+    return moved
+
+
+@override_settings(MOTION_GATE={"enabled": True})
+class CheckMotionTests(SimpleTestCase):
+    frame = synthetic_frame(320, 240)
+
+    def setUp(self):
+        reset_motion_gate()
+        self.addCleanup(reset_motion_gate)
+
+    def process(self, camera_key, frame, result):
+        skipped, _ = check_motion(camera_key, frame)
+        self.assertFalse(skipped)
+        remember_result(camera_key, result)
+
+    def test_static_scene_reuses_result(self):
+        self.process("door", self.frame, [])
+
+        self.assertEqual(check_motion("door", self.frame.copy()), (True, []))
+        self.assertEqual(motion_gate_stats()["cameras"]["door"]["skipped"], 1)
+
+    def test_motion_runs_inference(self):
+        self.process("door", self.frame, [])
+
+        self.assertEqual(check_motion("door", moved_frame(self.frame)), (False, None))
+
+    def test_cameras_are_independent(self):
+        self.process("door", self.frame, [])
+
+        self.assertEqual(check_motion("lobby", self.frame), (False, None))
+
+    def test_faces_are_not_gated_by_default(self):
+        self.process("door", self.frame, [{"recognized": True}])
+
+        self.assertEqual(check_motion("door", self.frame), (False, None))
+
+    @override_settings(MOTION_GATE={"enabled": True, "gate_with_faces": True})
+    def test_faces_gated_when_enabled(self):
+        faces = [{"recognized": True}]
+        self.process("door", self.frame, faces)
+
+        self.assertEqual(check_motion("door", self.frame), (True, faces))
+
+    @override_settings(MOTION_GATE={"enabled": True, "max_skip_seconds": 0})
+    def test_forced_full_pass(self):
+        self.process("door", self.frame, [])
+
+        self.assertEqual(check_motion("door", self.frame), (False, None))
+
+    @override_settings(MOTION_GATE={"enabled": False})
+    def test_disabled(self):
+        self.assertEqual(check_motion("door", self.frame), (False, None))
+        self.assertEqual(motion_gate_stats()["frames"], 0)
+
+
+@override_settings(MOTION_GATE={"enabled": True, "gate_with_faces": True})
+class MotionGateEndpointTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+    frame = synthetic_frame(320, 240)
+
+    def setUp(self):
+        super().setUp()
+        enroll(create_user("alice"), unit_vector(1))
+
+    def test_static_scene_skips_inference(self):
+        first = self.post_json("recognize-frame", {"frame": encode_frame(self.frame, quality=90)})
+        embedded = self.face_app._cursor
+
+        # Different bytes (no frame cache hit), same scene
+        second = self.post_json("recognize-frame", {"frame": encode_frame(self.frame, quality=85)})
+
+        self.assertFalse(first.json()["data"]["motion_skipped"])
+        self.assertTrue(second.json()["data"]["motion_skipped"])
+        self.assertEqual(second.json()["data"]["faces"], first.json()["data"]["faces"])
+        self.assertEqual(self.face_app._cursor, embedded)
+
+    def test_motion_runs_inference(self):
+        self.post_json("recognize-frame", {"frame": encode_frame(self.frame)})
+        embedded = self.face_app._cursor
+
+        response = self.post_json("recognize-frame", {"frame": encode_frame(moved_frame(self.frame))})
+
+        self.assertFalse(response.json()["data"]["motion_skipped"])
+        self.assertGreater(self.face_app._cursor, embedded)
+
+    def test_mark_path_reports_skip(self):
+        self.post_json("recognize-and-mark", {"frame": encode_frame(self.frame, quality=90)})
+
+        response = self.post_json("recognize-and-mark", {"frame": encode_frame(self.frame, quality=85)})
+
+        self.assertTrue(response.json()["data"]["motion_skipped"])
+        self.assertEqual(response.json()["data"]["marked"], 0)
@@ -0,0 +1,102 @@
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from insightface.app.common import Face
+from attendanceapi.models import Attendance
+from attendanceapi.services.face_quality import (
+    FACE_BLURRY,
+    FACE_TOO_SMALL,
+    LOW_DET_SCORE,
+    POSE_TOO_EXTREME,
+    RECOGNITION_QUALITY,
+    assess_face,
+    estimate_pose,
+    select_best_face,
+)
+from attendanceapi.services.fake_face_model import synthetic_frame
+from attendanceapi.tests.helpers import PipelineTestCase, create_user, encode_frame, enroll, frame_data, unit_vector
+
+
+def frontal_face(x1=100, y1=100, side=200, score=0.9, nose_shift=0.0):
+    cx, cy = x1 + side / 2, y1 + side / 2
+    return Face(
+        bbox=np.array([x1, y1, x1 + side, y1 + side], dtype=np.float32),
+        kps=np.array([
+            [cx - side * 0.18, cy - side * 0.12],
+            [cx + side * 0.18, cy - side * 0.12],
+            [cx + side * nose_shift, cy + side * 0.02],
+            [cx - side * 0.14, cy + side * 0.16],
+            [cx + side * 0.14, cy + side * 0.16],
+        ], dtype=np.float32),
+        det_score=np.float32(score),
+    )
+
+
+class AssessFaceTests(SimpleTestCase):
+    frame = synthetic_frame(640, 480)
+
+    def test_good_face_passes(self):
+        self.assertIsNone(assess_face(self.frame, frontal_face(), RECOGNITION_QUALITY))
+
+    def test_reasons(self):
+        flat = np.full((480, 640, 3), 128, dtype=np.uint8)
+        cases = [
+            (self.frame, frontal_face(side=20), FACE_TOO_SMALL),
+            (self.frame, frontal_face(score=0.2), LOW_DET_SCORE),
+            (self.frame, frontal_face(nose_shift=0.17), POSE_TOO_EXTREME),
+            (flat, frontal_face(), FACE_BLURRY),
+        ]
+
+        for frame, face, reason in cases:
+            with self.subTest(reason=reason):
+                self.assertEqual(assess_face(frame, face, RECOGNITION_QUALITY), reason)
+
+    def test_frontal_pose(self):
+        yaw, pitch, roll = estimate_pose(frontal_face().kps)
+
+        self.assertLess(abs(yaw), 1.0)
+        self.assertLess(abs(roll), 1.0)
+        self.assertLess(abs(pitch), RECOGNITION_QUALITY["max_pitch"])
+
+    def test_best_face_weighs_score_and_area(self):
+        small = frontal_face(side=50, score=0.99)
+        large = frontal_face(side=200, score=0.7)
+
+        self.assertIs(select_best_face([small, large]), large)
+        self.assertIsNone(select_best_face([]))
+
+
+class QualityGateEndpointTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        enroll(create_user("alice"), unit_vector(1))
+
+    @override_settings(FACE_QUALITY_GATE={"min_face_size": 1000})
+    def test_rejected_face_is_reported_not_matched(self):
+        response = self.post_json("recognize-frame", {"frame": frame_data(0)})
+
+        self.assertEqual(response.status_code, 200)
+        [face] = response.json()["data"]["faces"]
+        self.assertEqual(face["quality_reason"], FACE_TOO_SMALL)
+        self.assertFalse(face["recognized"])
+        self.assertEqual(self.face_app._cursor, 0)  # Never embedded
+
+    def test_blurry_frame_is_not_marked(self):
+        flat = encode_frame(np.full((240, 320, 3), 128, dtype=np.uint8))
+
+        response = self.post_json("mark-attendance", {"frame": flat})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["code"], "LOW_QUALITY_FACE")
+        self.assertEqual(response.json()["data"]["reason"], FACE_BLURRY)
+        self.assertFalse(Attendance.objects.exists())
+
+    @override_settings(FACE_QUALITY_GATE={"enabled": False})
+    def test_gate_can_be_disabled(self):
+        flat = encode_frame(np.full((240, 320, 3), 128, dtype=np.uint8))
+
+        response = self.post_json("mark-attendance", {"frame": flat})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["code"], "ATTENDANCE_MARKED")
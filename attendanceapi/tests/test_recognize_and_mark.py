@@ -0,0 +1,98 @@
+from unittest import mock
+from django.db import connection
+from attendanceapi.models import Attendance, TempAttendance, TempUser
+from attendanceapi.services import attendance_service
+from attendanceapi.services.attendance_service import mark_frame_attendance
+from attendanceapi.services.face_recognition_service import FACE_CONFIRMATION_FRAMES
+from attendanceapi.tests.helpers import (
+    PipelineTestCase,
+    create_attendance,
+    create_user,
+    enroll,
+    frame_data,
+    unit_vector,
+)
+
+
+class RecognizeAndMarkTests(PipelineTestCase):
+    faces_per_frame = 2
+    identities = [unit_vector(1), unit_vector(2)]
+
+    def setUp(self):
+        super().setUp()
+        self.alice = create_user("alice")
+        self.bob = create_user("bob")
+        enroll(self.alice, unit_vector(1))
+        enroll(self.bob, unit_vector(2))
+
+    def send(self, seed):
+        return self.post_json("recognize-and-mark", {"frame": frame_data(seed)})
+
+    def confirm(self):
+        for seed in range(FACE_CONFIRMATION_FRAMES - 1):
+            response = self.send(seed)
+            self.assertEqual(response.json()["data"]["marked"], 0)
+        return self.send(FACE_CONFIRMATION_FRAMES)
+
+    def test_marks_every_confirmed_face(self):
+        response = self.confirm()
+
+        body = response.json()
+        self.assertEqual(body["code"], "ATTENDANCE_MARKED")
+        self.assertEqual(body["data"]["marked"], 2)
+        self.assertEqual(
+            {face["attendance"]["status"] for face in body["data"]["faces"]}, {"marked"},
+        )
+        self.assertEqual(set(Attendance.objects.values_list("member_id", flat=True)), {self.alice.id, self.bob.id})
+
+    def test_cooldown(self):
+        create_attendance(self.alice)
+
+        body = self.confirm().json()
+
+        self.assertEqual(body["data"]["marked"], 1)
+        outcomes = {face["user_id"]: face["attendance"]["status"] for face in body["data"]["faces"]}
+        self.assertEqual(outcomes, {str(self.alice.id): "duplicate", str(self.bob.id): "marked"})
+
+        again = self.send(100).json()
+        self.assertEqual(again["data"]["marked"], 0)
+        self.assertEqual(Attendance.objects.count(), 2)
+
+    def test_cooldown_check_runs_in_the_write_transaction(self):
+        outer = len(connection.savepoint_ids)
+        depths = []
+        recent_ids = attendance_service._recent_ids
+
+        def spy(*args):
+            depths.append(len(connection.savepoint_ids))
+            return recent_ids(*args)
+
+        with mock.patch.object(attendance_service, "_recent_ids", spy):
+            self.confirm()
+
+        self.assertTrue(depths)
+        self.assertTrue(all(depth > outer for depth in depths))
+
+    def test_unconfirmed_faces_write_nothing(self):
+        self.assertEqual(mark_frame_attendance([{"recognized": False}]), [None])
+
+        body = self.send(0).json()
+
+        self.assertEqual(body["code"], "FACES_DETECTED")
+        self.assertEqual([face["attendance"] for face in body["data"]["faces"]], [None, None])
+        self.assertFalse(Attendance.objects.exists())
+
+
+class RecognizeAndMarkVisitorTests(PipelineTestCase):
+    identities = [unit_vector(7)]
+
+    def test_confirmed_stranger_becomes_a_visitor(self):
+        for seed in range(FACE_CONFIRMATION_FRAMES):
+            response = self.post_json("recognize-and-mark", {"frame": frame_data(seed)})
+
+        [face] = response.json()["data"]["faces"]
+        self.assertEqual(face["attendance"]["status"], "marked")
+        self.assertTrue(face["attendance"]["created"])
+        visitor = TempUser.objects.get()
+        self.assertEqual(face["attendance"]["temp_user_id"], visitor.id)
+        self.assertEqual(TempAttendance.objects.get().temp_user, visitor)
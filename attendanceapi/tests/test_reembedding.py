@@ -0,0 +1,136 @@
+from unittest import mock
+import cv2
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from attendanceapi.models import FaceEmbedding, FaceModelVersion, GalleryChange, VersionedEmbedding
+from attendanceapi.services import reembedding
+from attendanceapi.services.face_model import FACE_MODEL_NAME, set_active_model_pack
+from attendanceapi.services.face_recognition_service import FACE_CONFIRMATION_FRAMES
+from attendanceapi.services.fake_face_model import FakeFaceAnalysis, synthetic_frame
+from attendanceapi.services.gallery import gallery_version, get_visitor_gallery
+from attendanceapi.services.reembedding import (
+    REGISTERED,
+    VISITOR,
+    CutoverRefused,
+    cutover,
+    embedding_coverage,
+    pending_reembeds,
+    run_reembedding,
+)
+from attendanceapi.tests.helpers import PipelineTestCase, create_user, enroll, frame_data, temp_media_root, unit_vector
+from userauth.models import TempUser
+
+NEW_PACK = "buffalo_l"
+
+
+def create_visitor(name, seed, model_version=FACE_MODEL_NAME, **fields):
+    return TempUser.objects.create(
+        temp_username=name, temp_email=f"{name}@example.com",
+        face_embedding=unit_vector(seed).tolist(), model_version=model_version, **fields,
+    )
+
+
+def stage(kind, object_id, seed, model_version=NEW_PACK):
+    return VersionedEmbedding.objects.create(
+        kind=kind, object_id=object_id, model_version=model_version,
+        embedding=unit_vector(seed).tolist(), sample_count=1,
+    )
+
+
+class ReembeddingTests(TestCase):
+    def setUp(self):
+        self.addCleanup(set_active_model_pack, FACE_MODEL_NAME)
+        self.user = create_user("alice")
+        enroll(self.user, unit_vector(1))
+        self.visitor = create_visitor("visitor_a", 2)
+
+    def test_pending_skips_identities_on_the_version(self):
+        create_visitor("visitor_new", 3, model_version=NEW_PACK)
+
+        pending = {(kind, object_id) for kind, object_id, _ in pending_reembeds(VISITOR, NEW_PACK)}
+
+        self.assertEqual(pending, {(VISITOR, self.visitor.id)})
+
+    def test_coverage_counts_live_vectors_of_the_version(self):
+        create_visitor("visitor_new", 3, model_version=NEW_PACK)
+        stage(REGISTERED, self.user.id, 11)
+
+        coverage = embedding_coverage(NEW_PACK)
+
+        self.assertEqual(coverage[REGISTERED]["coverage"], 1.0)
+        self.assertEqual((coverage[VISITOR]["covered"], coverage[VISITOR]["total"]), (1, 2))
+
+    def test_cutover_refused_below_coverage(self):
+        with self.assertRaises(CutoverRefused):
+            cutover(NEW_PACK, min_coverage=0.5)
+
+        self.assertFalse(FaceModelVersion.objects.exists())
+
+    def test_cutover(self):
+        stale = create_visitor("visitor_b", 4)
+        kept = create_visitor("visitor_new", 5, model_version=NEW_PACK)
+        stage(REGISTERED, self.user.id, 11)
+        stage(VISITOR, self.visitor.id, 12)
+        since = gallery_version()
+
+        summary = cutover(NEW_PACK, min_coverage=1.0)
+
+        # visitor_new keeps its vector, visitor_b has nothing staged
+        self.assertEqual((summary["registered_switched"], summary["visitors_switched"], summary["visitors_cleared"]), (1, 2, 1))
+        self.assertEqual(FaceEmbedding.objects.get().model_version, NEW_PACK)
+        self.visitor.refresh_from_db()
+        self.assertEqual((self.visitor.model_version, self.visitor.face_embedding), (NEW_PACK, unit_vector(12).tolist()))
+        self.assertIsNone(TempUser.objects.get(id=stale.id).face_embedding)
+        self.assertEqual(TempUser.objects.get(id=kept.id).face_embedding, kept.face_embedding)
+        self.assertEqual(FaceModelVersion.objects.get(is_active=True).name, NEW_PACK)
+        # The outgoing vectors stay staged under their own pack for a rollback
+        self.assertTrue(VersionedEmbedding.objects.filter(kind=VISITOR, object_id=stale.id, model_version=FACE_MODEL_NAME).exists())
+        self.assertEqual(
+            set(GalleryChange.objects.filter(version__gt=since).values_list("kind", "object_id")),
+            {(REGISTERED, self.user.id), (VISITOR, self.visitor.id), (VISITOR, stale.id), (VISITOR, kept.id)},
+        )
+
+        set_active_model_pack(NEW_PACK)
+        self.assertEqual(sorted(get_visitor_gallery()[1]), sorted([self.visitor.id, kept.id]))
+
+    def test_run_stages_vectors_from_stored_images(self):
+        temp_media_root(self)
+        ok, image = cv2.imencode(".jpg", synthetic_frame(320, 240))
+        TempUser.objects.filter(id=self.visitor.id).update(
+            face_image=default_storage.save("temp_faces/a.jpg", ContentFile(image.tobytes())),
+        )
+        app = FakeFaceAnalysis(identities=[unit_vector(9)])
+
+        with mock.patch.object(reembedding, "load_face_model", return_value=app):
+            progress = run_reembedding(NEW_PACK, workers=0)
+
+        self.assertEqual((progress["embedded"], progress["failed"]), (1, 1))  # alice has no stored image
+        self.assertEqual(VersionedEmbedding.objects.get(kind=VISITOR).sample_count, 1)
+        self.assertEqual(VersionedEmbedding.objects.get(kind=REGISTERED).error, "NO_IMAGE")
+
+
+class VisitorGalleryVersionTests(PipelineTestCase):
+    identities = [unit_vector(7)]
+
+    def visit(self):
+        for seed in range(FACE_CONFIRMATION_FRAMES):
+            response = self.post_json("recognize-and-mark", {"frame": frame_data(seed)})
+        [face] = response.json()["data"]["faces"]
+        return face["attendance"]
+
+    def test_visitor_of_the_current_pack_is_recognized(self):
+        visitor = create_visitor("visitor_a", 7)
+
+        attendance = self.visit()
+
+        self.assertFalse(attendance["created"])
+        self.assertEqual(attendance["temp_user_id"], visitor.id)
+
+    def test_visitor_of_another_pack_is_not_matched(self):
+        create_visitor("visitor_a", 7, model_version=NEW_PACK)
+
+        attendance = self.visit()
+
+        self.assertTrue(attendance["created"])
+        self.assertEqual(TempUser.objects.get(id=attendance["temp_user_id"]).model_version, FACE_MODEL_NAME)
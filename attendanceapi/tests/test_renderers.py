@@ -0,0 +1,103 @@
+import json
+import unittest
+from django.test import SimpleTestCase
+from attendanceapi import async_views
+from attendanceapi.renderers import (
+    FastJSONRenderer,
+    media_type_params,
+    msgpack,
+    negotiate_recognition,
+    slim_recognition_body,
+)
+from attendanceapi.services.face_recognition_service import FACE_CONFIRMATION_FRAMES
+from attendanceapi.tests.helpers import PipelineTestCase, create_user, enroll, frame_data, unit_vector
+
+MSGPACK = "application/msgpack"
+
+
+class SlimSchemaTests(SimpleTestCase):
+    def test_faces_become_rows(self):
+        body = {
+            "status": "success", "code": "FACES_DETECTED", "message": "Faces processed",
+            "data": {"faces": [
+                {"recognized": True, "user_id": "4", "bbox": [1, 2, 3, 4], "attendance": {"status": "marked"}},
+                {"recognized": False, "bbox": [5, 6, 7, 8], "attendance": None},
+            ], "marked": 1},
+        }
+
+        self.assertEqual(slim_recognition_body(body), {
+            "code": "FACES_DETECTED", "faces": [[1, 2, 3, 4, 4, 1], [5, 6, 7, 8, None, 0]], "marked": 1,
+        })
+
+    def test_errors_keep_the_envelope(self):
+        body = {"status": "error", "code": "FRAME_MISSING", "message": "Frame field is required", "data": {}}
+
+        self.assertIs(slim_recognition_body(body), body)
+
+    def test_media_type_params(self):
+        self.assertEqual(media_type_params('application/json; Schema="slim"; q=0.9'), {"schema": "slim", "q": "0.9"})
+        self.assertEqual(media_type_params(None), {})
+
+    def test_unknown_accept_falls_back_to_json(self):
+        renderer, media_type = negotiate_recognition("text/html")
+
+        self.assertIsInstance(renderer, FastJSONRenderer)
+        self.assertEqual(media_type, "application/json")
+
+
+class RecognitionFormatTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        enroll(self.user, unit_vector(1))
+
+    def recognize(self, accept=None):
+        headers = {"Accept": accept} if accept else None
+        for seed in range(FACE_CONFIRMATION_FRAMES):
+            response = self.post_json("recognize-frame", {"frame": frame_data(seed)}, headers=headers)
+        return response
+
+    def test_json_by_default(self):
+        response = self.recognize()
+
+        self.assertEqual(response["Content-Type"], "application/json")
+        [face] = response.json()["data"]["faces"]
+        self.assertEqual(face["user_id"], str(self.user.id))
+
+    def test_slim_json(self):
+        response = self.recognize("application/json; schema=slim")
+
+        body = json.loads(response.content)
+        self.assertEqual(body["code"], "FACES_DETECTED")
+        [face] = body["faces"]
+        self.assertEqual(face[4], self.user.id)
+        self.assertTrue(all(isinstance(value, int) for value in face[:4]))
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        as_json = self.recognize().json()
+
+        response = self.post_json("recognize-frame", {"frame": frame_data(99)}, headers={"Accept": MSGPACK})
+
+        self.assertEqual(response["Content-Type"], MSGPACK)
+        body = msgpack.unpackb(response.content, raw=False)
+        self.assertEqual(body["code"], as_json["code"])
+        self.assertEqual(body["data"]["faces"][0]["user_id"], as_json["data"]["faces"][0]["user_id"])
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_errors(self):
+        response = self.post_json("recognize-frame", {}, headers={"Accept": MSGPACK})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(msgpack.unpackb(response.content)["code"], "FRAME_MISSING")
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    async def test_async_view_negotiates(self):
+        response = await self.apost_json(
+            async_views.recognize_frame, {"frame": frame_data(0)}, headers={"Accept": f"{MSGPACK}; schema=slim"},
+        )
+
+        self.assertEqual(response["Content-Type"], MSGPACK)
+        self.assertEqual(len(msgpack.unpackb(response.content)["faces"]), 1)
@@ -0,0 +1,122 @@
+import threading
+import time
+from datetime import timedelta
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils import timezone
+from attendanceapi.models import Attendance, ServiceSession
+from attendanceapi.services import sessions
+from attendanceapi.services.sessions import PresentSet, active_sessions
+from attendanceapi.tests.helpers import PipelineTestCase, create_attendance, create_user, enroll, frame_data, unit_vector
+
+
+class PresentSetTests(SimpleTestCase):
+    def test_members_counted_once(self):
+        present = PresentSet()
+
+        self.assertTrue(present.add_member(5))
+        self.assertFalse(present.add_member(5))
+        self.assertTrue(present.add_member(6))
+        self.assertEqual(present.members, 2)
+        self.assertTrue(present.has_member(5))
+        self.assertFalse(present.has_member(7))
+
+    def test_bitmap_grows_for_large_ids(self):
+        present = PresentSet()
+
+        present.add_member(3)
+        present.add_member(100_000)
+
+        self.assertTrue(present.has_member(3))
+        self.assertTrue(present.has_member(100_000))
+        self.assertFalse(present.has_member(99_999))
+        self.assertFalse(present.has_member(10_000_000))
+
+    def test_visitors(self):
+        present = PresentSet()
+
+        self.assertTrue(present.add_visitor(1))
+        self.assertFalse(present.add_visitor(1))
+        self.assertTrue(present.has_visitor(1))
+        self.assertEqual(present.visitors, {1})
+        self.assertEqual(present.members, 0)
+
+
+class ServiceSessionTests(PipelineTestCase):
+    identities = [unit_vector(1)]
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        enroll(self.user, unit_vector(1))
+        self.session = ServiceSession.objects.create(name="Morning mass", starts_at=timezone.now() - timedelta(minutes=1))
+
+    def mark(self, seed=0):
+        return self.post_json("mark-attendance", {"frame": frame_data(seed)}).json()["code"]
+
+    def test_marked_once_per_session(self):
+        self.assertEqual(self.mark(0), "ATTENDANCE_MARKED")
+        self.assertEqual(self.mark(1), "ATTENDANCE_DUPLICATE")
+
+        [state] = active_sessions()
+        self.assertTrue(state.present.has_member(self.user.id))
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_marks_before_the_session_do_not_count(self):
+        mark = create_attendance(self.user)
+        Attendance.objects.filter(pk=mark.pk).update(created_at=self.session.starts_at - timedelta(seconds=30))
+
+        self.assertEqual(self.mark(), "ATTENDANCE_MARKED")
+
+    def test_active_sessions_endpoint(self):
+        self.mark()
+
+        [session] = self.client.get(reverse("active-sessions")).json()["data"]["sessions"]
+
+        self.assertEqual(session["session_id"], self.session.id)
+        self.assertEqual((session["members"], session["total"]), (1, 1))
+
+    def test_headcount_etag(self):
+        url = reverse("session-headcount", args=[self.session.id])
+        first = self.client.get(url)
+        self.assertEqual(first.json()["data"]["total"], 0)
+
+        unchanged = self.client.get(url, headers={"If-None-Match": first["ETag"]})
+        self.mark()
+        changed = self.client.get(url, headers={"If-None-Match": first["ETag"]})
+
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()["data"]["members"], 1)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+    def test_ended_session_headcount_is_loaded(self):
+        now = timezone.now()
+        ended = ServiceSession.objects.create(name="Vigil", starts_at=now - timedelta(hours=2), ends_at=now - timedelta(hours=1))
+        mark = create_attendance(self.user)
+        Attendance.objects.filter(pk=mark.pk).update(created_at=now - timedelta(minutes=90))
+
+        response = self.client.get(reverse("session-headcount", args=[ended.id]))
+
+        self.assertEqual(response.json()["data"]["members"], 1)
+
+    def test_unknown_session(self):
+        response = self.client.get(reverse("session-headcount", args=[0]))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["code"], "SESSION_NOT_FOUND")
+
+    def test_waiting_refresh_keeps_the_fresh_states(self):
+        [state] = active_sessions()
+        state.note(user_id=self.user.id)
+        sessions._refreshed_at[0] = 0.0
+
+        # A refresh that queued behind another must not rebuild its states
+        with sessions._refresh_lock:
+            waiting = threading.Thread(target=sessions._refresh)
+            waiting.start()
+            sessions._refreshed_at[0] = time.monotonic()
+        waiting.join()
+
+        self.assertEqual(active_sessions(), [state])
+        self.assertTrue(state.present.has_member(self.user.id))
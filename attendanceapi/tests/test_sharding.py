@@ -0,0 +1,85 @@
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from attendanceapi.models import Attendance
+from attendanceapi.services.gallery import REGISTERED, GalleryIndex, normalize
+from attendanceapi.tests.helpers import PipelineTestCase, create_device, create_user, enroll, frame_data, unit_vector
+from base.models import Department
+
+
+class ShardedIndexTests(SimpleTestCase):
+    def test_sharded_scope_is_a_slice(self):
+        shard_of = {"a1": 1, "b1": 2, "a2": 1}.get
+        index = GalleryIndex(REGISTERED, shard_of=shard_of)
+        index.apply({
+            "since": 0, "version": 1, "reset": True, "deletes": [],
+            "upserts": [(REGISTERED, i, owner, normalize([unit_vector(i)])) for i, owner in enumerate(["a1", "b1", "a2"])],
+        })
+
+        self.assertEqual(sorted(index.scoped({1})[1]), ["a1", "a2"])
+        self.assertEqual(index.scoped({2})[1], ["b1"])
+        self.assertEqual(index.scoped({1, 2})[0].shape, (3, 512))
+        self.assertEqual(index.scoped({3}), (None, []))
+        self.assertIs(index.scoped({1}), index.scoped({1}))
+        self.assertEqual(index.shard_stats()[1], {"identities": 2, "vectors": 2})
+
+
+class ShardedMatchEndpointTests(PipelineTestCase):
+    # Every frame shows bob, who belongs to the other department
+    identities = [unit_vector(2)]
+
+    def setUp(self):
+        super().setUp()
+        self.north = Department.objects.create(name="North")
+        self.south = Department.objects.create(name="South")
+        enroll(create_user("alice", department=self.north), unit_vector(1))
+        self.bob = create_user("bob", department=self.south)
+        enroll(self.bob, unit_vector(2))
+
+    def mark(self, **device_fields):
+        _, self.key = create_device("door", department=self.north, **device_fields)
+        return self.post_json("mark-attendance", {"frame": frame_data(0)}, headers={"X-Device-Key": self.key})
+
+    def test_global_fallback_on_a_shard_miss(self):
+        response = self.mark()
+
+        self.assertEqual(response.json()["code"], "ATTENDANCE_MARKED")
+        self.assertEqual(Attendance.objects.get().member, self.bob)
+
+    def test_scoped_device_without_fallback(self):
+        response = self.mark(global_fallback=False)
+
+        self.assertNotEqual(response.json()["code"], "ATTENDANCE_MARKED")
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_extra_search_departments(self):
+        device, key = create_device("door", department=self.north, global_fallback=False)
+        device.search_departments.add(self.south)
+
+        response = self.post_json("mark-attendance", {"frame": frame_data(0)}, headers={"X-Device-Key": key})
+
+        self.assertEqual(response.json()["code"], "ATTENDANCE_MARKED")
+
+    def test_department_change_moves_the_shard(self):
+        self.mark(global_fallback=False)
+        self.bob.department = self.north
+        self.bob.save(update_fields=["department"])
+
+        response = self.post_json("mark-attendance", {"frame": frame_data(1)}, headers={"X-Device-Key": self.key})
+
+        self.assertEqual(response.json()["code"], "ATTENDANCE_MARKED")
+
+    @override_settings(GALLERY_SHARDING={"enabled": False})
+    def test_sharding_disabled(self):
+        self.assertEqual(self.mark(global_fallback=False).json()["code"], "ATTENDANCE_MARKED")
+
+    def test_shard_stats(self):
+        _, key = create_device("door", department=self.north)
+        self.post_json("mark-attendance", {"frame": frame_data(0)}, headers={"X-Device-Key": key})
+
+        response = self.client.get(reverse("pipeline-stats"), headers={"X-Device-Key": key})
+
+        shards = response.json()["data"]["gallery_shards"]
+        self.assertEqual(shards["shards"][f"department-{self.north.id}"]["vectors"], 1)
+        self.assertEqual(shards["shards"][f"department-{self.south.id}"]["identities"], 1)
+        self.assertIn(f"department-{self.north.id}", shards["match_ms"])
+        self.assertIn("global", shards["match_ms"])
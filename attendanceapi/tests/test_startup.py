@@ -0,0 +1,25 @@
+from django.test import SimpleTestCase
+from attendanceapi.management.commands.startup_report import measure_startup, parse_importtime
+
+
+class ParseImporttimeTests(SimpleTestCase):
+    def test_rows_and_depth(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        300 | json\n"
+            "import time:        80 |         80 |   json.decoder\n"
+            "unrelated line\n"
+        )
+
+        self.assertEqual(parse_importtime(output), [("json", 120, 300, 0), ("json.decoder", 80, 80, 1)])
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_setup_loads_no_inference_libraries(self):
+        self.assertEqual(measure_startup("setup")["inference_modules"], {})
+
+    def test_api_urlconf_leaves_the_model_stack_unloaded(self):
+        loaded = measure_startup("api")["inference_modules"]
+
+        self.assertNotIn("insightface", loaded)
+        self.assertNotIn("onnxruntime", loaded)
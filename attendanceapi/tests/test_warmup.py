@@ -0,0 +1,86 @@
+import os
+from unittest import mock
+from django.apps import apps
+from django.urls import reverse
+from attendanceapi.services import face_model, warmup
+from attendanceapi.services.fake_face_model import FakeFaceAnalysis
+from attendanceapi.tests.helpers import PipelineTestCase
+
+COLD = {"model_warm": False, "warm_pack": None, "warmup_seconds": None, "error": None}
+
+
+class BrokenFaceAnalysis(FakeFaceAnalysis):
+    def __init__(self):
+        super().__init__()
+        self.det_model.detect = mock.Mock(side_effect=RuntimeError("no CUDA device"))
+
+
+class WarmUpTests(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(warmup._state, COLD)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ready_check(self):
+        return self.client.get(reverse("health"), {"mode": "ready"})
+
+    def test_not_ready_until_warm(self):
+        response = self.ready_check()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["code"], "API_NOT_READY")
+        self.assertFalse(response.json()["data"]["model_warm"])
+
+    def test_ready_after_warm_up(self):
+        with self.assertLogs("attendanceapi.services.warmup", "INFO"):
+            warmup.warm_up()
+
+        response = self.ready_check()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["code"], "API_READY")
+        self.assertEqual(response.json()["data"]["gallery_size"], 0)
+
+    def test_liveness_ignores_warm_up(self):
+        response = self.client.get(reverse("health"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["code"], "API_HEALTHY")
+
+    def test_failed_warm_up_is_reported(self):
+        face_model.set_face_app(BrokenFaceAnalysis())
+
+        with self.assertRaises(RuntimeError):
+            warmup.warm_up_model()
+
+        response = self.ready_check()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["data"]["error"], "no CUDA device")
+
+
+class AppReadyTests(PipelineTestCase):
+    def ready(self, **env):
+        with mock.patch.dict(os.environ, env), \
+                mock.patch("attendanceapi.services.warmup.warm_up_model") as warm_up_model:
+            apps.get_app_config("attendanceapi").ready()
+        return warm_up_model
+
+    def test_warm_up_is_opt_in(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop("FACE_MODEL_WARMUP", None)
+            warm_up_model = self.ready()
+
+        warm_up_model.assert_not_called()
+
+    def test_opt_in(self):
+        with self.assertLogs("attendanceapi.apps", "INFO"):
+            warm_up_model = self.ready(FACE_MODEL_WARMUP="1")
+
+        warm_up_model.assert_called_once_with()
+
+    def test_failure_does_not_stop_startup(self):
+        with mock.patch.dict(os.environ, {"FACE_MODEL_WARMUP": "1"}), \
+                mock.patch("attendanceapi.services.warmup.warm_up_model", side_effect=RuntimeError("boom")), \
+                self.assertLogs("attendanceapi.apps", "ERROR"):
+            apps.get_app_config("attendanceapi").ready()
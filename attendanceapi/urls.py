@@ -1,10 +1,32 @@
+from django.conf import settings
 from django.urls import path
 from attendanceapi.api_views import recognize_frame, mark_attendance, health_check
-from attendanceapi.api_views import api_version
+from attendanceapi.api_views import edge_sync, enroll_face, gallery_changes, recognize_and_mark
+from attendanceapi.api_views import api_version, pipeline_stats, metrics
+from attendanceapi.api_views import active_service_sessions, attendance_stream, service_session_headcount
+
+if getattr(settings, "ATTENDANCE_ASYNC_VIEWS", False):
+    from attendanceapi.async_views import (
+        api_version,
+        attendance_stream,
+        health_check,
+        mark_attendance,
+        recognize_and_mark,
+        recognize_frame,
+    )
 
 urlpatterns = [
     path("recognize-frame/", recognize_frame, name="recognize-frame"),
     path("attendance/mark/", mark_attendance, name="mark-attendance"),
+    path("recognize-and-mark/", recognize_and_mark, name="recognize-and-mark"),
+    path("enroll/", enroll_face, name="enroll-face"),
+    path("edge/sync/", edge_sync, name="edge-sync"),
+    path("gallery/changes/", gallery_changes, name="gallery-changes"),
+    path("attendance/stream/", attendance_stream, name="attendance-stream"),
+    path("sessions/active/", active_service_sessions, name="active-sessions"),
+    path("sessions/<int:session_id>/headcount/", service_session_headcount, name="session-headcount"),
     path("health/", health_check, name="health"),
     path("version/", api_version, name="version"),
+    path("stats/", pipeline_stats, name="pipeline-stats"),
+    path("metrics/", metrics, name="metrics"),
 ]
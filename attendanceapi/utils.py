@@ -3,7 +3,6 @@ from django.db.models import Q
 from django.utils.timezone import now
 from django.utils.dateparse import parse_date
 from .models import Attendance, TempAttendance
-from attendanceapi.services.face_model import get_face_app
 
 def get_filtered_attendance_queryset(request):
     queryset = Attendance.objects.select_related('member')
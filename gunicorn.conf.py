@@ -0,0 +1,74 @@
+# Gunicorn configuration
+# Usage: gunicorn -c gunicorn.conf.py smartattendancesystemapi.wsgi:application
+#
+# GUNICORN_PRELOAD=1 loads Django, the inference libraries, the model
+# weights (detection and recognition, optimised once) and the registered
+# gallery in the master; workers then share those pages copy-on-write
+# instead of each holding a private copy. ONNX sessions are still created
+# per worker after fork (their thread pools are not fork-safe), but run on
+# the master's weight arrays (attendanceapi.services.shared_model). Compare
+# modes with:
+#   python manage.py memory_report --pid <gunicorn master pid>
+
+import gc
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+# uvicorn.workers.UvicornWorker together with smartattendancesystemapi.asgi
+# (required for /api/attendance/stream/; the WSGI app answers it with 501)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+# Each worker enforces its share of the per-camera frame rate
+os.environ.setdefault("ADMISSION_PROCESSES", str(workers))
+
+if preload_app:
+    # Read by AttendanceapiConfig.ready in the master
+    os.environ["FACE_MODEL_PRELOAD"] = "1"
+
+
+def when_ready(server):
+    """
+    Master only, after the app is preloaded and before workers are forked.
+    """
+    if not preload_app:
+        return
+
+    from django.db import connections
+    from attendanceapi.services.gallery import get_registered_gallery, gallery_size
+
+    get_registered_gallery()
+    server.log.info("Preloaded gallery (%d vectors) in master", gallery_size())
+
+    # Never share a DB connection across processes
+    connections.close_all()
+
+    # Move everything allocated so far out of the GC's reach so collections
+    # in the workers do not touch (and un-share) these pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+
+    from attendanceapi.services.face_model import reset_after_fork
+    reset_after_fork()
+
+
+def post_worker_init(worker):
+    """
+    Runs in each worker after the Django app is loaded and before it accepts
+    requests: warm the model and load the gallery so the first frame after a
+    deploy or worker recycle is served at normal latency.
+    """
+    from attendanceapi.services.warmup import warm_up
+
+    try:
+        warm_up()
+    except Exception:
+        # Serve anyway; /api/health/?mode=ready keeps reporting not ready
+        worker.log.exception("Worker warm-up failed")
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartattendancesystemapi.settings')
 
+# Serve the async recognition views (see attendanceapi.async_views), e.g.
+#   gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker \
+#       smartattendancesystemapi.asgi:application
+os.environ.setdefault('ATTENDANCE_ASYNC_VIEWS', '1')
+
 application = get_asgi_application()
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'attendanceapi.middleware.PipelineTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -71,6 +72,7 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_HEADERS = [
     "content-type",
     "authorization",
+    "idempotency-key",
 ]
 
 CORS_ALLOW_METHODS = [
@@ -111,12 +113,61 @@ AUTH_USER_MODEL = 'userauth.CustomUser'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# SQLite (default) runs in WAL mode with a busy timeout (PRAGMAs applied per
+# connection, see attendanceapi/services/database.py) and opens transactions
+# with BEGIN IMMEDIATE, so concurrent workers queue for the write lock
+# instead of failing with "database is locked". DB_ENGINE=postgres needs
+# psycopg; DB_POOL=1 uses its connection pool (psycopg[pool]) instead of
+# persistent connections. Compare profiles with manage.py benchmark_writes.
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 60))  # Seconds a connection is reused; 0: per request
+
+if DB_ENGINE == "postgres":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get("DB_NAME", "attendance"),
+            'USER': os.environ.get("DB_USER", ""),
+            'PASSWORD': os.environ.get("DB_PASSWORD", ""),
+            'HOST': os.environ.get("DB_HOST", ""),
+            'PORT': os.environ.get("DB_PORT", ""),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get("DB_POOL", "0") == "1":
+        # The pool replaces persistent connections (Django refuses both)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+                "timeout": 10,
+            },
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get("DB_NAME", BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
     }
+
+# The journal mode is stored in the database file: once switched to WAL it
+# stays WAL for every client, and db.sqlite3-wal / -shm files appear beside
+# it. The checked-in dev database therefore keeps its rollback journal
+# unless SQLITE_JOURNAL_MODE asks otherwise; a database named by DB_NAME
+# gets WAL.
+SQLITE_PRAGMAS = {
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "wal" if os.environ.get("DB_NAME") else None),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "normal"),
 }
 
 
@@ -162,3 +213,220 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Face quality gate for live frames
+# Faces failing any check are returned with a reason code instead of being
+# embedded and matched.
+
+FACE_QUALITY_GATE = {
+    "enabled": os.environ.get("FACE_QUALITY_GATE_ENABLED", "1") == "1",
+    "min_face_size": int(os.environ.get("FACE_QUALITY_MIN_SIZE", 40)),
+    "min_det_score": float(os.environ.get("FACE_QUALITY_MIN_DET_SCORE", 0.5)),
+    "min_blur": float(os.environ.get("FACE_QUALITY_MIN_BLUR", 25.0)),
+    "max_yaw": float(os.environ.get("FACE_QUALITY_MAX_YAW", 45.0)),
+    "max_pitch": float(os.environ.get("FACE_QUALITY_MAX_PITCH", 35.0)),
+}
+
+
+# Per-camera frame preprocessing, keyed by the camera_id sent with each frame
+# roi: [x, y, w, h] as fractions of the frame (e.g. the doorway region)
+# max_side: longest side in pixels after cropping
+# decode_reduction: 1, 2, 4 or 8, decodes JPEGs directly at reduced size
+
+CAMERA_PROFILES = {
+    "default": {
+        "roi": None,
+        "max_side": int(os.environ.get("CAMERA_MAX_SIDE", 1280)),
+        "decode_reduction": int(os.environ.get("CAMERA_DECODE_REDUCTION", 1)),
+    },
+}
+
+
+# Camera devices
+# Cameras authenticate with an X-Device-Key header (manage.py register_device).
+# With required off, requests without a key fall back to the body camera_id.
+
+DEVICE_AUTH = {
+    "required": os.environ.get("DEVICE_AUTH_REQUIRED", "0") == "1",
+    "cache_seconds": int(os.environ.get("DEVICE_AUTH_CACHE_SECONDS", 60)),
+    "last_seen_interval": 60,
+}
+
+
+# Motion gate: skip inference on frames that barely differ from the last
+# processed frame of the same camera and reuse its result
+
+MOTION_GATE = {
+    "enabled": os.environ.get("MOTION_GATE_ENABLED", "1") == "1",
+    "sample_width": 64,
+    "pixel_threshold": int(os.environ.get("MOTION_GATE_PIXEL_THRESHOLD", 20)),
+    "min_changed_ratio": float(os.environ.get("MOTION_GATE_MIN_CHANGED_RATIO", 0.01)),
+    "max_skip_seconds": float(os.environ.get("MOTION_GATE_MAX_SKIP_SECONDS", 10.0)),
+    "gate_with_faces": os.environ.get("MOTION_GATE_WITH_FACES", "0") == "1",
+}
+
+
+# Duplicate frame cache: byte-identical resends (client retries) of a frame to
+# recognize-frame or attendance/mark within ttl_seconds get the first result
+# without decoding or inference. Per worker, bounded by entries and bytes.
+
+FRAME_CACHE = {
+    "enabled": os.environ.get("FRAME_CACHE_ENABLED", "1") == "1",
+    "ttl_seconds": int(os.environ.get("FRAME_CACHE_TTL_SECONDS", 30)),
+    "max_entries": 1024,
+    "max_bytes": int(os.environ.get("FRAME_CACHE_MAX_BYTES", 4 * 1024 * 1024)),
+}
+
+
+# Idempotency keys (attendance/mark Idempotency-Key, edge sync events) are
+# remembered this long per scope; expired keys may be reused and are deleted
+# by `python manage.py purge_idempotency_keys` (run it daily from cron).
+
+IDEMPOTENCY_KEY_TTL_SECONDS = {
+    "mark": int(os.environ.get("IDEMPOTENCY_MARK_TTL_SECONDS", 24 * 3600)),
+    "edge_sync": int(os.environ.get("IDEMPOTENCY_EDGE_SYNC_TTL_SECONDS", 30 * 24 * 3600)),
+}
+
+
+# Face ROI thumbnails: marked faces are cropped in the request and stored as
+# size x size thumbnails by a background writer (content-addressed paths,
+# face_roi filled in batches). A full queue drops crops, never blocks.
+
+FACE_ROI_STORAGE = {
+    "enabled": os.environ.get("FACE_ROI_ENABLED", "1") == "1",
+    "size": int(os.environ.get("FACE_ROI_SIZE", 112)),
+    "format": os.environ.get("FACE_ROI_FORMAT", "webp"),
+    "quality": 80,
+    "queue_size": int(os.environ.get("FACE_ROI_QUEUE_SIZE", 256)),
+    "drop": "newest",
+}
+
+
+# Re-embedding for model pack upgrades (manage.py reembed run/status/cutover).
+# The live pack is the active FaceModelVersion, FACE_MODEL_NAME until one
+# has been cut over to.
+
+REEMBEDDING = {
+    "workers": int(os.environ.get("REEMBED_WORKERS", 2)),
+    "batch_size": 50,
+    "min_coverage": float(os.environ.get("REEMBED_MIN_COVERAGE", 0.95)),
+}
+
+
+# Pipeline metrics
+# Per-stage timings are always collected and exposed at /api/metrics/.
+# Set METRICS_SERVER_TIMING=1 to also send them in a Server-Timing header.
+# /api/metrics/ and /api/stats/ answer staff users, requests with a valid
+# X-Device-Key and the addresses in METRICS_ALLOWED_IPS (comma separated,
+# e.g. the Prometheus host). Behind a reverse proxy REMOTE_ADDR is the
+# proxy's address, so list it only if the proxy does not route /api/metrics/.
+
+METRICS_SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "0") == "1"
+METRICS_ALLOWED_IPS = [
+    address.strip()
+    for address in os.environ.get("METRICS_ALLOWED_IPS", "").split(",")
+    if address.strip()
+]
+
+# Admission control for /api/recognize-frame/
+# Frames over a camera's rate get 429, frames beyond max_in_flight per process
+# get 503 (both with Retry-After); frames older than max_queue_age_ms, or
+# overtaken by a newer frame of the same camera, are dropped unprocessed.
+# Clients may send captured_at (epoch) with each frame; otherwise the proxy's
+# X-Request-Start header is used to measure queueing before the app.
+# State is per process: each of `processes` (set by gunicorn.conf.py) enforces
+# its share of the camera rate, and max_in_flight / newest-frame-wins only
+# shed under the ASGI app (a sync worker holds one frame at a time).
+
+ADMISSION_CONTROL = {
+    "enabled": os.environ.get("ADMISSION_CONTROL_ENABLED", "1") == "1",
+    "max_in_flight": int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 4)),
+    "max_queue_age_ms": int(os.environ.get("ADMISSION_MAX_QUEUE_AGE_MS", 1000)),
+    "camera_max_fps": float(os.environ.get("ADMISSION_CAMERA_MAX_FPS", 10)),
+    "camera_burst": int(os.environ.get("ADMISSION_CAMERA_BURST", 5)),
+    "processes": int(os.environ.get("ADMISSION_PROCESSES", 1)),
+    "max_clock_skew_seconds": float(os.environ.get("ADMISSION_MAX_CLOCK_SKEW_SECONDS", 10)),
+    "retry_after_seconds": 1,
+}
+
+# URL routing
+# ATTENDANCE_API_ROUTES=0 serves only the root and admin URLs. Admin and
+# report processes run that way so they never import the recognition views
+# and the inference stack behind them.
+
+ATTENDANCE_API_ROUTES = os.environ.get("ATTENDANCE_API_ROUTES", "1") == "1"
+
+# Async views (ASGI)
+# asgi.py turns ATTENDANCE_ASYNC_VIEWS on; recognition then runs on a bounded
+# thread pool per process. max_workers: concurrent inferences; max_pending:
+# frames admitted (running + waiting) before answering 503 INFERENCE_BUSY.
+
+ATTENDANCE_ASYNC_VIEWS = os.environ.get("ATTENDANCE_ASYNC_VIEWS", "0") == "1"
+
+INFERENCE_EXECUTOR = {
+    "max_workers": int(os.environ.get("INFERENCE_MAX_WORKERS", 2)),
+    "max_pending": int(os.environ.get("INFERENCE_MAX_PENDING", 8)),
+}
+
+# Gallery sharding
+# The registered gallery is partitioned by department. A device searches its
+# department plus its search_departments (admin), then the whole gallery on
+# a miss if its global_fallback is set. Devices without any search everything.
+
+GALLERY_SHARDING = {
+    "enabled": os.environ.get("GALLERY_SHARDING_ENABLED", "1") == "1",
+}
+
+# Recently-seen identity tier
+# Each site (device department) searches the identities it matched in the
+# last ttl_seconds before the full gallery; a hot match must beat the
+# recognition threshold by margin, otherwise the full gallery decides.
+
+HOT_TIER = {
+    "enabled": os.environ.get("HOT_TIER_ENABLED", "1") == "1",
+    "ttl_seconds": int(os.environ.get("HOT_TIER_TTL_SECONDS", 600)),
+    "max_identities": int(os.environ.get("HOT_TIER_MAX_IDENTITIES", 500)),
+    "margin": 0.1,
+}
+
+# Service sessions (manage.py service_session start/end/list)
+# Each worker keeps active sessions' present-sets in memory and re-reads the
+# active sessions plus new attendance rows every refresh_seconds.
+
+SERVICE_SESSIONS = {
+    "refresh_seconds": float(os.environ.get("SERVICE_SESSIONS_REFRESH_SECONDS", 2)),
+}
+
+# Live attendance feed (/api/attendance/stream/, Server-Sent Events)
+# A tail poller per worker reads new attendance rows every poll_seconds while
+# streams are open; reconnects replay from memory via Last-Event-ID. Served
+# by the ASGI app only (smartattendancesystemapi.asgi); WSGI answers 501.
+
+ATTENDANCE_FEED = {
+    "poll_seconds": float(os.environ.get("ATTENDANCE_FEED_POLL_SECONDS", 1)),
+    "subscriber_buffer": 256,
+    "max_subscribers": int(os.environ.get("ATTENDANCE_FEED_MAX_SUBSCRIBERS", 200)),
+    "max_stream_seconds": int(os.environ.get("ATTENDANCE_FEED_MAX_STREAM_SECONDS", 300)),
+}
+
+# Edge mode
+# manage.py export_gallery writes a gallery bundle signed with this key; edge
+# devices need the same key to load it. Required: without it bundles are
+# neither exported nor loaded.
+
+GALLERY_BUNDLE_KEY = os.environ.get("GALLERY_BUNDLE_KEY", "")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "attendanceapi": {
+            "handlers": ["console"],
+            "level": os.environ.get("ATTENDANCE_LOG_LEVEL", "INFO"),
+        },
+    },
+}
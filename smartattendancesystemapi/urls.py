@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
@@ -27,6 +28,9 @@ def root(request):
 urlpatterns = [
     path("", root),
     path('admin/', admin.site.urls),
-    path("api/", include("attendanceapi.urls")),
-
 ]
+
+# include() imports the views right away, so leave the API out entirely
+# where it is not served (ATTENDANCE_API_ROUTES=0)
+if settings.ATTENDANCE_API_ROUTES:
+    urlpatterns.append(path("api/", include("attendanceapi.urls")))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userauth', '0002_tempuser_appearances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tempuser',
+            name='model_version',
+            field=models.CharField(db_index=True, default='buffalo_s', max_length=64),
+        ),
+    ]